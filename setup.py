@@ -28,6 +28,11 @@ requires = [
     "requests"
 ]
 
+extras_require = {
+    "async": ["aiohttp"],
+    "numpy": ["numpy"],
+}
+
 
 def write_version_py(filename):
     """Write version."""
@@ -69,15 +74,17 @@ if __name__ == '__main__':
             'License :: OSI Approved :: MIT License',
             'Operating System :: OS Independent',
             'Programming Language :: Python',
-            'Programming Language :: Python :: 2.7',
             'Programming Language :: Python :: 3',
-            'Programming Language :: Python :: 3.4',
+            'Programming Language :: Python :: 3 :: Only',
             'Programming Language :: Python :: 3.5',
             'Programming Language :: Python :: 3.6',
+            'Programming Language :: Python :: 3.7',
             'Development Status :: 4 - Beta',
             'Intended Audience :: Developers',
         ],
+        python_requires='>=3.5',
         install_requires=requires,
+        extras_require=extras_require,
         entry_points={
             'console_scripts': [
                 'steemmonsters=steemmonsters.cli:main',
@@ -0,0 +1,388 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import asyncio
+import json
+import logging
+from collections import OrderedDict, deque
+from timeit import default_timer as timer
+from steemmonsters.aioutils import AsyncSingleFlight, acquire_async
+from steemmonsters.api import Api
+from steemmonsters.cache import FRESH, STALE
+from steemmonsters.exceptions import ApiError, CircuitOpenError
+from steemmonsters.response import ApiResponse, BufferedResponse
+from steemmonsters.retry import RetryState
+from steemmonsters.streaming import JsonArrayParser
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+log = logging.getLogger(__name__)
+
+
+class AsyncApi(Api):
+    """ Asyncio counterpart of :class:`steemmonsters.api.Api`
+
+        Offers the same methods as :class:`Api`, but each of them returns a
+        coroutine. At most ``concurrency`` requests are in flight at the same
+        time, so that many calls can be started at once:
+
+        .. code-block:: python
+
+            async with AsyncApi() as api:
+                details = await asyncio.gather(*[api.get_player_details(p) for p in players])
+
+        The retry policies of :class:`Api` apply unchanged. Requires ``aiohttp``
+        and Python 3.6.
+
+        :param url: Base url of the api (default is ``https://steemmonsters.com/``) or a
+            list of equivalent base urls
+        :param timeout: Timeout in seconds for a single http request, either a float
+            or a ``(connect, read)`` tuple
+        :param int concurrency: Maximum number of requests in flight
+        :param int limit_per_host: Maximum number of connections per host (0 is unlimited)
+        :param aiohttp.ClientSession session: Use an already configured session
+        :param RetryPolicy retry_policy: Policy for all endpoints without an own policy
+        :param dict retry_policies: Maps endpoint names to a :class:`RetryPolicy`
+        :param str cache_dir: Directory in which cached answers are stored
+        :param dict cache_policies: Maps endpoint names to a
+            :class:`steemmonsters.cache.CachePolicy`
+        :param conditional_endpoints: Endpoint names which are requested conditionally
+        :param RateLimiter rate_limiter: Limits the request rate, by default the limiter
+            is shared with all :class:`Api` instances. None disables rate limiting.
+        :param Recorder recorder: Stores all received answers as fixtures
+        :param CircuitBreakers circuit_breakers: Circuit breakers of the endpoints
+        :param ImmutableCache final_cache: Store for answers which never change
+    """
+    def __init__(self, url=None, timeout=(10, 60), concurrency=100, limit_per_host=0,
+                 session=None, retry_policy=None, retry_policies=None, cache_dir=None,
+                 cache_policies=None, conditional_endpoints=None,
+                 rate_limiter=Api.default_rate_limiter, recorder=None, circuit_breakers=None, final_cache=None):
+        if aiohttp is None:
+            raise ImportError("AsyncApi requires aiohttp, install it with: pip install aiohttp")
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.session = session
+        self._semaphore = None
+        self._init_common(url, timeout, retry_policy, retry_policies, cache_dir, cache_policies,
+                          conditional_endpoints, rate_limiter, recorder, circuit_breakers, final_cache)
+        self.single_flight = AsyncSingleFlight()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """ Closes the aiohttp session and all its connections
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _client_timeout(self):
+        if isinstance(self.timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+        return aiohttp.ClientTimeout(total=self.timeout)
+
+    def _get_session(self):
+        # aiohttp sessions and asyncio primitives have to be created inside the running loop
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self._client_timeout())
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self.session
+
+    def _base_url(self):
+        if self.mirrors.start_probe():
+            asyncio.ensure_future(self._probe_mirrors())
+        return self.mirrors.select()
+
+    async def _probe_mirrors(self):
+        try:
+            for base_url in self.mirrors.urls:
+                try:
+                    await self._http_get(base_url + self.probe_path)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+        finally:
+            self.mirrors.finish_probe()
+
+    async def _http_get(self, url, headers=None, stream=False):
+        """ Returns the response and the body of a GET request
+
+            With ``stream``, the body is only read when a recorder stores it, otherwise
+            it is None and the caller reads ``response.content`` and releases the response.
+        """
+        base_url, path = self.mirrors.split(url)
+        session = self._get_session()
+        async with self._semaphore:
+            start = timer()
+            try:
+                response = await session.get(url, headers=headers)
+                body = None
+                if not stream or self.recorder is not None:
+                    body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._record_mirror(base_url, None, timer() - start)
+                raise
+        self._record_mirror(base_url, response.status, timer() - start)
+        if self.recorder is not None:
+            self.recorder.record(path, BufferedResponse(response.status, body, headers=response.headers))
+        return response, body
+
+    async def _fetch(self, path, endpoint=None, headers=None, stream=False, rate_group=None):
+        """ Requests ``path`` until it succeeds and returns the response and its body
+
+            See :meth:`steemmonsters.api.Api._fetch`, with ``stream`` the body is
+            None unless it was read for the recorder.
+        """
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+        state = RetryState(self.get_retry_policy(endpoint), endpoint, self.__url__ + path)
+        breaker = self.circuit_breakers.get(endpoint)
+        start = timer()
+        try:
+            while True:
+                self._check_circuit(breaker, state)
+                if self.rate_limiter is not None:
+                    await acquire_async(self.rate_limiter, rate_group or endpoint)
+                state.url = self._base_url() + path
+                try:
+                    response, body = await self._http_get(state.url, headers=headers, stream=stream)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    breaker.failure()
+                    delay = state.failed("%s: %s" % (e.__class__.__name__, str(e)))
+                else:
+                    self._record_outcome(breaker, state, response.status)
+                    if response.status in (200, 304):
+                        self.stats.record_request(endpoint, timer() - start, response.status, state.attempts)
+                        if not stream:
+                            self.stats.record_bytes(endpoint, len(body))
+                        return response, body
+                    response.release()
+                    delay = state.failed("HTTP %d %s" % (response.status, response.reason),
+                                         status_code=response.status,
+                                         retry_after=response.headers.get("Retry-After"))
+                log.debug("%s failed (%s), retry in %.2f s" % (endpoint, state.history[-1], delay))
+                await asyncio.sleep(delay)
+        except ApiError as e:
+            self.stats.record_request(endpoint, timer() - start, e.status_code, max(0, e.attempts - 1), error=str(e))
+            raise
+
+    async def request(self, path):
+        """ Sends a single request without retries and returns an :class:`ApiResponse`
+        """
+        endpoint = path.split("?")[0]
+        state = RetryState(self.get_retry_policy(endpoint), endpoint, self.__url__ + path)
+        breaker = self.circuit_breakers.get(endpoint)
+        start = timer()
+        try:
+            self._check_circuit(breaker, state)
+        except CircuitOpenError as e:
+            self.stats.record_request(endpoint, timer() - start, None, 0, error=str(e))
+            raise
+        if self.rate_limiter is not None:
+            await acquire_async(self.rate_limiter, endpoint)
+        state.url = self._base_url() + path
+        try:
+            response, body = await self._http_get(state.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.failure()
+            self.stats.record_request(endpoint, timer() - start, None, 0,
+                                      error="%s: %s" % (e.__class__.__name__, str(e)))
+            raise
+        self._record_outcome(breaker, state, response.status)
+        self.stats.record_request(endpoint, timer() - start, response.status, 0)
+        self.stats.record_bytes(endpoint, len(body))
+        return ApiResponse(BufferedResponse(response.status, body))
+
+    @staticmethod
+    async def _iter_chunks(response, body, chunk_size):
+        if body is not None:
+            yield body
+            return
+        async for chunk in response.content.iter_chunked(chunk_size):
+            yield chunk
+
+    async def _iter_json(self, path, key=None, endpoint=None, chunk_size=64 * 1024):
+        """ Requests ``path`` and yields the elements of the returned json array while it is downloaded
+
+            Retries happen only before the first element is returned.
+        """
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+        response, body = await self._fetch(path, endpoint=endpoint, stream=True)
+        parser = JsonArrayParser(key=key)
+        bytes_received = 0
+        decode_time = 0.
+        try:
+            async for chunk in self._iter_chunks(response, body, chunk_size):
+                bytes_received += len(chunk)
+                start = timer()
+                items = parser.feed(chunk)
+                decode_time += timer() - start
+                for item in items:
+                    yield item
+                if parser.done:
+                    return
+            for item in parser.close():
+                yield item
+        finally:
+            response.release()
+            self.stats.record_bytes(endpoint, bytes_received)
+            self.stats.record_decode(endpoint, decode_time)
+
+    async def _fetch_json(self, path, endpoint, rate_group=None):
+        validators, headers = self._conditional_headers(path, endpoint)
+        response, body = await self._fetch(path, endpoint=endpoint, headers=headers, rate_group=rate_group)
+        if response.status == 304 and validators is not None:
+            self.stats.count(endpoint, "not_modified")
+            return validators["value"]
+        start = timer()
+        value = json.loads(body.decode("utf-8"))
+        self.stats.record_decode(endpoint, timer() - start)
+        self._store_validators(path, endpoint, response.headers, value)
+        return value
+
+    async def _revalidate(self, path, endpoint):
+        try:
+            self.cache.set(path, await self._fetch_json(path, endpoint))
+        except Exception as e:
+            log.warning("Refreshing %s failed: %s" % (endpoint, str(e)))
+        finally:
+            self._finish_revalidation(path)
+
+    async def _get(self, path, endpoint=None, rate_group=None):
+        """ Requests ``path`` and returns the decoded json answer
+        """
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+        value, state = self._cached(path, endpoint)
+        if state == FRESH:
+            self.stats.count(endpoint, "cache_fresh")
+            return value
+        elif state == STALE:
+            self.stats.count(endpoint, "cache_stale")
+            if self._start_revalidation(path):
+                asyncio.ensure_future(self._revalidate(path, endpoint))
+            return value
+        value = await self.single_flight.do(path, lambda: self._fetch_json(path, endpoint, rate_group=rate_group))
+        if self.cache_policies.get(endpoint) is not None:
+            self.cache.set(path, value)
+        return value
+
+    async def _get_final(self, path, is_final, rate_group=None):
+        value = self._cached_final(path)
+        if value is not None:
+            return value
+        value = await self._get(path, rate_group=rate_group)
+        if is_final(value):
+            self.final_cache.set(path, value)
+        return value
+
+    async def get_card_details_since(self, version=None):
+        headers = {"If-None-Match": version} if version is not None else None
+        response, body = await self._fetch("cards/get_details", headers=headers)
+        if response.status == 304:
+            self.stats.count("cards/get_details", "not_modified")
+            return None, version
+        start = timer()
+        card_details = json.loads(body.decode("utf-8"))
+        self.stats.record_decode("cards/get_details", timer() - start)
+        return card_details, response.headers.get("ETag")
+
+    async def _iter_parallel(self, coro_func, items, max_workers):
+        """ Awaits ``coro_func(item)`` for all items, at most ``max_workers`` at a time, and
+            yields ``(item, result)`` as they complete
+
+            A call which fails with an :class:`ApiError` yields ``(item, error)``.
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def run(item):
+            async with semaphore:
+                try:
+                    return item, await coro_func(item)
+                except ApiError as e:
+                    log.warning("Request for %s failed: %s" % (str(item), str(e)))
+                    return item, e
+
+        tasks = [asyncio.ensure_future(run(item)) for item in items]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def iter_battle_results(self, ids, max_workers=8):
+        """ Yields ``(id, result)`` for many battle ids, in the order in which the results arrive
+
+            Stored results of finished battles are returned first, without a request.
+        """
+        missing = []
+        for battle_id in OrderedDict.fromkeys(ids):
+            result = self._cached_final("battle/result?id=%s" % battle_id)
+            if result is not None:
+                yield battle_id, result
+            else:
+                missing.append(battle_id)
+        async for item in self._iter_parallel(self._bulk_battle_result, missing, max_workers):
+            yield item
+
+    async def _history_shard(self, shard):
+        first_block, last_block = shard
+        shard_records = []
+        from_block = first_block
+        seen = set()
+        while from_block is not None:
+            records, from_block, seen = self._history_step(await self.get_from_block(from_block), first_block,
+                                                           last_block, from_block, seen)
+            shard_records.extend(records)
+        return shard_records
+
+    async def iter_history(self, start_block, stop_block, shard_blocks=100, max_workers=8):
+        """ Yields the transactions of the blocks ``start_block`` - ``stop_block`` in block order
+
+            Like :meth:`steemmonsters.api.Api.iter_history`, at most ``max_workers``
+            shards are requested at the same time and at most ``2 * max_workers``
+            shards run ahead of the caller.
+        """
+        shards = iter(self._split_blocks(start_block, stop_block, shard_blocks))
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+        pending = deque()
+
+        async def run(shard):
+            async with semaphore:
+                return await self._history_shard(shard)
+
+        try:
+            for shard in shards:
+                pending.append(asyncio.ensure_future(run(shard)))
+                if len(pending) >= 2 * max_workers:
+                    break
+            while len(pending) > 0:
+                records = await pending.popleft()
+                shard = next(shards, None)
+                if shard is not None:
+                    pending.append(asyncio.ensure_future(run(shard)))
+                for record in records:
+                    yield record
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def find_cards(self, card_ids, chunk_size=100):
+        """ Returns the details of the cards with the given uids
+
+            The uids are requested in chunks of ``chunk_size`` which run concurrently.
+        """
+        uids, chunks = self._split_card_ids(card_ids, chunk_size)
+        results = await asyncio.gather(*[self._get("cards/find?ids=%s" % ",".join(c)) for c in chunks])
+        return self._merge_found_cards(uids, results)
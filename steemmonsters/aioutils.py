@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import asyncio
+import threading
+
+
+async def acquire_async(rate_limiter, endpoint):
+    """ Waits in the running event loop until a request to ``endpoint`` is allowed
+
+        Asyncio counterpart of :meth:`steemmonsters.ratelimit.RateLimiter.acquire`,
+        it shares the buckets with all threads which use the same limiter.
+    """
+    delay = rate_limiter.reserve(endpoint)
+    if delay <= 0:
+        return
+    with rate_limiter.waiting():
+        await asyncio.sleep(delay)
+
+
+class AsyncSingleFlight(object):
+    """ Asyncio counterpart of :class:`steemmonsters.singleflight.SingleFlight`
+
+        Concurrent tasks which await the same key share one running coroutine.
+
+        .. code-block:: python
+
+            flight = AsyncSingleFlight()
+            details = await flight.do("players/details?name=holger80", fetch)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.coalesced = 0
+
+    async def do(self, key, coro_func):
+        """ Awaits ``coro_func()`` unless a call for ``key`` is running in the event loop
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = asyncio.ensure_future(coro_func())
+                self._futures[key] = future
+                future.add_done_callback(lambda f: self._forget(key, f))
+            else:
+                self.coalesced += 1
+        # shield keeps the shared call running when a single waiter is cancelled
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
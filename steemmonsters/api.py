@@ -8,288 +8,843 @@ import time
 import io
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from timeit import default_timer as timer
 import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from steemmonsters.cache import CachePolicy, ImmutableCache, ResponseCache, FRESH, STALE
+from steemmonsters.circuitbreaker import CircuitBreakers
+from steemmonsters.exceptions import ApiError, CircuitOpenError
+from steemmonsters.mirrors import MirrorSelector
+from steemmonsters.ratelimit import RateLimiter
+from steemmonsters.response import ApiResponse
+from steemmonsters.retry import RETRY_STATUSES, RetryPolicy, RetryState
+from steemmonsters.singleflight import SingleFlight
+from steemmonsters.stats import ApiStats
+from steemmonsters.streaming import JsonArrayParser
+
+log = logging.getLogger(__name__)
 
 
 class Api(object):
     """ Access the steemmonsters API
+
+        All calls share one :class:`requests.Session`, so connections to the
+        api host are pooled and kept alive between calls. The session can be
+        used from several threads at the same time.
+
+        :param url: Base url of the api (default is ``https://steemmonsters.com/``) or a
+            list of equivalent base urls (e.g. origin, CDN and a caching proxy)
+        :param timeout: Timeout in seconds for a single http request, either a float
+            or a ``(connect, read)`` tuple
+        :param int pool_connections: Number of hosts for which a connection pool is cached
+        :param int pool_maxsize: Maximum number of keep-alive connections per host
+        :param bool pool_block: When True, a thread waits for a free connection instead
+            of opening an additional one, when all ``pool_maxsize`` connections are in use
+        :param requests.Session session: Use an already configured session instead of
+            creating a new one
+        :param RetryPolicy retry_policy: Policy for all endpoints without an own policy
+        :param dict retry_policies: Maps endpoint names (e.g. ``battle/result``) to a
+            :class:`RetryPolicy`, extends ``default_retry_policies``
+        :param str cache_dir: Directory in which cached answers are stored, so that they
+            survive a restart. When None, answers are only cached in memory.
+        :param dict cache_policies: Maps endpoint names to a
+            :class:`steemmonsters.cache.CachePolicy`, extends ``default_cache_policies``.
+            A value of None disables caching for the endpoint.
+        :param conditional_endpoints: Endpoint names for which ``ETag`` and
+            ``Last-Modified`` validators are stored (default is ``default_conditional_endpoints``)
+        :param RateLimiter rate_limiter: Limits the request rate, by default all
+            instances share ``default_rate_limiter``. None disables rate limiting.
+        :param recorder: A :class:`steemmonsters.replay.Recorder` which stores every
+            received answer as fixture
+        :param CircuitBreakers circuit_breakers: Circuit breakers of the endpoints, by
+            default a new :class:`steemmonsters.circuitbreaker.CircuitBreakers` is created
+        :param ImmutableCache final_cache: Store for answers which never change (finished
+            battles, confirmed transactions), by default it is kept in ``cache_dir/final``
+
+        When several base urls are given, every request goes to the fastest
+        healthy one (see :class:`steemmonsters.mirrors.MirrorSelector`). The
+        latency of all mirrors is measured in a background thread every
+        ``mirror_probe_interval`` seconds by requesting ``probe_path``, and a failed
+        attempt is retried on the next best mirror.
+
+        Failed calls are retried with exponential backoff. When a call finally fails,
+        a :class:`steemmonsters.exceptions.ApiError` is raised which tells the reason.
+
+        After several consecutive failed requests to an endpoint its circuit breaker
+        opens, and calls to it fail at once with
+        :class:`steemmonsters.exceptions.CircuitOpenError` instead of running
+        through their retries. After a recovery timeout a single probe request
+        decides whether the endpoint is used again.
+
+        Answers of rarely changing endpoints are cached. When a cached answer is
+        older than its ttl but still inside its ``stale_ttl``, it is returned at once
+        and refreshed in a background thread.
+
+        Polled endpoints which mostly return the same answer are requested
+        conditionally. When the api answers with ``304 Not Modified``, the
+        already decoded answer of the previous request is returned.
+
+        Results of finished battles and lookups of confirmed transactions never
+        change. They are kept in ``final_cache`` and are never requested again.
+
+        Every request, including each retry, waits for a token of the rate limiter,
+        so that concurrent commands and pollers stay below the throttling limit
+        of the api.
+
+        Identical calls which run at the same time (e.g. from several threads)
+        share one request and receive the same decoded answer.
+
+        Wall time, received bytes, decode time, retries and final status of every
+        call are collected per endpoint in ``stats`` (see :meth:`get_stats`).
     """
     __url__ = 'https://steemmonsters.com/'
+    #: Cheap endpoint which is requested to measure the latency of the mirrors
+    probe_path = "settings"
+    mirror_probe_interval = 60.
+
+    default_retry_policy = RetryPolicy()
+    # The battle endpoints are polled while a match is running and should answer fast
+    default_retry_policies = {
+        "battle/history": RetryPolicy(max_attempts=20, backoff_factor=0.25, backoff_max=2.),
+        "battle/result": RetryPolicy(max_attempts=20, backoff_factor=0.25, backoff_max=2.),
+        "battle/status": RetryPolicy(max_attempts=20, backoff_factor=0.25, backoff_max=2.),
+    }
+    # The card details are kept by steemmonsters.cards.CardStore as snapshot and are not cached here
+    default_cache_policies = {
+        "purchases/settings": CachePolicy(ttl=60 * 60, stale_ttl=7 * 24 * 60 * 60),
+        "settings": CachePolicy(ttl=60, stale_ttl=24 * 60 * 60),
+    }
+    default_conditional_endpoints = frozenset([
+        "cards/get_details", "cards/stats", "market/for_sale", "market/for_sale_grouped",
+        "players/leaderboard", "purchases/settings", "settings",
+    ])
+    # Sharded history reads and bulk battle reads have their own budget, so that they are only
+    # limited by the global bucket and not by the polling budget of their endpoints
+    default_rate_limiter = RateLimiter(rate=10, burst=20, groups={
+        "battle": (4, 8),
+        "battle/bulk": (10, 20),
+        "market": (2, 4),
+        "transactions": (4, 8),
+        "transactions/history": (10, 20),
+    })
+
+    def __init__(self, url=None, timeout=(10, 60), pool_connections=10, pool_maxsize=10,
+                 pool_block=False, session=None, retry_policy=None, retry_policies=None,
+                 cache_dir=None, cache_policies=None, conditional_endpoints=None,
+                 rate_limiter=default_rate_limiter, recorder=None, circuit_breakers=None, final_cache=None):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                  pool_block=pool_block)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._init_common(url, timeout, retry_policy, retry_policies, cache_dir, cache_policies,
+                          conditional_endpoints, rate_limiter, recorder, circuit_breakers, final_cache)
+        self.single_flight = SingleFlight()
+
+    def _init_common(self, url, timeout, retry_policy, retry_policies, cache_dir, cache_policies,
+                     conditional_endpoints, rate_limiter, recorder, circuit_breakers, final_cache):
+        """ Setup which is shared with :class:`steemmonsters.aioapi.AsyncApi`
+        """
+        self._init_mirrors(url)
+        self.timeout = timeout
+        self.retry_policy = retry_policy or self.default_retry_policy
+        self.retry_policies = dict(self.default_retry_policies)
+        if retry_policies is not None:
+            self.retry_policies.update(retry_policies)
+        self._init_cache(cache_dir, cache_policies, conditional_endpoints, final_cache)
+        self.rate_limiter = rate_limiter
+        self.recorder = recorder
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else CircuitBreakers()
+        self.stats = ApiStats()
+
+    def _init_mirrors(self, url):
+        if url is None:
+            urls = [self.__url__]
+        elif isinstance(url, (list, tuple)):
+            urls = list(url)
+        else:
+            urls = [url]
+        self.mirrors = MirrorSelector(urls, probe_interval=self.mirror_probe_interval)
+        self.__url__ = self.mirrors.urls[0]
+
+    def _init_cache(self, cache_dir, cache_policies, conditional_endpoints, final_cache=None):
+        self.cache = ResponseCache(cache_dir)
+        if final_cache is None:
+            final_cache = ImmutableCache(os.path.join(cache_dir, "final") if cache_dir is not None else None)
+        self.final_cache = final_cache
+        self.cache_policies = dict(self.default_cache_policies)
+        if cache_policies is not None:
+            self.cache_policies.update(cache_policies)
+        if conditional_endpoints is None:
+            conditional_endpoints = self.default_conditional_endpoints
+        self.conditional_endpoints = frozenset(conditional_endpoints)
+        self._validators = {}
+        self._validators_lock = threading.Lock()
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Closes all pooled connections
+        """
+        self.session.close()
+
+    def _base_url(self):
+        """ Returns the base url of the mirror which should answer the next request
+        """
+        if self.mirrors.start_probe():
+            thread = threading.Thread(target=self._probe_mirrors)
+            thread.daemon = True
+            thread.start()
+        return self.mirrors.select()
+
+    def _probe_mirrors(self):
+        try:
+            for base_url in self.mirrors.urls:
+                try:
+                    self._http_get(base_url + self.probe_path).close()
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    pass
+        finally:
+            self.mirrors.finish_probe()
+
+    def _record_mirror(self, base_url, status_code, latency):
+        """ Updates the measurements of a mirror, ``status_code`` is None when no answer was received
+        """
+        if base_url is None:
+            return
+        if status_code is None or status_code in RETRY_STATUSES:
+            self.mirrors.failure(base_url)
+        else:
+            self.mirrors.success(base_url, latency)
+
+    def _http_get(self, url, headers=None, stream=False):
+        base_url, path = self.mirrors.split(url)
+        start = timer()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self._record_mirror(base_url, None, timer() - start)
+            raise
+        self._record_mirror(base_url, response.status_code, timer() - start)
+        if self.recorder is not None:
+            self.recorder.record(path, response)
+        return response
+
+    def get_retry_policy(self, endpoint):
+        """ Returns the :class:`RetryPolicy` used for the given endpoint
+        """
+        return self.retry_policies.get(endpoint, self.retry_policy)
+
+    def _check_circuit(self, breaker, state):
+        """ Raises :class:`CircuitOpenError` when the circuit of the endpoint does not allow a request
+        """
+        if breaker.allow():
+            return
+        retry_in = breaker.retry_in()
+        raise CircuitOpenError("%s is unavailable, circuit is open for %.1f s" % (state.endpoint, retry_in),
+                               retry_in=retry_in, endpoint=state.endpoint, url=state.url,
+                               status_code=state.status_code, attempts=state.attempts, history=state.history)
+
+    def _record_outcome(self, breaker, state, status_code):
+        """ Tells the breaker whether the endpoint answered, only retryable failures count against it
+        """
+        if status_code is None or state.policy.is_retryable(status_code):
+            breaker.failure()
+        else:
+            breaker.success()
+
+    def _fetch(self, path, endpoint=None, headers=None, stream=False, rate_group=None):
+        """ Requests ``path`` until it succeeds and returns the ``requests.Response``
+
+            A ``304 Not Modified`` answer to a conditional request counts as success.
+            The request waits for the rate limiter group ``rate_group``, by default
+            for the group of the endpoint.
+
+            Connection errors, timeouts and retryable status codes are repeated
+            as the retry policy of the endpoint allows it. Raises
+            :class:`PermanentApiError` for all other non 200 answers,
+            :class:`RetriesExhaustedError` when no attempt is left and
+            :class:`CircuitOpenError` when the circuit of the endpoint is open.
+        """
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+        state = RetryState(self.get_retry_policy(endpoint), endpoint, self.__url__ + path)
+        breaker = self.circuit_breakers.get(endpoint)
+        start = timer()
+        try:
+            while True:
+                self._check_circuit(breaker, state)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(rate_group or endpoint)
+                state.url = self._base_url() + path
+                try:
+                    response = self._http_get(state.url, headers=headers, stream=stream)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    breaker.failure()
+                    delay = state.failed("%s: %s" % (e.__class__.__name__, str(e)))
+                else:
+                    self._record_outcome(breaker, state, response.status_code)
+                    if response.status_code in (200, 304):
+                        self.stats.record_request(endpoint, timer() - start, response.status_code, state.attempts)
+                        if not stream:
+                            self.stats.record_bytes(endpoint, len(response.content))
+                        return response
+                    response.close()
+                    delay = state.failed("HTTP %d %s" % (response.status_code, response.reason),
+                                         status_code=response.status_code,
+                                         retry_after=response.headers.get("Retry-After"))
+                log.debug("%s failed (%s), retry in %.2f s" % (endpoint, state.history[-1], delay))
+                time.sleep(delay)
+        except ApiError as e:
+            self.stats.record_request(endpoint, timer() - start, e.status_code, max(0, e.attempts - 1), error=str(e))
+            raise
+
+    def request(self, path):
+        """ Sends a single request without retries and returns an :class:`ApiResponse`
+
+            Used by polling loops which check the status and the answer themselves.
+            The body is decoded once, on first access. Raises :class:`CircuitOpenError`
+            while the circuit of the endpoint is open, its ``retry_in`` tells how long
+            the loop should wait.
+
+            :param str path: Path relative to the base url, e.g. ``battle/result?id=...``
+        """
+        endpoint = path.split("?")[0]
+        state = RetryState(self.get_retry_policy(endpoint), endpoint, self.__url__ + path)
+        breaker = self.circuit_breakers.get(endpoint)
+        start = timer()
+        try:
+            self._check_circuit(breaker, state)
+        except CircuitOpenError as e:
+            self.stats.record_request(endpoint, timer() - start, None, 0, error=str(e))
+            raise
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(endpoint)
+        state.url = self._base_url() + path
+        try:
+            response = self._http_get(state.url)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            breaker.failure()
+            self.stats.record_request(endpoint, timer() - start, None, 0,
+                                      error="%s: %s" % (e.__class__.__name__, str(e)))
+            raise
+        self._record_outcome(breaker, state, response.status_code)
+        self.stats.record_request(endpoint, timer() - start, response.status_code, 0)
+        self.stats.record_bytes(endpoint, len(response.content))
+        return ApiResponse(response)
+
+    def _conditional_headers(self, path, endpoint):
+        """ Returns the stored validators of ``path`` and the matching request headers
+        """
+        if endpoint not in self.conditional_endpoints:
+            return None, None
+        with self._validators_lock:
+            validators = self._validators.get(path)
+        if validators is None and self.cache_policies.get(endpoint) is not None:
+            # after a restart, the validators on disk belong to the cached answer
+            entry = self.cache.get("conditional:" + path)
+            cached = self.cache.get(path)
+            if entry is None or cached is None or cached[1] < entry[1]:
+                return None, None
+            validators = dict(entry[0], value=cached[0])
+        if validators is None:
+            return None, None
+        headers = {}
+        if validators["etag"] is not None:
+            headers["If-None-Match"] = validators["etag"]
+        if validators["last_modified"] is not None:
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return validators, headers
+
+    def _store_validators(self, path, endpoint, response_headers, value):
+        """ Keeps the validators and the decoded answer of ``path`` in memory
+
+            Only endpoints with a cache policy, whose answer is stored on disk
+            anyway, write their validators (without the answer) to the disk store.
+        """
+        if endpoint not in self.conditional_endpoints:
+            return
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return
+        with self._validators_lock:
+            self._validators[path] = {"etag": etag, "last_modified": last_modified, "value": value}
+        if self.cache_policies.get(endpoint) is not None:
+            self.cache.set("conditional:" + path, {"etag": etag, "last_modified": last_modified})
+
+    def _fetch_json(self, path, endpoint, rate_group=None):
+        """ Requests ``path`` (conditionally, when validators are stored) and decodes the answer
+        """
+        validators, headers = self._conditional_headers(path, endpoint)
+        response = self._fetch(path, endpoint=endpoint, headers=headers, rate_group=rate_group)
+        if response.status_code == 304 and validators is not None:
+            self.stats.count(endpoint, "not_modified")
+            return validators["value"]
+        start = timer()
+        value = response.json()
+        self.stats.record_decode(endpoint, timer() - start)
+        self._store_validators(path, endpoint, response.headers, value)
+        return value
+
+    def _iter_json(self, path, key=None, endpoint=None, chunk_size=64 * 1024):
+        """ Requests ``path`` and yields the elements of the returned json array while it is downloaded
+
+            Retries happen only before the first element is returned.
+        """
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+        response = self._fetch(path, endpoint=endpoint, stream=True)
+        parser = JsonArrayParser(key=key)
+        bytes_received = 0
+        decode_time = 0.
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                bytes_received += len(chunk)
+                start = timer()
+                items = parser.feed(chunk)
+                decode_time += timer() - start
+                for item in items:
+                    yield item
+                if parser.done:
+                    return
+            for item in parser.close():
+                yield item
+        finally:
+            response.close()
+            self.stats.record_bytes(endpoint, bytes_received)
+            self.stats.record_decode(endpoint, decode_time)
+
+    def _cached(self, path, endpoint):
+        """ Returns ``(value, state)`` of the cached answer for ``path``
+
+            ``state`` is None when the endpoint is not cached or nothing is stored.
+        """
+        policy = self.cache_policies.get(endpoint)
+        if policy is None:
+            return None, None
+        entry = self.cache.get(path)
+        if entry is None:
+            return None, None
+        value, stored_at = entry
+        return value, policy.state(self.cache.clock() - stored_at)
+
+    def _start_revalidation(self, path):
+        with self._revalidating_lock:
+            if path in self._revalidating:
+                return False
+            self._revalidating.add(path)
+            return True
+
+    def _finish_revalidation(self, path):
+        with self._revalidating_lock:
+            self._revalidating.discard(path)
+
+    def _revalidate(self, path, endpoint):
+        try:
+            self.cache.set(path, self._fetch_json(path, endpoint))
+        except Exception as e:
+            log.warning("Refreshing %s failed: %s" % (endpoint, str(e)))
+        finally:
+            self._finish_revalidation(path)
+
+    def _get(self, path, endpoint=None, rate_group=None):
+        """ Requests ``path`` and returns the decoded json answer
+        """
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+        value, state = self._cached(path, endpoint)
+        if state == FRESH:
+            self.stats.count(endpoint, "cache_fresh")
+            return value
+        elif state == STALE:
+            self.stats.count(endpoint, "cache_stale")
+            if self._start_revalidation(path):
+                thread = threading.Thread(target=self._revalidate, args=(path, endpoint))
+                thread.daemon = True
+                thread.start()
+            return value
+        value = self.single_flight.do(path, lambda: self._fetch_json(path, endpoint, rate_group=rate_group))
+        if self.cache_policies.get(endpoint) is not None:
+            self.cache.set(path, value)
+        return value
+
+    def _cached_final(self, path):
+        """ Returns the stored final answer for ``path`` or None
+        """
+        value = self.final_cache.get(path)
+        if value is not None:
+            self.stats.count(path.split("?")[0], "cache_final")
+        return value
+
+    def _get_final(self, path, is_final, rate_group=None):
+        """ Requests ``path`` unless a final answer is stored, answers for which ``is_final``
+            returns True are stored without expiry
+        """
+        value = self._cached_final(path)
+        if value is not None:
+            return value
+        value = self._get(path, rate_group=rate_group)
+        if is_final(value):
+            self.final_cache.set(path, value)
+        return value
+
+    def _iter_parallel(self, func, items, max_workers):
+        """ Calls ``func(item)`` in up to ``max_workers`` threads and yields ``(item, result)`` as they complete
+
+            A call which fails with an :class:`ApiError` yields ``(item, error)``, so
+            that one failed item does not end the iteration. Calls which did not
+            start yet are cancelled when the caller stops iterating.
+        """
+        if len(items) == 0:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(items)))
+        futures = dict((executor.submit(func, item), item) for item in items)
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except ApiError as e:
+                    log.warning("Request for %s failed: %s" % (str(futures[future]), str(e)))
+                    result = e
+                yield futures[future], result
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def get_stats(self):
+        """ Returns the collected measurements per endpoint, the state of the circuit breakers,
+            the latency of the mirrors and the counters of the rate limiter
+        """
+        data = {"endpoints": self.stats.to_dict(), "circuit_breakers": self.circuit_breakers.get_stats(),
+                "mirrors": self.mirrors.get_stats(), "final_cache": self.final_cache.get_stats()}
+        if self.rate_limiter is not None:
+            data["rate_limiter"] = self.rate_limiter.get_stats()
+        return data
+
+    def dump_stats(self, file_name):
+        """ Writes the result of :meth:`get_stats` as json into ``file_name``
+        """
+        extra = dict(self.get_stats())
+        extra.pop("endpoints")
+        self.stats.dump(file_name, extra=extra)
 
     def get_card_details(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "cards/get_details")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("cards/get_details")
+
+    def get_card_details_since(self, version=None):
+        """ Returns ``(card_details, version)``, card_details is None when they still have ``version``
+
+            ``version`` is the ETag of an earlier answer and is sent as ``If-None-Match``,
+            so that unchanged card details are neither transferred nor decoded. The
+            returned version is None when the api sends no ETag.
+        """
+        headers = {"If-None-Match": version} if version is not None else None
+        response = self._fetch("cards/get_details", headers=headers)
+        if response.status_code == 304:
+            self.stats.count("cards/get_details", "not_modified")
+            return None, version
+        start = timer()
+        card_details = response.json()
+        self.stats.record_decode("cards/get_details", timer() - start)
+        return card_details, response.headers.get("ETag")
 
     def get_purchases_stats(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "purchases/stats")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("purchases/stats")
 
     def settings(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "settings")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("settings")
 
     def players_leaderboard(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "players/leaderboard")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
-
-    def find_cards(self, card_ids):
-        if isinstance(card_ids, list):
-            card_ids_str = ','.join(card_ids)
+        return self._get("players/leaderboard")
+
+    @staticmethod
+    def _split_card_ids(card_ids, chunk_size):
+        """ Returns the unique uids in input order and the chunks in which they are requested
+        """
+        if not isinstance(card_ids, (list, tuple)):
+            card_ids = card_ids.split(",")
+        uids = list(OrderedDict.fromkeys(uid.strip() for uid in card_ids if uid.strip() != ""))
+        chunks = [uids[i:i + chunk_size] for i in range(0, len(uids), chunk_size)]
+        return uids, chunks
+
+    @staticmethod
+    def _merge_found_cards(uids, results):
+        found = {}
+        for result in results:
+            for card in result:
+                found[card["uid"]] = card
+        return [found[uid] for uid in uids if uid in found]
+
+    def find_cards(self, card_ids, chunk_size=100, max_workers=4):
+        """ Returns the details of the cards with the given uids
+
+            :param card_ids: List of card uids or a comma separated string
+            :param int chunk_size: Maximum number of uids in a single request
+            :param int max_workers: Maximum number of chunks which are requested at the same time
+
+            Every uid is requested once, the answer contains one entry per found
+            uid in the order of ``card_ids``.
+        """
+        uids, chunks = self._split_card_ids(card_ids, chunk_size)
+        if len(chunks) <= 1:
+            results = [self._get("cards/find?ids=%s" % ",".join(c)) for c in chunks]
         else:
-            card_ids_str = card_ids
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "/cards/find?ids=%s" % card_ids_str)
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+                results = list(executor.map(lambda c: self._get("cards/find?ids=%s" % ",".join(c)), chunks))
+        return self._merge_found_cards(uids, results)
 
     def get_upcoming_tournaments(self, player=None, token=None):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            if player is None and token is None:
-                response = requests.get(self.__url__ + "tournaments/upcoming")
-            elif token is None:
-                response = requests.get(self.__url__ + "tournaments/upcoming?username=%s" % (player))
-            else:
-                response = requests.get(self.__url__ + "tournaments/upcoming?token=%s&username=%s" % (token, player))
-            cnt2 += 1
-        return response.json()
+        if player is None and token is None:
+            return self._get("tournaments/upcoming")
+        elif token is None:
+            return self._get("tournaments/upcoming?username=%s" % (player))
+        return self._get("tournaments/upcoming?token=%s&username=%s" % (token, player))
 
     def get_inprogress_tournaments(self, player=None, token=None):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            if player is None and token is None:
-                response = requests.get(self.__url__ + "tournaments/in_progress")
-            elif token is None:
-                response = requests.get(self.__url__ + "tournaments/in_progress?username=%s" % (player))
-            else:
-                response = requests.get(self.__url__ + "tournaments/in_progress?token=%s&username=%s" % (token, player))
-            cnt2 += 1
-        return response.json()
+        if player is None and token is None:
+            return self._get("tournaments/in_progress")
+        elif token is None:
+            return self._get("tournaments/in_progress?username=%s" % (player))
+        return self._get("tournaments/in_progress?token=%s&username=%s" % (token, player))
 
     def get_completed_tournaments(self, player=None, token=None):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            if player is None and token is None:
-                response = requests.get(self.__url__ + "tournaments/completed")
-            elif token is None:
-                response = requests.get(self.__url__ + "tournaments/completed?username=%s" % (player))
-            else:
-                response = requests.get(self.__url__ + "tournaments/completed?token=%s&username=%s" % (token, player))
-            cnt2 += 1
-        return response.json()
+        if player is None and token is None:
+            return self._get("tournaments/completed")
+        elif token is None:
+            return self._get("tournaments/completed?username=%s" % (player))
+        return self._get("tournaments/completed?token=%s&username=%s" % (token, player))
 
     def get_tournament(self, player, uid, token):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "tournaments/find?id=%s&token=%s&username=%s" % (uid, token, player))
-            cnt2 += 1
-        return response.json()
+        return self._get("tournaments/find?id=%s&token=%s&username=%s" % (uid, token, player))
 
     def get_open_all_packs(self, player, edition, token):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "cards/open_all_packs/%s?player=%s&edition=%d&token=%s&username=%s" % (player, player, edition, token, player))
-            cnt2 += 1
-        return response.json()
+        return self._get("cards/open_all_packs/%s?player=%s&edition=%d&token=%s&username=%s" % (player, player, edition, token, player),
+                         endpoint="cards/open_all_packs")
 
     def get_open_packs(self, uuid, player, edition, token):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "cards/open_pack/%s?player=%s&edition=%d&token=%s&username=%s" % (uuid, player, edition, token, player))
-            cnt2 += 1
-        return response.json()
+        return self._get("cards/open_pack/%s?player=%s&edition=%d&token=%s&username=%s" % (uuid, player, edition, token, player),
+                         endpoint="cards/open_pack")
 
     def get_cards_packs(self, player, token):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "cards/packs/%s?token=%s" % (player, token))
-            cnt2 += 1
-        return response.json()
+        return self._get("cards/packs/%s?token=%s" % (player, token), endpoint="cards/packs")
 
     def get_collection(self, player):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "cards/collection/%s" % player)
-            cnt2 += 1
-        return response.json()
+        return self._get("cards/collection/%s" % player, endpoint="cards/collection")
+
+    def iter_collection(self, player):
+        """ Yields the cards of a collection while the answer is downloaded
+        """
+        return self._iter_json("cards/collection/%s" % player, key="cards", endpoint="cards/collection")
 
     def get_player_login(self, player):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "players/login?name=%s" % player)
-            cnt2 += 1
-        return response.json()
+        return self._get("players/login?name=%s" % player)
 
     def get_player_details(self, player):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "players/details?name=%s" % player)
-            cnt2 += 1
-        return response.json()
-  
+        return self._get("players/details?name=%s" % player)
+
     def get_player_quests(self, player):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "players/quests?username=%s" % player)
-            cnt2 += 1
-        return response.json()
+        return self._get("players/quests?username=%s" % player)
 
     def get_for_sale(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "market/for_sale")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("market/for_sale")
+
+    def iter_for_sale(self):
+        """ Yields the market entries while the answer is downloaded
+        """
+        return self._iter_json("market/for_sale")
 
     def get_purchases_settings(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "purchases/settings")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
-    
+        return self._get("purchases/settings")
+
     def get_purchases_status(self, uuid):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "purchases/status?id=%s" % uuid)
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("purchases/status?id=%s" % uuid)
 
     def get_from_block(self, block_num):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "transactions/history?from_block=%d" % block_num)
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("transactions/history?from_block=%d" % block_num)
+
+    def iter_from_block(self, block_num):
+        """ Yields the transactions starting at ``block_num`` while the answer is downloaded
+        """
+        return self._iter_json("transactions/history?from_block=%d" % block_num)
+
+    @staticmethod
+    def _split_blocks(start_block, stop_block, shard_blocks):
+        """ Returns the ``(first_block, last_block)`` ranges of the shards of a block window
+        """
+        shard_blocks = max(1, shard_blocks)
+        return [(first, min(first + shard_blocks - 1, stop_block))
+                for first in range(start_block, stop_block + 1, shard_blocks)]
+
+    @staticmethod
+    def _history_step(records, first_block, last_block, from_block, seen):
+        """ Processes an answer of ``transactions/history?from_block=from_block`` for the shard
+            ``first_block`` - ``last_block``
+
+            Returns the new records of the shard, the block from which the next
+            request starts (None when the shard is complete) and the ids of the
+            returned records in that block. The last block of an answer may be
+            incomplete, so it is requested again and ``seen`` removes the records
+            which were already returned.
+        """
+        new_records = []
+        max_block = None
+        for record in records:
+            block_num = record["block_num"]
+            if max_block is None or block_num > max_block:
+                max_block = block_num
+            if block_num < max(first_block, from_block) or block_num > last_block or record["id"] in seen:
+                continue
+            new_records.append(record)
+        if max_block is None or max_block > last_block:
+            return new_records, None, set()
+        if max_block <= from_block:
+            # only a single block was returned, it cannot be paged any further
+            if from_block >= last_block:
+                return new_records, None, set()
+            return new_records, from_block + 1, set()
+        return new_records, max_block, set(r["id"] for r in records if r["block_num"] == max_block)
+
+    def _history_shard(self, shard):
+        first_block, last_block = shard
+        shard_records = []
+        from_block = first_block
+        seen = set()
+        while from_block is not None:
+            records, from_block, seen = self._history_step(self.get_from_block(from_block), first_block,
+                                                           last_block, from_block, seen)
+            shard_records.extend(records)
+        return shard_records
+
+    def iter_history(self, start_block, stop_block, shard_blocks=100, max_workers=8):
+        """ Yields the transactions of the blocks ``start_block`` - ``stop_block`` in block order
+
+            :param int start_block: First block
+            :param int stop_block: Last block (included)
+            :param int shard_blocks: Number of blocks which are walked with ``transactions/history``
+                requests in one thread
+            :param int max_workers: Maximum number of shards which are requested at the same time
+
+            The window is split into shards, which are requested concurrently and
+            returned in order. Every transaction is returned once, also when
+            answers overlap at shard boundaries. The requests wait for the rate
+            limiter of the ``transactions/history`` group, which bounds the speedup.
+        """
+        shards = iter(self._split_blocks(start_block, stop_block, shard_blocks))
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        pending = deque()
+        try:
+            # a bounded number of shards runs ahead of the caller
+            for shard in shards:
+                pending.append(executor.submit(self._history_shard, shard))
+                if len(pending) >= 2 * max_workers:
+                    break
+            while len(pending) > 0:
+                records = pending.popleft().result()
+                shard = next(shards, None)
+                if shard is not None:
+                    pending.append(executor.submit(self._history_shard, shard))
+                for record in records:
+                    yield record
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def is_final_transaction(lookup):
+        """ Returns True for the lookup of a transaction which is included in a block
+        """
+        return isinstance(lookup, dict) and "error" not in lookup and \
+            isinstance(lookup.get("trx_info"), dict) and lookup["trx_info"].get("block_num") is not None
 
     def get_transaction(self, trx):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "transactions/lookup?trx_id=%s" % trx)
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get_final("transactions/lookup?trx_id=%s" % trx, self.is_final_transaction)
 
     def get_cards_stats(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "cards/stats")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("cards/stats")
 
     def get_market_for_sale_by_card(self, card_detail_id, gold, edition):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "market/for_sale_by_card?card_detail_id=%d&gold=%s&edition=%d" % (card_detail_id, gold, edition))
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("market/for_sale_by_card?card_detail_id=%d&gold=%s&edition=%d" % (card_detail_id, gold, edition))
 
     def get_market_for_sale_grouped(self):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "market/for_sale_grouped")
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("market/for_sale_grouped")
+
+    def iter_market_for_sale_grouped(self):
+        """ Yields the grouped market entries while the answer is downloaded
+        """
+        return self._iter_json("market/for_sale_grouped")
 
     def get_market_status(self, market_id):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 10:
-            response = requests.get(self.__url__ + "market/status?id=%s" % market_id)
-            if str(response) != '<Response [200]>':
-                time.sleep(2)
-            cnt2 += 1
-        return response.json()
+        return self._get("market/status?id=%s" % market_id)
 
     def get_battle_history(self, player="%24top"):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 20:
-            response = requests.get(self.__url__ + "battle/history?player=%s" % player)
-            if str(response) != '<Response [200]>':
-                time.sleep(1)
-            cnt2 += 1
-        return response.json()
+        return self._get("battle/history?player=%s" % player)
+
+    @staticmethod
+    def is_final_battle_result(result):
+        """ Returns True for the result of a finished battle, which never changes again
+        """
+        return isinstance(result, dict) and result.get("winner") is not None and \
+            "error" not in result and "Error" not in result
 
     def get_battle_result(self, ids):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 20:
-            response = requests.get(self.__url__ + "battle/result?id=%s" % ids)
-            if str(response) != '<Response [200]>':
-                time.sleep(1)
-            cnt2 += 1
-        return response.json()
+        return self._get_final("battle/result?id=%s" % ids, self.is_final_battle_result)
 
     def get_battle_status(self, ids):
-        response = ""
-        cnt2 = 0
-        while str(response) != '<Response [200]>' and cnt2 < 20:
-            response = requests.get(self.__url__ + "battle/status?id=%s" % ids)
-            if str(response) != '<Response [200]>':
-                time.sleep(1)
-            cnt2 += 1
-        return response.json()
+        return self._get("battle/status?id=%s" % ids)
+
+    def _bulk_battle_result(self, battle_id):
+        return self._get_final("battle/result?id=%s" % battle_id, self.is_final_battle_result,
+                               rate_group="battle/bulk")
+
+    def _bulk_battle_status(self, battle_id):
+        return self._get("battle/status?id=%s" % battle_id, rate_group="battle/bulk")
+
+    def iter_battle_results(self, ids, max_workers=8):
+        """ Yields ``(id, result)`` for many battle ids, in the order in which the results arrive
+
+            Results of finished battles are stored without expiry and are returned
+            first, without a request. The remaining ids are requested in up to
+            ``max_workers`` threads. When the request for an id fails, the
+            :class:`ApiError` is yielded as its result.
+
+            The requests wait for the rate limiter group ``battle/bulk`` (10 requests
+            per second by default), not for the ``battle`` group of the polling loops.
+
+            :param ids: Iterable of battle (trx) ids, duplicates are requested once
+            :param int max_workers: Maximum number of requests in flight
+        """
+        missing = []
+        for battle_id in OrderedDict.fromkeys(ids):
+            result = self._cached_final("battle/result?id=%s" % battle_id)
+            if result is not None:
+                yield battle_id, result
+            else:
+                missing.append(battle_id)
+        for item in self._iter_parallel(self._bulk_battle_result, missing, max_workers):
+            yield item
+
+    def iter_battle_statuses(self, ids, max_workers=8):
+        """ Yields ``(id, status)`` for many battle ids, in the order in which the answers arrive
+
+            When the request for an id fails, the :class:`ApiError` is yielded as its status.
+            Like :meth:`iter_battle_results`, the requests use the ``battle/bulk`` rate budget.
+
+            :param ids: Iterable of battle (trx) ids, duplicates are requested once
+            :param int max_workers: Maximum number of requests in flight
+        """
+        return self._iter_parallel(self._bulk_battle_status, list(OrderedDict.fromkeys(ids)), max_workers)
@@ -0,0 +1,270 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import sqlite3
+from steemmonsters.constants import xp_level, max_level_rarity
+from steemmonsters.teams import team_key_from_details, team_key_to_string
+from steemmonsters.utils import _card_color, get_summoner_level
+
+#: Increased with every change of the tables, older stores are rebuilt
+SCHEMA_VERSION = 2
+
+#: A packed team key has up to 112 bits, SQLite integers only 64, so it is stored in two columns
+_KEY_PART_BITS = 56
+_KEY_PART_MASK = (1 << _KEY_PART_BITS) - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS battles (
+    id TEXT PRIMARY KEY,
+    block_num INTEGER NOT NULL,
+    created_date TEXT,
+    mana_cap INTEGER,
+    ruleset TEXT,
+    player_1 TEXT,
+    player_2 TEXT,
+    player_1_rating INTEGER,
+    player_2_rating INTEGER,
+    winner TEXT
+);
+CREATE TABLE IF NOT EXISTS teams (
+    battle_id TEXT NOT NULL,
+    side INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    team_high INTEGER NOT NULL,
+    team_low INTEGER NOT NULL,
+    summoner_id INTEGER NOT NULL,
+    summoner_level INTEGER,
+    color TEXT,
+    won INTEGER NOT NULL,
+    block_num INTEGER NOT NULL,
+    mana_cap INTEGER,
+    ruleset TEXT,
+    PRIMARY KEY (battle_id, side)
+);
+CREATE INDEX IF NOT EXISTS battles_block ON battles (block_num);
+CREATE INDEX IF NOT EXISTS teams_player ON teams (player, block_num);
+CREATE INDEX IF NOT EXISTS teams_deck ON teams (mana_cap, color, summoner_level, block_num);
+"""
+
+
+def _join_key(high, low):
+    return high << _KEY_PART_BITS | low
+
+
+class BattleStore(object):
+    """ Local SQLite store of the battles of ``sm_team_reveal`` transactions
+
+        Every battle is stored with mana cap, ruleset, players, ratings and
+        winner, and both teams with packed team key (see :mod:`steemmonsters.teams`),
+        summoner, summoner level (1-4) and splinter. The highest block up to which
+        the history was read is kept as high-water mark, so that :meth:`sync`
+        only reads new blocks.
+
+        .. code-block:: python
+
+            store = BattleStore(os.path.join(cache_dir, "battles.sqlite"), cards)
+            store.sync(api, blockchain.get_current_block_num())
+            decks = store.team_scores("red", summoner_level=4, mana_cap=25)
+
+        :param str path: Database file, ``":memory:"`` keeps the store in memory
+        :param cards: :class:`steemmonsters.cards.CardDatabase` or dict of card details
+        :param int commit_blocks: While syncing, the store is committed after this many blocks
+    """
+    def __init__(self, path=":memory:", cards=None, commit_blocks=100):
+        self.path = path
+        self.cards = cards
+        self.commit_blocks = commit_blocks
+        if path != ":memory:" and os.path.dirname(path) != "" and not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS battles; DROP TABLE IF EXISTS teams;")
+            self.db.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        self.db.executescript(_SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM battles").fetchone()[0]
+
+    @property
+    def high_water_mark(self):
+        """ Highest block which was read completely, None for an empty store
+        """
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'high_water_mark'").fetchone()
+        if row is None:
+            return None
+        return int(row[0])
+
+    def _set_high_water_mark(self, block_num):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('high_water_mark', ?)", (str(block_num), ))
+
+    def _summoner_level(self, summoner):
+        if self.cards is None:
+            return None
+        try:
+            return get_summoner_level(summoner, self.cards, xp_level, max_level_rarity)
+        except KeyError:
+            return None
+
+    def _color(self, card_id):
+        if self.cards is None or card_id not in self.cards:
+            return None
+        return _card_color(self.cards, card_id).lower()
+
+    def add_transaction(self, record):
+        """ Stores the battle of a ``transactions/history`` entry, returns True for a new battle
+
+            Entries which are no finished battle are ignored.
+        """
+        if record.get("type") != "sm_team_reveal" or not record.get("success"):
+            return False
+        result = record["result"]
+        if not isinstance(result, dict):
+            result = json.loads(result)
+        battle = result.get("battle")
+        if battle is None or "details" not in battle:
+            return False
+        details = battle["details"]
+        if not isinstance(details, dict):
+            details = json.loads(details)
+        if "team1" not in details or "team2" not in details:
+            return False
+        block_num = battle.get("block_num", record["block_num"])
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO battles (id, block_num, created_date, mana_cap, ruleset, player_1, player_2, "
+            "player_1_rating, player_2_rating, winner) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (battle["id"], block_num, battle.get("created_date", record.get("created_date")), battle.get("mana_cap"),
+             battle.get("ruleset"), battle.get("player_1"), battle.get("player_2"),
+             battle.get("player_1_rating_initial"), battle.get("player_2_rating_initial"), details.get("winner")))
+        if cursor.rowcount == 0:
+            return False
+        rows = []
+        for side in [1, 2]:
+            team = details["team%d" % side]
+            summoner = team["summoner"]
+            key = team_key_from_details(team)
+            rows.append((battle["id"], side, team["player"], key >> _KEY_PART_BITS, key & _KEY_PART_MASK,
+                         summoner["card_detail_id"], self._summoner_level(summoner),
+                         self._color(summoner["card_detail_id"]), 1 if details.get("winner") == team["player"] else 0,
+                         block_num, battle.get("mana_cap"), battle.get("ruleset")))
+        self.db.executemany("INSERT OR IGNORE INTO teams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return True
+
+    def sync(self, api, stop_block, window=1200, shard_blocks=100, max_workers=8):
+        """ Reads the blocks after the high-water mark up to ``stop_block`` and stores their battles
+
+            :param Api api: Api from which ``transactions/history`` is read
+            :param int stop_block: Last block which is read
+            :param int window: Number of blocks which are read into an empty store,
+                and the maximum gap which is filled
+            :param int shard_blocks: See :meth:`steemmonsters.api.Api.iter_history`
+            :param int max_workers: See :meth:`steemmonsters.api.Api.iter_history`
+
+            Returns the number of new battles. The store is committed regularly with
+            the last complete block as high-water mark, so that an interrupted sync
+            continues from there. ``transactions/history`` lags behind the head
+            of the chain, so the high-water mark ends at the highest block which
+            was returned and not at ``stop_block``: blocks without transactions
+            are read again by the next sync, until the api returns later blocks.
+        """
+        start_block = stop_block - window + 1
+        if self.high_water_mark is not None:
+            start_block = max(start_block, self.high_water_mark + 1)
+        if start_block > stop_block:
+            return 0
+        added = 0
+        committed_block = start_block - 1
+        last_block = None
+        try:
+            for record in api.iter_history(start_block, stop_block, shard_blocks=shard_blocks,
+                                           max_workers=max_workers):
+                # transactions arrive in block order, all blocks before this one are complete
+                if record["block_num"] - 1 >= committed_block + self.commit_blocks:
+                    committed_block = record["block_num"] - 1
+                    self._set_high_water_mark(committed_block)
+                    self.db.commit()
+                if self.add_transaction(record):
+                    added += 1
+                last_block = record["block_num"]
+            if last_block is not None and last_block > committed_block:
+                self._set_high_water_mark(last_block)
+        finally:
+            self.db.commit()
+        return added
+
+    def battles(self, player, limit=10):
+        """ Returns the last battles of a player, newest first, with the own and the opposing team string
+        """
+        cursor = self.db.execute(
+            "SELECT b.*, t.team_high AS team_high, t.team_low AS team_low, t.won AS won, "
+            "t.summoner_level AS summoner_level, o.player AS opponent, o.team_high AS opponent_team_high, "
+            "o.team_low AS opponent_team_low FROM teams t "
+            "JOIN battles b ON b.id = t.battle_id "
+            "JOIN teams o ON o.battle_id = t.battle_id AND o.side != t.side "
+            "WHERE t.player = ? ORDER BY t.block_num DESC LIMIT ?", (player, limit))
+        battles = []
+        for row in cursor:
+            battle = dict(row)
+            battle["team"] = team_key_to_string(_join_key(battle.pop("team_high"), battle.pop("team_low")))
+            battle["opponent_team"] = team_key_to_string(_join_key(battle.pop("opponent_team_high"),
+                                                                   battle.pop("opponent_team_low")))
+            battles.append(battle)
+        return battles
+
+    def last_team(self, player, mana_cap=None):
+        """ Returns the team string of the last stored battle of a player, None when there is none
+        """
+        if mana_cap is None:
+            row = self.db.execute("SELECT team_high, team_low FROM teams WHERE player = ? "
+                                  "ORDER BY block_num DESC LIMIT 1", (player, )).fetchone()
+        else:
+            row = self.db.execute("SELECT team_high, team_low FROM teams WHERE player = ? AND mana_cap = ? "
+                                  "ORDER BY block_num DESC LIMIT 1", (player, mana_cap)).fetchone()
+        if row is None:
+            return None
+        return team_key_to_string(_join_key(row[0], row[1]))
+
+    def team_scores(self, color, summoner_level, mana_cap, since_block=None):
+        """ Returns wins and losses of the teams of a splinter, best win ratio first
+
+            Only battles with ``mana_cap`` in which both summoners have ``summoner_level``
+            are counted. Each entry has ``deck`` (team string), ``key`` (packed team
+            key), ``n``, ``win``, ``loose``, ``score`` (wins minus losses), ``mana_cap`` and ``ruleset``.
+
+            :param str color: Splinter color of the summoner, e.g. ``"red"``
+            :param int since_block: Only battles from this block on are counted
+        """
+        if since_block is None:
+            since_block = 0
+        cursor = self.db.execute(
+            "SELECT t.team_high AS team_high, t.team_low AS team_low, COUNT(*) AS n, SUM(t.won) AS win, COUNT(*) - SUM(t.won) AS loose, "
+            "2 * SUM(t.won) - COUNT(*) AS score, t.mana_cap AS mana_cap, MIN(t.ruleset) AS ruleset FROM teams t "
+            "JOIN teams o ON o.battle_id = t.battle_id AND o.side != t.side "
+            "WHERE t.mana_cap = ? AND t.color = ? AND t.summoner_level = ? AND t.block_num >= ? "
+            "AND o.summoner_level = ? GROUP BY t.team_high, t.team_low "
+            "ORDER BY CAST(SUM(t.won) AS REAL) / COUNT(*) DESC, COUNT(*) DESC",
+            (mana_cap, color.lower(), summoner_level, since_block, summoner_level))
+        scores = []
+        for row in cursor:
+            score = dict(row)
+            score["key"] = _join_key(score.pop("team_high"), score.pop("team_low"))
+            score["deck"] = team_key_to_string(score["key"])
+            scores.append(score)
+        return scores
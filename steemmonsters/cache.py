@@ -0,0 +1,297 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+
+class CachePolicy(object):
+    """ Defines how long a cached api answer can be used
+
+        :param float ttl: Seconds in which a cached answer is used without asking the api
+        :param float stale_ttl: Seconds after ``ttl`` in which the cached answer is still
+            returned, while a fresh one is fetched in the background
+    """
+    def __init__(self, ttl, stale_ttl=0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def __repr__(self):
+        return "<CachePolicy ttl=%d stale_ttl=%d>" % (self.ttl, self.stale_ttl)
+
+    def state(self, age):
+        """ Returns ``FRESH``, ``STALE`` or ``EXPIRED`` for an entry of the given age
+        """
+        if age < self.ttl:
+            return FRESH
+        elif age < self.ttl + self.stale_ttl:
+            return STALE
+        return EXPIRED
+
+
+class ResponseCache(object):
+    """ Stores decoded api answers in memory and optionally on disk
+
+        The disk store holds one json file per key, so that cached answers
+        survive a restart. The returned objects are shared between callers
+        and must not be modified.
+
+        :param str path: Directory of the disk store, when None only the memory is used
+        :param clock: Function returning the current unix time, used for ``stored_at``
+    """
+    def __init__(self, path=None, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file_name(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key):
+        """ Returns ``(value, stored_at)`` for the key or None when nothing is stored
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None or self.path is None:
+            return entry
+        try:
+            with io.open(self._file_name(key), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if stored.get("key") != key:
+            return None
+        entry = (stored["value"], stored["stored_at"])
+        with self._lock:
+            self._entries.setdefault(key, entry)
+        return entry
+
+    def set(self, key, value, stored_at=None):
+        """ Stores a value, ``stored_at`` defaults to the current time
+        """
+        if stored_at is None:
+            stored_at = self.clock()
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+        if self.path is None:
+            return
+        data = json.dumps({"key": key, "stored_at": stored_at, "value": value})
+        # Write to a temporary file first, so that readers never see a half written entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with io.open(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_name, self._file_name(key))
+        except (IOError, OSError):
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+
+    def clear(self):
+        """ Removes all entries from memory and disk
+        """
+        with self._lock:
+            self._entries = {}
+        if self.path is None:
+            return
+        for name in os.listdir(self.path):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.path, name))
+
+
+class ImmutableCache(object):
+    """ Stores api answers which never change again, e.g. results of finished battles
+
+        Each answer is written as compact, zlib compressed json into a file named
+        after the sha1 hash of its key (e.g. ``battle/result?id=<trx_id>``), in one
+        of 256 sub directories. The most recently used decoded answers are kept
+        in memory, so that repeated reads need neither disk access nor decoding.
+
+        When the files grow beyond ``max_size`` bytes, the least recently used
+        ones are removed. Reading a file updates its modification time, which
+        decides after a restart which files were used last.
+
+        :param str path: Directory of the disk store, when None only the memory is used
+        :param int memory_items: Number of decoded answers kept in memory
+        :param int max_size: Upper limit for the size of all files in bytes
+        :param int level: zlib compression level
+    """
+    def __init__(self, path=None, memory_items=1024, max_size=256 * 1024 * 1024, level=6):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_size = max_size
+        self.level = level
+        self._memory = OrderedDict()
+        self._files = None
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file_name(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(digest[:2], digest[2:] + ".z")
+
+    def _scan(self):
+        """ Builds the index of all stored files, ordered from least to most recently used
+        """
+        if self._files is not None:
+            return
+        found = []
+        for directory in os.listdir(self.path):
+            full_directory = os.path.join(self.path, directory)
+            if len(directory) != 2 or not os.path.isdir(full_directory):
+                continue
+            for name in os.listdir(full_directory):
+                if not name.endswith(".z"):
+                    continue
+                stat = os.stat(os.path.join(full_directory, name))
+                found.append((stat.st_mtime, os.path.join(directory, name), stat.st_size))
+        found.sort()
+        self._files = OrderedDict((name, size) for mtime, name, size in found)
+        self._disk_size = sum(self._files.values())
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def encode(key, value, level=6):
+        return zlib.compress(json.dumps([key, value], separators=(",", ":")).encode("utf-8"), level)
+
+    @staticmethod
+    def decode(data):
+        """ Returns ``(key, value)`` of an encoded entry
+        """
+        key, value = json.loads(zlib.decompress(data).decode("utf-8"))
+        return key, value
+
+    def get(self, key):
+        """ Returns the stored answer for the key or None
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return self._memory[key]
+            if self.path is None:
+                self.misses += 1
+                return None
+            self._scan()
+            name = self._file_name(key)
+            if name not in self._files:
+                self.misses += 1
+                return None
+            self._files.move_to_end(name)
+        try:
+            with io.open(os.path.join(self.path, name), "rb") as f:
+                stored_key, value = self.decode(f.read())
+        except (IOError, OSError, ValueError, zlib.error):
+            stored_key = None
+        with self._lock:
+            if stored_key != key:
+                self.misses += 1
+                return None
+            self.hits_disk += 1
+            self._remember(key, value)
+        try:
+            os.utime(os.path.join(self.path, name), None)
+        except OSError:
+            pass
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+            if self.path is None:
+                return False
+            self._scan()
+            return self._file_name(key) in self._files
+
+    def set(self, key, value):
+        """ Stores an answer, it is written only once
+        """
+        with self._lock:
+            self._remember(key, value)
+            if self.path is None:
+                return
+            self._scan()
+            name = self._file_name(key)
+            if name in self._files:
+                return
+        data = self.encode(key, value, self.level)
+        full_name = os.path.join(self.path, name)
+        directory = os.path.dirname(full_name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with io.open(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, full_name)
+        except (IOError, OSError):
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+        with self._lock:
+            if name not in self._files:
+                self._files[name] = len(data)
+                self._disk_size += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._disk_size > self.max_size and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def clear(self):
+        """ Removes all answers from memory and disk
+        """
+        with self._lock:
+            self._memory = OrderedDict()
+            if self.path is None:
+                return
+            self._scan()
+            for name in self._files:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+            self._files = OrderedDict()
+            self._disk_size = 0
+
+    def get_stats(self):
+        with self._lock:
+            if self.path is not None:
+                self._scan()
+            return {"memory_items": len(self._memory), "disk_items": len(self._files or {}),
+                    "disk_size": self._disk_size, "hits_memory": self.hits_memory,
+                    "hits_disk": self.hits_disk, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,449 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from array import array
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from steemmonsters.lazy import Deferred
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger(__name__)
+
+
+#: Per level stats which are stored for every card
+STAT_NAMES = ("mana", "attack", "ranged", "magic", "armor", "health", "speed")
+
+SNAPSHOT_MAGIC = b"SMCD"
+#: Increased with every change of the snapshot layout, older snapshots are rebuilt
+SNAPSHOT_FORMAT = 1
+# magic, format, byte order, count, max_level, number of colors
+_SNAPSHOT_HEADER = struct.Struct("<4sHHIII")
+# offset and length of a section
+_SNAPSHOT_SECTION = struct.Struct("<QQ")
+_SNAPSHOT_COLUMNS = (("ids", "i"), ("rarities", "b"), ("color_codes", "b"), ("edition_masks", "H"),
+                     ("summoners", "b"), ("levels", "b")) + tuple(("stat:" + name, "h") for name in STAT_NAMES)
+# offsets of the names, colors and version in the string table, the string table and the raw card details
+_SNAPSHOT_SECTIONS = _SNAPSHOT_COLUMNS + (("string_offsets", "I"), ("strings", "B"), ("details", "B"))
+_BYTE_ORDERS = {"little": 1, "big": 2}
+
+
+def card_details_version(card_details):
+    """ Returns a digest of the ``cards/get_details`` answer, it changes with every change of the card details
+    """
+    data = json.dumps(card_details, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class CardDatabase(object):
+    """ Card details of ``cards/get_details`` in compact, indexed columns
+
+        Each card is a row. Id, rarity, color, editions and type are stored in
+        ``array`` columns, the stats in one flat column per stat with
+        ``max_level`` entries per card. Summoner stats do not depend on the level
+        and are repeated; levels above the last level of a card repeat its last
+        value. Rows are found in O(1) by id, by name and by color.
+
+        The database can be used like the former ``cards`` dict: ``cards[card_id]``
+        returns the original card details.
+
+        .. code-block:: python
+
+            cards = CardDatabase(api.get_card_details())
+            mana = cards.stat("mana", cards.id_of("Goblin Shaman"), level=3)
+
+        A database can be saved as binary snapshot with :meth:`save`. :meth:`open`
+        maps the snapshot into memory and uses its columns without parsing, the
+        card details are only decoded when they are accessed.
+
+        :param list card_details: Answer of ``cards/get_details``
+        :param str version: Version of the card details, e.g. :func:`card_details_version`
+    """
+    def __init__(self, card_details, version=None):
+        self.version = version
+        self._details = list(card_details)
+        self._details_data = None
+        names = [c["name"] for c in self._details]
+        colors = []
+        ids = array("i")
+        rarities = array("b")
+        color_codes = array("b")
+        edition_masks = array("H")
+        summoners = array("b")
+        levels = array("b")
+        color_codes_by_color = {}
+        for card in self._details:
+            stats = card.get("stats") or {}
+            ids.append(card["id"])
+            rarities.append(card.get("rarity", 0))
+            color = card.get("color", "")
+            if color not in color_codes_by_color:
+                color_codes_by_color[color] = len(colors)
+                colors.append(color)
+            color_codes.append(color_codes_by_color[color])
+            mask = 0
+            for edition in str(card.get("editions", "")).split(","):
+                if edition.strip() != "":
+                    mask |= 1 << int(edition)
+            edition_masks.append(mask)
+            summoners.append(1 if card.get("type") == "Summoner" else 0)
+            levels.append(max([len(v) for v in stats.values() if isinstance(v, list)] + [1]))
+        max_level = max(levels) if len(levels) > 0 else 1
+        stat_columns = {}
+        for name in STAT_NAMES:
+            column = array("h")
+            for card in self._details:
+                value = (card.get("stats") or {}).get(name, 0)
+                if not isinstance(value, list):
+                    value = [value]
+                elif len(value) == 0:
+                    value = [0]
+                value = [int(v) for v in value[:max_level]]
+                column.extend(value + [value[-1]] * (max_level - len(value)))
+            stat_columns[name] = column
+        self._set_columns(names, colors, ids, rarities, color_codes, edition_masks, summoners, levels,
+                          max_level, stat_columns)
+
+    def _set_columns(self, names, colors, ids, rarities, color_codes, edition_masks, summoners, levels,
+                     max_level, stat_columns):
+        self.names = names
+        self.colors = colors
+        self.ids = ids
+        self.rarities = rarities
+        self.color_codes = color_codes
+        self.edition_masks = edition_masks
+        self.summoners = summoners
+        self.levels = levels
+        self.max_level = max_level
+        self._stats = stat_columns
+        self._arrays = {}
+        self._rows = {}
+        self._rows_by_name = {}
+        self._ids_by_color = {}
+        for row, card_id in enumerate(ids):
+            self._rows[card_id] = row
+            self._rows_by_name[names[row]] = row
+            self._ids_by_color.setdefault(colors[color_codes[row]].lower(), []).append(card_id)
+
+    @property
+    def details(self):
+        """ List with the card details in database order
+        """
+        if self._details is None:
+            self._details = json.loads(bytes(self._details_data).decode("utf-8"))
+            self._details_data = None
+        return self._details
+
+    def save(self, path):
+        """ Writes the database as binary snapshot into ``path``
+
+            The file is replaced atomically. The version is computed when it is not set.
+        """
+        if self.version is None:
+            self.version = card_details_version(self.details)
+        strings = [n.encode("utf-8") for n in self.names] + [c.encode("utf-8") for c in self.colors] + \
+            [self.version.encode("utf-8")]
+        string_offsets = array("I", [0])
+        for data in strings:
+            string_offsets.append(string_offsets[-1] + len(data))
+        if self._details is None:
+            details = bytes(self._details_data)
+        else:
+            details = json.dumps(self._details, separators=(",", ":")).encode("utf-8")
+        sections = [self.ids, self.rarities, self.color_codes, self.edition_masks, self.summoners, self.levels]
+        sections += [self._stats[name] for name in STAT_NAMES]
+        sections += [string_offsets, b"".join(strings), details]
+        sections = [bytes(memoryview(section).cast("B")) if not isinstance(section, bytes) else section
+                    for section in sections]
+        header = _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, _BYTE_ORDERS[sys.byteorder],
+                                       len(self.ids), self.max_level, len(self.colors))
+        offset = _align(len(header) + _SNAPSHOT_SECTION.size * len(sections))
+        table = []
+        for data in sections:
+            table.append(_SNAPSHOT_SECTION.pack(offset, len(data)))
+            offset = _align(offset + len(data))
+        directory = os.path.dirname(path)
+        if directory != "" and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(b"".join(table))
+            for data in sections:
+                f.write(b"\0" * (_align(f.tell()) - f.tell()))
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path):
+        """ Maps the binary snapshot ``path`` into memory and returns it as database
+
+            Raises ``ValueError`` when the file is no snapshot of this format or
+            was written on a platform with another byte order.
+        """
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        if len(view) < _SNAPSHOT_HEADER.size:
+            raise ValueError("%s is no card snapshot" % path)
+        magic, snapshot_format, byte_order, count, max_level, color_count = _SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC or snapshot_format != SNAPSHOT_FORMAT:
+            raise ValueError("%s is no card snapshot of format %d" % (path, SNAPSHOT_FORMAT))
+        if byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise ValueError("%s was written with another byte order" % path)
+        expected = {"string_offsets": count + color_count + 2}
+        expected.update((name, count) for name, typecode in _SNAPSHOT_COLUMNS)
+        expected.update(("stat:" + name, count * max_level) for name in STAT_NAMES)
+        sections = {}
+        position = _SNAPSHOT_HEADER.size
+        for name, typecode in _SNAPSHOT_SECTIONS:
+            if position + _SNAPSHOT_SECTION.size > len(view):
+                raise ValueError("%s is truncated" % path)
+            offset, length = _SNAPSHOT_SECTION.unpack_from(view, position)
+            position += _SNAPSHOT_SECTION.size
+            if offset + length > len(view):
+                raise ValueError("%s is truncated" % path)
+            section = view[offset:offset + length].cast(typecode)
+            if name in expected and len(section) != expected[name]:
+                raise ValueError("Section %s of %s has a wrong size" % (name, path))
+            sections[name] = section
+        offsets = sections["string_offsets"]
+        strings = sections["strings"]
+        decoded = [bytes(strings[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(len(offsets) - 1)]
+        db = cls.__new__(cls)
+        db.version = decoded[-1]
+        db._details = None
+        db._details_data = sections["details"]
+        db._mmap = data
+        db._set_columns(decoded[:count], decoded[count:count + color_count], sections["ids"],
+                        sections["rarities"], sections["color_codes"], sections["edition_masks"],
+                        sections["summoners"], sections["levels"], max_level,
+                        dict((name, sections["stat:" + name]) for name in STAT_NAMES))
+        return db
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, card_id):
+        return card_id in self._rows
+
+    def __getitem__(self, card_id):
+        return self.details[self._rows[card_id]]
+
+    def get(self, card_id, default=None):
+        row = self._rows.get(card_id)
+        if row is None:
+            return default
+        return self.details[row]
+
+    def row(self, card_id):
+        """ Returns the row of a card id, raises ``KeyError`` for unknown ids
+        """
+        return self._rows[card_id]
+
+    def by_name(self, name):
+        """ Returns the card details for a card name
+        """
+        return self.details[self._rows_by_name[name]]
+
+    def id_of(self, name):
+        """ Returns the id of a card name, raises ``KeyError`` for unknown names
+        """
+        return self.ids[self._rows_by_name[name]]
+
+    def has_name(self, name):
+        return name in self._rows_by_name
+
+    def name(self, card_id):
+        return self.names[self._rows[card_id]]
+
+    def color(self, card_id):
+        return self.colors[self.color_codes[self._rows[card_id]]]
+
+    def rarity(self, card_id):
+        return self.rarities[self._rows[card_id]]
+
+    def editions(self, card_id):
+        """ Returns the editions in which the card was released
+        """
+        mask = self.edition_masks[self._rows[card_id]]
+        return [e for e in range(mask.bit_length()) if mask & (1 << e)]
+
+    def is_summoner(self, card_id):
+        return self.summoners[self._rows[card_id]] == 1
+
+    def ids_by_color(self, color):
+        """ Returns the ids of all cards of a color (case insensitive) in database order
+        """
+        return list(self._ids_by_color.get(color.lower(), []))
+
+    def stat(self, name, card_id, level=1):
+        """ Returns a stat of a card at a level (starting with 1)
+        """
+        if level > self.max_level:
+            level = self.max_level
+        elif level < 1:
+            level = 1
+        return self._stats[name][self._rows[card_id] * self.max_level + level - 1]
+
+    def stat_getter(self, name):
+        """ Returns a function ``get(card_id, level=1)`` for one stat, for use in loops
+        """
+        column = self._stats[name]
+        rows = self._rows
+        max_level = self.max_level
+
+        def get(card_id, level=1):
+            if level > max_level:
+                level = max_level
+            elif level < 1:
+                level = 1
+            return column[rows[card_id] * max_level + level - 1]
+        return get
+
+    def stat_levels(self, name, card_id):
+        """ Returns the values of a stat for all levels of a card
+        """
+        row = self._rows[card_id]
+        start = row * self.max_level
+        return self._stats[name][start:start + self.levels[row]].tolist()
+
+    def column(self, name):
+        """ Returns the flat stat column, the value of ``row`` at ``level`` is at
+            ``row * max_level + level - 1``
+
+            The column is an ``array`` or, for an opened snapshot, a ``memoryview``.
+        """
+        return self._stats[name]
+
+    def _numpy_column(self, name):
+        column = self._arrays.get(name)
+        if column is None:
+            column = np.frombuffer(self._stats[name], dtype=np.short)
+            self._arrays[name] = column
+        return column
+
+    def _numpy_rows(self):
+        """ Returns an array which maps card ids to rows, -1 for unknown ids
+        """
+        rows = self._arrays.get("rows")
+        if rows is None:
+            rows = np.full(max(self.ids) + 1 if len(self.ids) > 0 else 1, -1, dtype=np.intp)
+            rows[np.frombuffer(self.ids, dtype=np.intc)] = np.arange(len(self.ids))
+            self._arrays["rows"] = rows
+        return rows
+
+    def stat_matrix(self, name, ids, levels):
+        """ Returns a stat of many cards at once, e.g. of all slots of many teams
+
+            :param ids: Card ids, e.g. a matrix with one team per row, 0 marks an empty slot
+            :param levels: Levels of the cards in the same shape
+
+            Empty slots have the value 0, unknown ids raise ``KeyError``. With numpy,
+            a numpy array in the shape of ``ids`` is returned, otherwise nested lists.
+        """
+        if np is None:
+            get = self.stat_getter(name)
+            if len(ids) > 0 and isinstance(ids[0], (list, tuple)):
+                return [[get(i, l) if i != 0 else 0 for i, l in zip(row_ids, row_levels)]
+                        for row_ids, row_levels in zip(ids, levels)]
+            return [get(i, l) if i != 0 else 0 for i, l in zip(ids, levels)]
+        ids = np.asarray(ids, dtype=np.intp)
+        levels = np.asarray(levels, dtype=np.intp)
+        lookup = self._numpy_rows()
+        known = (ids > 0) & (ids < len(lookup))
+        rows = np.where(known, lookup[np.where(known, ids, 0)], -1)
+        if ((rows < 0) & (ids != 0)).any():
+            raise KeyError("Unknown card id")
+        empty = rows < 0
+        index = np.where(empty, 0, rows) * self.max_level + np.clip(levels, 1, self.max_level) - 1
+        values = self._numpy_column(name)[index].astype(np.int64)
+        values[empty] = 0
+        return values
+
+
+def _align(offset, alignment=8):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class CardStore(object):
+    """ Keeps the card database in a binary snapshot file
+
+        :meth:`load` opens the snapshot, which needs neither a request nor json
+        parsing. Only when it is missing or unusable, the card details are
+        fetched and the snapshot is written. :meth:`refresh` asks for the card
+        details with the version of the snapshot and replaces database and
+        snapshot only when a newer version is returned.
+
+        .. code-block:: python
+
+            store = CardStore(os.path.join(cache_dir, "cards.snapshot"), api.get_card_details_since)
+            if store.load():
+                store.start_refresh()
+            cards = store.cards
+
+        :param str path: Snapshot file
+        :param fetch: Function which is called with the current version (None when
+            nothing is loaded) and returns ``(card_details, version)`` like
+            :meth:`steemmonsters.api.Api.get_card_details_since`
+    """
+    def __init__(self, path, fetch):
+        self.path = path
+        self.fetch = fetch
+        self.cards = None
+
+    def load(self):
+        """ Loads the database, returns True when it came from the snapshot
+        """
+        try:
+            self.cards = CardDatabase.open(self.path)
+            return True
+        except (IOError, OSError, ValueError) as e:
+            log.debug("Card snapshot %s not used: %s" % (self.path, str(e)))
+        self.refresh()
+        return False
+
+    def refresh(self):
+        """ Fetches the card details unless they are unchanged, returns True when the database changed
+
+            Without a version from ``fetch``, the digest of the card details is used.
+        """
+        current = self.cards.version if self.cards is not None else None
+        card_details, version = self.fetch(current)
+        if card_details is None:
+            return False
+        if version is None:
+            version = card_details_version(card_details)
+        if version == current:
+            return False
+        cards = CardDatabase(card_details, version=version)
+        try:
+            cards.save(self.path)
+        except (IOError, OSError) as e:
+            log.warning("Card snapshot %s could not be written: %s" % (self.path, str(e)))
+        self.cards = cards
+        return True
+
+    def _refresh(self):
+        try:
+            return self.refresh()
+        except Exception as e:
+            log.warning("Card details could not be refreshed: %s" % str(e))
+            return False
+
+    def start_refresh(self):
+        """ Runs :meth:`refresh` in a background thread and returns its :class:`steemmonsters.lazy.Deferred`
+        """
+        return Deferred(self._refresh, name="cards refresh")
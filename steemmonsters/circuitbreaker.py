@@ -0,0 +1,132 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+import time
+
+
+#: Requests pass, failures are counted
+CLOSED = "closed"
+#: Requests are rejected until the recovery timeout has passed
+OPEN = "open"
+#: A single probe request is allowed, its outcome closes or opens the circuit again
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker(object):
+    """ Stops calls to a failing endpoint for a while
+
+        After ``failure_threshold`` consecutive failed requests the circuit opens
+        and :meth:`allow` returns False for ``recovery_timeout`` seconds. Then it
+        becomes half-open and lets one probe request through: when the probe
+        succeeds the circuit closes, otherwise it opens again.
+
+        :param int failure_threshold: Number of consecutive failures which open the
+            circuit, 0 never opens it
+        :param float recovery_timeout: Seconds the circuit stays open before a probe
+            request is allowed
+        :param clock: Function returning the current time in seconds
+    """
+    def __init__(self, failure_threshold=5, recovery_timeout=15., clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._probe_started = None
+
+    def __repr__(self):
+        return "<CircuitBreaker state=%s failures=%d>" % (self.state, self.failures)
+
+    def allow(self):
+        """ Returns True when a request may be sent now
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = self._clock()
+            if self.state == OPEN and now - self._opened_at >= self.recovery_timeout:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            # a probe which never reported back does not block the endpoint forever
+            probe_lost = self._probe_started is None or now - self._probe_started >= self.recovery_timeout
+            if self.state == HALF_OPEN and probe_lost:
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self):
+        """ Records a request which reached a working endpoint
+        """
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def failure(self):
+        """ Records a failed request (connection error, timeout or retryable status)
+        """
+        with self._lock:
+            self.failures += 1
+            threshold_reached = self.failure_threshold > 0 and self.failures >= self.failure_threshold
+            if self.state == HALF_OPEN or (self.state == CLOSED and threshold_reached):
+                self.state = OPEN
+                self.opened += 1
+                self._opened_at = self._clock()
+                self._probe_started = None
+
+    def retry_in(self):
+        """ Returns the number of seconds until the next request is allowed, 0 when it is allowed now
+        """
+        with self._lock:
+            if self.state == OPEN:
+                return max(0., self.recovery_timeout - (self._clock() - self._opened_at))
+            elif self.state == HALF_OPEN and self._probe_started is not None:
+                return max(0., self.recovery_timeout - (self._clock() - self._probe_started))
+            return 0.
+
+    def get_stats(self):
+        return {"state": self.state, "failures": self.failures, "opened": self.opened,
+                "rejected": self.rejected, "retry_in": self.retry_in()}
+
+
+class CircuitBreakers(object):
+    """ Holds one :class:`CircuitBreaker` per api endpoint
+
+        :param int failure_threshold: Default number of consecutive failures which open a circuit
+        :param float recovery_timeout: Default number of seconds a circuit stays open
+        :param dict endpoints: Maps endpoint names to ``(failure_threshold, recovery_timeout)``
+            tuples which replace the defaults
+    """
+    def __init__(self, failure_threshold=5, recovery_timeout=15., endpoints=None, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.endpoints = dict(endpoints or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, endpoint):
+        """ Returns the breaker of ``endpoint``, it is created on first use
+        """
+        with self._lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                failure_threshold, recovery_timeout = self.endpoints.get(
+                    endpoint, (self.failure_threshold, self.recovery_timeout))
+                breaker = CircuitBreaker(failure_threshold, recovery_timeout, clock=self._clock)
+                self.breakers[endpoint] = breaker
+            return breaker
+
+    def get_stats(self):
+        """ Returns the state and counters of every used breaker per endpoint
+        """
+        with self._lock:
+            breakers = dict(self.breakers)
+        return dict((endpoint, breakers[endpoint].get_stats()) for endpoint in breakers)
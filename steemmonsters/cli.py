@@ -5,8 +5,15 @@ from __future__ import unicode_literals
 from builtins import bytes, int, str
 from cmd import Cmd
 from steemmonsters.api import Api
-from steemmonsters.constants import xp_level, max_level_rarity
-from steemmonsters.utils import generate_key, generate_team_hash, get_summoner_level, convert_team_id_to_string, get_cards_collection, convert_team_string_to_id, expand_short_form
+from steemmonsters.battlestore import BattleStore
+from steemmonsters.cards import CardStore
+from steemmonsters.collection import CollectionIndex
+from steemmonsters.exceptions import CircuitOpenError
+from steemmonsters.lazy import Deferred
+from steemmonsters.ratelimit import RateLimiter
+from steemmonsters.replay import Recorder
+from steemmonsters.levels import get_xp_table
+from steemmonsters.utils import generate_key, generate_team_hash, convert_team_id_to_string, get_cards_collection, convert_team_string_to_id, expand_short_form
 from beem.blockchain import Blockchain
 from beem.nodelist import NodeList
 from beem import Steem
@@ -18,14 +25,13 @@ import json
 import getpass
 import random
 import hashlib
+from threading import Lock
 from collections import OrderedDict
 from datetime import date, datetime, timedelta
-import requests
 import logging
 import os
 from os.path import exists
 from os.path import expanduser
-import math
 from prettytable import PrettyTable
 import six
 from time import sleep
@@ -69,8 +75,6 @@ class SMPrompt(Cmd):
     intro = "Welcome to steemmonsters! Type ? to list commands"
     account = ""
     wallet_pass = ""
-    api = Api()
-    settings = api.settings()
     max_batch_size = 50
     threading = False
     wss = False
@@ -78,28 +82,86 @@ class SMPrompt(Cmd):
     normal = False
     appbase = True
     config_file_name = "config.json"
-    sm_config = read_config_json(config_file_name, verbose=False)
-    if "account" in sm_config:
-        account = sm_config["account"]
-    if "wallet_password" in sm_config:
-        wallet_pass = sm_config["wallet_password"]
-    else:
-        wallet_pass = getpass.getpass(prompt='Enter the beem wallet password.')
-    if "match_type" in sm_config:
-        match_type = sm_config["match_type"]
-    else:
-        match_type = "Ranked"
-    nodes = NodeList()
-    nodes.update_nodes()
-    nodelist = nodes.get_nodes(normal=normal, appbase=appbase, wss=wss, https=https)
-    stm = Steem(node=nodelist, num_retries=5, call_num_retries=3, timeout=15)
-    stm.wallet.unlock(wallet_pass)
-    b = Blockchain(mode='head', steem_instance=stm)
-    cards = {}
-    cards_by_name = {}
-    for r in api.get_card_details():
-        cards[r["id"]] = r
-        cards_by_name[r["name"]] = r
+    match_type = "Ranked"
+
+    def __init__(self, *args, **kwargs):
+        Cmd.__init__(self, *args, **kwargs)
+        self.sm_config = read_config_json(self.config_file_name, verbose=False)
+        if "cache_dir" in self.sm_config:
+            self.cache_dir = self.sm_config["cache_dir"]
+        else:
+            self.cache_dir = os.path.join(expanduser("~"), ".steemmonsters", "cache")
+        if "record_dir" in self.sm_config:
+            self.recorder = Recorder(self.sm_config["record_dir"])
+        else:
+            self.recorder = None
+        if "account" in self.sm_config:
+            self.account = self.sm_config["account"]
+        if "wallet_password" in self.sm_config:
+            self.wallet_pass = self.sm_config["wallet_password"]
+        if "match_type" in self.sm_config:
+            self.match_type = self.sm_config["match_type"]
+        rate_limiter = RateLimiter.from_config(self.sm_config.get("rate_limit"), default=Api.default_rate_limiter)
+        self.api = Api(url=self.sm_config.get("api_url"), cache_dir=self.cache_dir, recorder=self.recorder,
+                       rate_limiter=rate_limiter)
+        # the network resources load in parallel while the prompt is already usable,
+        # a command waits only for the resources it uses
+        self._unlock_lock = Lock()
+        self._settings = Deferred(self.api.settings, name="settings")
+        self._card_store = CardStore(os.path.join(self.cache_dir, "cards.snapshot"), self.api.get_card_details_since)
+        self._cards = Deferred(self._load_cards, name="cards")
+        self._stm = Deferred(self._connect, name="steem")
+        self._b = Deferred(lambda: Blockchain(mode='head', steem_instance=self._stm.get()), name="blockchain")
+        self._battle_store = None
+
+    def _load_cards(self):
+        if self._card_store.load():
+            # the snapshot is used at once and replaced when the card details changed
+            self._card_store.start_refresh()
+
+    def _connect(self):
+        nodes = NodeList()
+        nodes.update_nodes()
+        nodelist = nodes.get_nodes(normal=self.normal, appbase=self.appbase, wss=self.wss, https=self.https)
+        return Steem(node=nodelist, num_retries=5, call_num_retries=3, timeout=15)
+
+    @property
+    def settings(self):
+        return self._settings.get()
+
+    @settings.setter
+    def settings(self, settings):
+        self._settings = Deferred(lambda: settings, start=False)
+
+    @property
+    def cards(self):
+        self._cards.get()
+        return self._card_store.cards
+
+    @property
+    def stm(self):
+        """ Steem instance with unlocked wallet, the password is asked on first use
+        """
+        stm = self._stm.get()
+        with self._unlock_lock:
+            if stm.wallet.locked():
+                if self.wallet_pass == "":
+                    self.wallet_pass = getpass.getpass(prompt='Enter the beem wallet password.')
+                stm.wallet.unlock(self.wallet_pass)
+        return stm
+
+    @property
+    def b(self):
+        return self._b.get()
+
+    @property
+    def battle_store(self):
+        """ Local store of battles, it is opened on first use
+        """
+        if self._battle_store is None:
+            path = self.sm_config.get("battle_db", os.path.join(self.cache_dir, "battles.sqlite"))
+            self._battle_store = BattleStore(path, self.cards)
+        return self._battle_store
 
     def do_exit(self, inp):
         print("Bye")
@@ -134,6 +196,8 @@ class SMPrompt(Cmd):
         self.sm_config = read_config_json(inp)
         if "account" in self.sm_config:
             self.account = self.sm_config["account"]
+        if "wallet_password" in self.sm_config:
+            self.wallet_pass = self.sm_config["wallet_password"]
         if "match_type" in self.sm_config:
             self.match_type = self.sm_config["match_type"]
 
@@ -147,6 +211,50 @@ class SMPrompt(Cmd):
     def help_show_config(self):
         print("Shows the loaded config file")
 
+    def do_stats(self, inp):
+        if inp == "reset":
+            self.api.stats.reset()
+            print("Statistics reset")
+            return
+        elif inp[:5] == "json ":
+            self.api.dump_stats(inp[5:].strip())
+            print("Statistics written to %s" % inp[5:].strip())
+            return
+        stats = self.api.get_stats()
+        t = PrettyTable(["endpoint", "calls", "errors", "retries", "p50 ms", "p95 ms", "max ms", "avg kB", "decode ms", "status"])
+        t.align = "l"
+        for endpoint in sorted(stats["endpoints"]):
+            e = stats["endpoints"][endpoint]
+            wall_time = e["wall_time"]
+            if wall_time["count"] == 0:
+                continue
+            status = ", ".join("%s: %d" % (s, n) for s, n in sorted(e["status_codes"].items()))
+            avg_kb = e["bytes_received"]["mean"] / 1024 if e["bytes_received"]["count"] > 0 else 0
+            decode_ms = e["decode_time"]["mean"] * 1000 if e["decode_time"]["count"] > 0 else 0
+            t.add_row([endpoint, e["calls"], e["errors"], int(e["retries"]["sum"]), "%.1f" % (wall_time["p50"] * 1000),
+                       "%.1f" % (wall_time["p95"] * 1000), "%.1f" % (wall_time["max"] * 1000), "%.1f" % avg_kb,
+                       "%.2f" % decode_ms, status])
+        print(t)
+        if "rate_limiter" in stats:
+            print("rate limiter: %(requests)d requests, %(delayed)d delayed, queue depth %(queue_depth)d "
+                  "(max %(max_queue_depth)d), waited %(wait_time).1f s" % stats["rate_limiter"])
+        if len(stats["mirrors"]) > 1:
+            for mirror in stats["mirrors"]:
+                latency = "%.1f ms" % (mirror["latency"] * 1000) if mirror["latency"] is not None else "not measured"
+                print("mirror %s: %s, %s, %d requests" % (mirror["url"], "healthy" if mirror["healthy"] else "down",
+                                                          latency, mirror["requests"]))
+        print("final answers: %(memory_items)d in memory, %(disk_items)d on disk (%(disk_size)d bytes), "
+              "%(hits_memory)d memory hits, %(hits_disk)d disk hits, %(misses)d misses" % stats["final_cache"])
+        for endpoint in sorted(stats["circuit_breakers"]):
+            breaker = stats["circuit_breakers"][endpoint]
+            if breaker["state"] != "closed" or breaker["opened"] > 0:
+                print("circuit %s: %s, opened %d times, %d calls rejected, retry in %.1f s" % (
+                    endpoint, breaker["state"], breaker["opened"], breaker["rejected"], breaker["retry_in"]))
+
+    def help_stats(self):
+        print("Shows latency, size, retries and status of all api calls per endpoint.")
+        print("stats json <file> writes them as json, stats reset clears them")
+
     def do_collection(self, inp):
         if inp == "":
             if self.account == "":
@@ -158,7 +266,7 @@ class SMPrompt(Cmd):
         t = PrettyTable(["uid", "card", "xp", "gold", "edition"])
         t.align = "l"
         for c in cards["cards"]:
-            t.add_row([c["uid"], self.cards[c["card_detail_id"]]["name"], c["xp"], c["gold"], c["edition"]])        
+            t.add_row([c["uid"], self.cards.name(c["card_detail_id"]), c["xp"], c["gold"], c["edition"]])        
         print(t)
 
     def help_collection(self):
@@ -230,14 +338,23 @@ class SMPrompt(Cmd):
         response = self.api.get_open_packs(response["packs"][index]["uid"], account, response["packs"][index]["edition"], token)
         cards = response["cards"]
         t = PrettyTable(["card", "gold", "market value"])
-        all_cards = self.api.get_market_for_sale_grouped()
+        wanted = set((c["card_detail_id"], c["gold"]) for c in cards)
+        card_values = {}
+        # The market is streamed, so that the search stops as soon as all prices are known
+        for ac in self.api.iter_market_for_sale_grouped():
+            key = (ac["card_detail_id"], ac["gold"])
+            if ac["edition"] == edition and key in wanted and key not in card_values:
+                card_values[key] = ac["low_price"]
+                if len(card_values) == len(wanted):
+                    break
         t.align = "l"
         for c in cards:
-            for ac in all_cards:
-                if ac["gold"] == c["gold"] and c["card_detail_id"] == ac["card_detail_id"] and ac["edition"] == edition:
-                    card_value = ac["low_price"]
-                    break
-            t.add_row([self.cards[c["card_detail_id"]]["name"], c["gold"], "%.2f $" % card_value])
+            key = (c["card_detail_id"], c["gold"])
+            if key in card_values:
+                card_value = "%.2f $" % card_values[key]
+            else:
+                card_value = "-"
+            t.add_row([self.cards.name(c["card_detail_id"]), c["gold"], card_value])
         print(t)
 
     def help_openpack(self):
@@ -370,14 +487,19 @@ class SMPrompt(Cmd):
         mana_cap = self.settings["ranked_settings"]["mana_cap"]
         response = self.api.get_player_teams_last_used(account, mana_cap)
         if len(response) == 0:
-            print("Error in loading last team...")
+            team = self.battle_store.last_team(account, mana_cap)
+            if team is None:
+                print("Error in loading last team...")
+                return
+            [summoner_str, monster_str] = expand_short_form(team, self.cards)
+            print("%s, %s (stored battle)" % (summoner_str, monster_str))
             return
         summoner = response["summoner"]
         monsters = response["monsters"]
         monsters_list = []
         for m in monsters:
-            monsters_list.append(self.cards[m["id"]]["name"])
-        deck = ", ".join([self.cards[summoner["id"]]["name"]] + monsters_list)
+            monsters_list.append(self.cards.name(m["id"]))
+        deck = ", ".join([self.cards.name(summoner["id"])] + monsters_list)
         print(deck)
 
     def help_lastteam(self):
@@ -401,8 +523,8 @@ class SMPrompt(Cmd):
         monsters = response["monsters"]
         monsters_list = []
         for m in monsters:
-            monsters_list.append(self.cards[m["id"]]["name"])
-        deck = ", ".join([self.cards[summoner["id"]]["name"]] + monsters_list)
+            monsters_list.append(self.cards.name(m["id"]))
+        deck = ", ".join([self.cards.name(summoner["id"])] + monsters_list)
         print(deck)
 
     def help_lasttopteam(self):
@@ -490,13 +612,13 @@ class SMPrompt(Cmd):
             cards = cards[1:]
         mana_cap = self.settings["ranked_settings"]["mana_cap"]
         
-        [summoner, monsters] = convert_team_string_to_id(cards, self.cards_by_name)
+        [summoner, monsters] = convert_team_string_to_id(cards, self.cards)
         if summoner["id"] not in mycards:
-            print("%s is not in collection" % (self.cards[summoner["id"]]["name"]))
+            print("%s is not in collection" % (self.cards.name(summoner["id"])))
             return
         for m in monsters:
             if m["id"] not in mycards:
-                print("%s is not in collection" % (self.cards[m["id"]]["name"]))
+                print("%s is not in collection" % (self.cards.name(m["id"])))
                 return
 
         team = OrderedDict({"summoner": summoner, "monsters": monsters})
@@ -649,7 +771,7 @@ class SMPrompt(Cmd):
         else:
             summoner_level = 4
         stop_block = self.b.get_current_block_num()
-        start_block = stop_block - 20 * 60 * 1
+        start_block = stop_block - self.sm_config.get("splinter_blocks", 20 * 60 * 1)
         mana_cap = self.settings["ranked_settings"]["mana_cap"]
         ruleset = self.settings["ranked_settings"]["ruleset"]
         match_type = self.match_type
@@ -657,122 +779,12 @@ class SMPrompt(Cmd):
         response = self.api.get_collection(acc["name"])
         mycards = get_cards_collection(response, self.cards)
         
-        find_match_cnt = 0
-        deck_score = {}
-        conter_deck = {}
-        cnt = 0
-        last_id_block = []
-        last_round_blocknum = start_block - 1
-        block = start_block
-        last_created_date = ""
-        first_created_date = None
-        while block <= stop_block:
-            cnt += 1
-            if cnt % 1 == 0:
-                print("reading block %d - %s" % (block, last_created_date))
-            response = ""
-            cnt2 = 0
-            while str(response) != '<Response [200]>' and cnt2 < 10:
-                response = requests.get("https://steemmonsters.com/transactions/history?from_block=%d" % block)
-                if str(response) != '<Response [200]>':
-                    sleep(2)
-                cnt2 += 1        
-            for hist in response.json():
-                if hist["type"] != "sm_team_reveal":
-                    continue
-                if not hist["success"]:
-                    continue
-                if hist["block_num"] > last_round_blocknum:
-                    last_id_block = [hist["id"]]
-                    last_round_blocknum = hist["block_num"]
-                    block = last_round_blocknum
-                elif hist["id"] not in last_id_block:
-                    last_id_block.append(hist["id"])
-                else:
-                    continue
-                last_created_date = hist["created_date"]
-                if first_created_date is None:
-                    first_created_date = hist["created_date"]
-                result = json.loads(hist["result"])
-                if "status" in result and result["status"] == "Waiting for opponent reveal.":
-                    continue
-                
-                if "battle" in result:
-                    if result["battle"]["mana_cap"] != mana_cap:
-                        continue
-                    deck_mana_cap = result["battle"]["mana_cap"]
-                    deck_ruleset = result["battle"]["ruleset"]
-                    if "details" in result["battle"]:
-                        team1_summoner_level = get_summoner_level(result["battle"]["details"]["team1"]["summoner"], self.cards, xp_level, max_level_rarity)
-                        team1 = [{"id": result["battle"]["details"]["team1"]["summoner"]["card_detail_id"], "level": result["battle"]["details"]["team1"]["summoner"]["level"]}]
-                        for m in result["battle"]["details"]["team1"]["monsters"]:
-                            team1.append({"id": m["card_detail_id"], "level": m["level"]})
-                        team1_player = result["battle"]["details"]["team1"]["player"]
-                        if team1_summoner_level != summoner_level:
-                            continue
-                        team2_summoner_level = get_summoner_level(result["battle"]["details"]["team2"]["summoner"], self.cards, xp_level, max_level_rarity)
-                        team2 = [{"id": result["battle"]["details"]["team2"]["summoner"]["card_detail_id"], "level": result["battle"]["details"]["team2"]["summoner"]["level"]}]
-                        for m in result["battle"]["details"]["team2"]["monsters"]:
-                            team2.append({"id": m["card_detail_id"], "level": m["level"]})
-                        team2_player = result["battle"]["details"]["team2"]["player"]
-                        winner = result["battle"]["details"]["winner"] 
-                        if team2_summoner_level != summoner_level:
-                            continue                        
-                    else:
-                        continue
-                else:
-                    continue      
-                
-                team1_str = ""
-                for t in team1:
-                    if team1_str != "":
-                        team1_str += ","
-                    team1_str += str(t["id"])+"-"+str(t["level"])
-                    
-                team2_str = ""
-                for t in team2:
-                    if team2_str != "":
-                        team2_str += ","
-                    team2_str += str(t["id"])+"-"+str(t["level"])              
-    
-                
-                if winner == team1_player:
-                    if self.cards[team1[0]["id"]]["color"].lower() == splinter:
-                        if team1_str in deck_score:
-                            deck_score[team1_str]["n"] += 1
-                            deck_score[team1_str]["score"] += 1
-                            deck_score[team1_str]["win"] += 1
-                        else:
-                            deck_score[team1_str] = {"n": 1, "score": 1, "win": 1, "loose": 0, "mana_cap": deck_mana_cap, "ruleset": deck_ruleset}
-                    if self.cards[team2[0]["id"]]["color"].lower() == splinter:
-                        if team2_str in deck_score:
-                            deck_score[team2_str]["n"] += 1
-                            deck_score[team2_str]["score"] -= 1
-                            deck_score[team2_str]["loose"] += 1
-                        else:
-                            deck_score[team2_str] = {"n": 1, "score": -1, "win": 0, "loose": 1, "mana_cap": deck_mana_cap, "ruleset": deck_ruleset}
-                else:
-                    if self.cards[team2[0]["id"]]["color"].lower() == splinter:
-                        if team2_str in deck_score:
-                            deck_score[team2_str]["n"] += 1
-                            deck_score[team2_str]["score"] += 1
-                            deck_score[team2_str]["win"] += 1
-                        else:
-                            deck_score[team2_str] = {"n": 1, "score": 1, "win": 1, "loose": 0, "mana_cap": deck_mana_cap, "ruleset": deck_ruleset}
-                    if self.cards[team1[0]["id"]]["color"].lower() == splinter:
-                        if team1_str in deck_score:
-                            deck_score[team1_str]["n"] += 1
-                            deck_score[team1_str]["score"] -= 1
-                            deck_score[team1_str]["loose"] += 1
-                        else:
-                            deck_score[team1_str] = {"n": 1, "score": -1, "win": 0, "loose": 1, "mana_cap": deck_mana_cap, "ruleset": deck_ruleset}
-        deck_score_list = []
-        for d in deck_score:
-            if deck_score[d]["mana_cap"] != mana_cap:
-                continue
-            deck_score_list.append(deck_score[d])
-            deck_score_list[-1]["deck"] = d
-        sorted_deck = sorted(deck_score_list, key=lambda x: x["win"] / x["n"], reverse=True)
+        print("reading blocks up to %d" % stop_block)
+        added = self.battle_store.sync(self.api, stop_block, window=stop_block - start_block + 1,
+                                       shard_blocks=self.sm_config.get("history_shard_blocks", 100),
+                                       max_workers=self.sm_config.get("history_workers", 8))
+        print("%d new battles stored" % added)
+        sorted_deck = self.battle_store.team_scores(splinter, summoner_level, mana_cap, since_block=start_block)
         t = PrettyTable(["n", "win ratio", "summoner", "monsters"])
         t.align = "l"
         index = 0
@@ -802,12 +814,12 @@ class SMPrompt(Cmd):
             deck_selected = True
             [summoner, monsters] = expand_short_form(sorted_deck[deck_index]["deck"], self.cards, output_type="id")
             if summoner["id"] not in mycards:
-                print("%s is not in collection" % (self.cards[summoner["id"]]["name"]))
+                print("%s is not in collection" % (self.cards.name(summoner["id"])))
                 deck_selected = False
                 continue
             for m in monsters:
                 if m["id"] not in mycards:
-                    print("%s is not in collection" % (self.cards[m["id"]]["name"]))
+                    print("%s is not in collection" % (self.cards.name(m["id"])))
                     deck_selected = False
                     continue
         if six.PY3:
@@ -830,6 +842,31 @@ class SMPrompt(Cmd):
     def help_splinter(self):
         print("splinter <splinter> returns different currently played teams.")
 
+    def do_battles(self, inp):
+        args = inp.split()
+        if len(args) > 0 and not args[0].isdigit():
+            account = args.pop(0)
+        elif self.account == "":
+            print("No account set... aborting...")
+            return
+        else:
+            account = self.account
+        limit = int(args[0]) if len(args) > 0 else 10
+        battles = self.battle_store.battles(account, limit=limit)
+        if len(battles) == 0:
+            print("No stored battles of %s, they are stored by splinter" % account)
+            return
+        t = PrettyTable(["block", "mana", "result", "opponent", "summoner", "monsters"])
+        t.align = "l"
+        for battle in battles:
+            [summoner_str, monster_str] = expand_short_form(battle["team"], self.cards)
+            t.add_row([battle["block_num"], battle["mana_cap"], "win" if battle["won"] else "loss",
+                       battle["opponent"], summoner_str, monster_str])
+        print(t)
+
+    def help_battles(self):
+        print("battles <account> <n> shows the last n stored battles of an account (default is the set account).")
+
     def do_play(self, inp):
         if self.account == "":
             print("No account set... aborting...")
@@ -892,7 +929,8 @@ class SMPrompt(Cmd):
                                              response["battles"], response["wins"], response["current_streak"]))
 
         response = self.api.get_collection(acc["name"])
-        mycards = get_cards_collection(response, self.cards)
+        mycards = CollectionIndex(acc["name"], self.cards, find_cards=self.api.find_cards)
+        mycards.load(response["cards"])
 
         continue_playing = True
         team_found = False
@@ -945,7 +983,7 @@ class SMPrompt(Cmd):
                     all_card_in_selection = True
                     for ids in deck_ids:
                         if isinstance(ids, str):
-                            card_id = self.cards_by_name[ids.split(":")[0]]["id"]
+                            card_id = self.cards.id_of(ids.split(":")[0])
                         else:
                             card_id = ids
                         if card_id not in mycards:
@@ -995,23 +1033,18 @@ class SMPrompt(Cmd):
             summoner_level = 4
             for ids in deck_ids:
                 if isinstance(ids, str):
-                    card_id = self.cards_by_name[ids.split(":")[0]]["id"]
+                    card_id = self.cards.id_of(ids.split(":")[0])
                 else:
                     card_id = ids
 
                 if card_id not in mycards:
-                    print("%s is not in collection" % (self.cards[card_id]["name"]))
+                    print("%s is not in collection" % (self.cards.name(card_id)))
                     return
 
                 if summoner is None:
                     summoner = mycards[card_id]["uid"]
-                    for x in xp_level:
-                        if x["edition"] == mycards[card_id]["edition"] and x["rarity"] == self.cards[card_id]["rarity"]:
-                            summoner_level = 0
-                            for l in x["xp_level"]:
-                                if mycards[card_id]["xp"] >= x["xp_level"][l]:
-                                    summoner_level = l
-                    summoner_level = int(math.ceil(summoner_level / max_level_rarity[self.cards[card_id]["rarity"]] * 4))
+                    summoner_level = get_xp_table().summoner_level(mycards[card_id]["edition"], self.cards.rarity(card_id),
+                                                                   mycards[card_id]["xp"])
                 else:
                     monsters.append(mycards[card_id]["uid"])
 
@@ -1034,7 +1067,12 @@ class SMPrompt(Cmd):
                 elif (h["block_num"] - start_block_num) * 20 > 60:
                     print("Could not find transaction id %s" % (deck["trx_id"]))
                     break
-                if h["id"] == 'sm_find_match':
+                if h["id"] in mycards.operations:
+                    try:
+                        mycards.apply_operation(h)
+                    except Exception as e:
+                        print("Could not update the collection: %s" % str(e))
+                elif h["id"] == 'sm_find_match':
                     if json.loads(h['json'])["team_hash"] == team_hash:
                         found = True
                         break
@@ -1054,28 +1092,34 @@ class SMPrompt(Cmd):
             cnt2 = 0
             trx_found = False
             while not trx_found and cnt2 < 60:
-                response = requests.get("https://steemmonsters.com/transactions/lookup?trx_id=%s" % deck["trx_id"])
-                if str(response) != '<Response [200]>':
+                try:
+                    response = self.api.request("transactions/lookup?trx_id=%s" % deck["trx_id"])
+                except CircuitOpenError as e:
+                    print("transactions/lookup is unavailable, waiting %.0f s" % e.retry_in)
+                    sleep(max(1, e.retry_in))
+                    cnt2 += max(1, int(e.retry_in))
+                    continue
+                if not response.ok:
                     sleep(1)
                 else:
-                    if 'error' in response.json() and "not found" in response.json()["error"]:
+                    if 'error' in response and "not found" in response["error"]:
                         try:
                             sleep(1)
                         except KeyboardInterrupt:
                             print("Exiting cleanly...")
                             return
-                    elif 'error' in response.json():
+                    elif 'error' in response:
                         trx_found = True
-                    elif "trx_info" in response.json() and response.json()["trx_info"]["success"]:
+                    elif "trx_info" in response and response["trx_info"]["success"]:
                         trx_found = True
                     else:
                         sleep(1)
-                    # elif 'error' in response.json():
-                    #    print(response.json()["error"])
+                    # elif 'error' in response:
+                    #    print(response["error"])
                 cnt2 += 1
-            if 'error' in response.json():
-                print(response.json()["error"])
-                if "The current player is already looking for a match." in response.json()["error"]:
+            if 'error' in response:
+                print(response["error"])
+                if "The current player is already looking for a match." in response["error"]:
                     self.stm.custom_json('sm_cancel_match', "{}", required_posting_auths=[acc["name"]])
                     try:
                         sleep(3)
@@ -1116,14 +1160,20 @@ class SMPrompt(Cmd):
 
             found_match = False
             while not found_match and cnt2 < 40:
-                response = requests.get("https://steemmonsters.com/battle/result?id=%s" % deck["trx_id"])
-                if str(response) != '<Response [200]>':
+                try:
+                    response = self.api.request("battle/result?id=%s" % deck["trx_id"])
+                except CircuitOpenError as e:
+                    print("battle/result is unavailable, waiting %.0f s" % e.retry_in)
+                    sleep(max(2, e.retry_in))
+                    cnt2 += max(1, int(e.retry_in / 2))
+                    continue
+                if not response.ok:
                     try:
                         sleep(2)
                     except KeyboardInterrupt:
                         print("Exiting cleanly...")
                         return
-                elif 'Error' in response.json():
+                elif 'Error' in response:
                     try:
                         sleep(2)
                     except KeyboardInterrupt:
@@ -1132,7 +1182,7 @@ class SMPrompt(Cmd):
                 else:
                     found_match = True
                 cnt2 += 1
-            if cnt2 == 40:
+            if not found_match:
                 print("Could not found opponent!")
                 response = self.api.get_battle_status(deck["trx_id"])
                 if "reveal_tx" in response and response["reveal_tx"] is None:
@@ -1141,18 +1191,18 @@ class SMPrompt(Cmd):
                 self.stm.custom_json('sm_cancel_match', "{}", required_posting_auths=[acc["name"]])
                 sleep(3)
                 continue
-            winner = response.json()["winner"]
-            team1_player = response.json()["player_1"]
-            team2_player = response.json()["player_2"]
+            winner = response["winner"]
+            team1_player = response["player_1"]
+            team2_player = response["player_2"]
 
-            battle_details = json.loads(response.json()["details"])
+            battle_details = response.decoded("details")
             team1 = [{"id": battle_details["team1"]["summoner"]["card_detail_id"], "level": battle_details["team1"]["summoner"]["level"]}]
             for m in battle_details["team1"]["monsters"]:
                 team1.append({"id": m["card_detail_id"], "level": m["level"]})
             team1_player = battle_details["team1"]["player"]
             team1_str = ""
             for m in team1:
-                team1_str += self.cards[m["id"]]["name"] + ':%d, ' % m["level"]
+                team1_str += self.cards.name(m["id"]) + ':%d, ' % m["level"]
             team1_str = team1_str[:-2]
 
             team2 = [{"id": battle_details["team2"]["summoner"]["card_detail_id"], "level": battle_details["team2"]["summoner"]["level"]}]
@@ -1161,7 +1211,7 @@ class SMPrompt(Cmd):
             team2_player = battle_details["team2"]["player"]
             team2_str = ""
             for m in team2:
-                team2_str += self.cards[m["id"]]["name"] + ':%d, ' % m["level"]
+                team2_str += self.cards.name(m["id"]) + ':%d, ' % m["level"]
             team2_str = team2_str[:-2]
 
             if team1_player == winner:
@@ -1170,10 +1220,10 @@ class SMPrompt(Cmd):
                 print("match " + colored(team2_player, "green") + " - " + colored(team1_player, "red"))
 
             if team1_player == acc["name"]:
-                print("Opponent ranking: %d" % response.json()["player_2_rating_initial"])
+                print("Opponent ranking: %d" % response["player_2_rating_initial"])
                 print("Opponents team: %s" % team2_str)
             else:
-                print("Opponent ranking: %d" % response.json()["player_1_rating_initial"])
+                print("Opponent ranking: %d" % response["player_1_rating_initial"])
                 print("Opponents team: %s" % team1_str)
 
             if winner == acc["name"]:
@@ -1196,10 +1246,10 @@ class SMPrompt(Cmd):
                 print("%d of %d matches won using %s deck (%s)" % (statistics["won"], statistics["battles"], inp.split(",")[current_deck_index], inp))
             else:
                 print("%d of %d matches won using %s deck" % (statistics["won"], statistics["battles"], inp))
-            if acc["name"] == response.json()["player_1"]:
-                print("Score %d -> %d" % (response.json()["player_1_rating_initial"], response.json()["player_1_rating_final"]))
+            if acc["name"] == response["player_1"]:
+                print("Score %d -> %d" % (response["player_1_rating_initial"], response["player_1_rating_final"]))
             else:
-                print("Score %d -> %d" % (response.json()["player_2_rating_initial"], response.json()["player_2_rating_final"]))
+                print("Score %d -> %d" % (response["player_2_rating_initial"], response["player_2_rating_final"]))
             print("--------------")
 
     def help_play(self):
@@ -1258,14 +1308,14 @@ class SMPrompt(Cmd):
                                 team1.append({"id": m["card_detail_id"], "level": m["level"]})
                             team1_player = result["battle"]["details"]["team1"]["player"]
                             team1_summoner = result["battle"]["details"]["team1"]["summoner"]
-                            summoner1 = self.cards[team1_summoner["card_detail_id"]]["name"] + ':%d' % team1_summoner["level"]
+                            summoner1 = self.cards.name(team1_summoner["card_detail_id"]) + ':%d' % team1_summoner["level"]
 
                             team2 = [{"id": result["battle"]["details"]["team2"]["summoner"]["card_detail_id"], "level": result["battle"]["details"]["team2"]["summoner"]["level"]}]
                             for m in result["battle"]["details"]["team2"]["monsters"]:
                                 team2.append({"id": m["card_detail_id"], "level": m["level"]})
                             team2_player = result["battle"]["details"]["team2"]["player"]
                             team2_summoner = result["battle"]["details"]["team2"]["summoner"]
-                            summoner2 = self.cards[team2_summoner["card_detail_id"]]["name"] + ':%d' % team2_summoner["level"]
+                            summoner2 = self.cards.name(team2_summoner["card_detail_id"]) + ':%d' % team2_summoner["level"]
                             winner = result["battle"]["details"]["winner"]
                             if team1_player == winner:
                                 print("match " + colored("%s (%s)" % (team1_player, summoner1), "green") + " - " + colored("%s (%s)" % (team2_player, summoner2), "red"))
@@ -1279,6 +1329,13 @@ class SMPrompt(Cmd):
                                 reveal_match.pop(team2_player)
                             if team1_player in reveal_match:
                                 reveal_match.pop(team1_player)
+            except CircuitOpenError as e:
+                print("%s is unavailable, waiting %.0f s" % (e.endpoint, e.retry_in))
+                try:
+                    sleep(max(1, e.retry_in))
+                except KeyboardInterrupt:
+                    print("Exiting cleanly...")
+                    return
             except KeyboardInterrupt:
                 print("Exiting cleanly...")
                 return
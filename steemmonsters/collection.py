@@ -0,0 +1,348 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+from steemmonsters.levels import get_xp_table
+from steemmonsters.utils import _card_color, _card_name, _card_rarity, _mana_getter
+
+
+class CollectionIndex(object):
+    """ All owned copies of the cards of a player, with secondary indexes
+
+        Every copy is kept by uid with ``card_detail_id``, ``xp``, ``level``,
+        ``gold``, ``edition``, ``mana`` (at its level) and ``playable``. Copies
+        are indexed by color, rarity, level and mana, and the best playable copy
+        (highest xp, the first one on ties) of every card is kept up to date, so
+        that ``index[card_detail_id]`` returns it in O(1). Copies which are listed
+        on the market or delegated to another player are not playable.
+
+        The index can be used like the dict of :func:`steemmonsters.utils.get_cards_collection`.
+        It is updated from custom_json operations with :meth:`apply_operation`,
+        so that the collection does not have to be requested again.
+
+        .. code-block:: python
+
+            index = CollectionIndex(account, cards, find_cards=api.find_cards)
+            index.load(api.get_collection(account)["cards"])
+            for op in blockchain.stream(opNames=["custom_json"]):
+                index.apply_operation(op)
+            uid = index[card_id]["uid"]
+
+        :param str player: Owner of the collection
+        :param cards: :class:`steemmonsters.cards.CardDatabase` or dict of card details
+        :param find_cards: Function which returns the entries of a list of uids, e.g.
+            :meth:`steemmonsters.api.Api.find_cards`. Without it, received cards
+            are not added and the xp of combined cards is the sum of their xp.
+        :param xp_table: :class:`steemmonsters.levels.XpTable` used for the levels
+    """
+    #: custom_json ids which change a collection and the methods which apply them
+    operations = {
+        "sm_gift_cards": "_apply_gift",
+        "sm_burn_cards": "_apply_burn",
+        "sm_combine_cards": "_apply_combine",
+        "sm_delegate_cards": "_apply_delegate",
+        "sm_undelegate_cards": "_apply_undelegate",
+        "sm_sell_cards": "_apply_sell",
+        "sm_cancel_sell": "_apply_cancel_sell",
+        "sm_market_purchase": "_apply_market_purchase",
+    }
+
+    def __init__(self, player, cards, find_cards=None, xp_table=None):
+        self.player = player
+        self.cards = cards
+        self.find_cards = find_cards
+        self.xp_table = xp_table if xp_table is not None else get_xp_table()
+        self._mana = _mana_getter(cards)
+        self.copies = {}
+        self._by_card = {}
+        self._best = {}
+        self._by_color = {}
+        self._by_rarity = {}
+        self._by_level = {}
+        self._by_mana = {}
+
+    def __len__(self):
+        return len(self._best)
+
+    def __iter__(self):
+        return iter(self._best)
+
+    def __contains__(self, card_detail_id):
+        return card_detail_id in self._best
+
+    def __getitem__(self, card_detail_id):
+        return self.copies[self._best[card_detail_id]]
+
+    def get(self, card_detail_id, default=None):
+        """ Returns the best playable copy of a card
+        """
+        uid = self._best.get(card_detail_id)
+        if uid is None:
+            return default
+        return self.copies[uid]
+
+    def best(self, card_detail_id):
+        """ Returns the best playable copy of a card or None
+        """
+        return self.get(card_detail_id)
+
+    def copies_of(self, card_detail_id):
+        """ Returns all owned copies of a card
+        """
+        return [self.copies[uid] for uid in self._by_card.get(card_detail_id, [])]
+
+    def _level(self, card_detail_id, edition, xp, default):
+        try:
+            return self.xp_table.card_level(edition, _card_rarity(self.cards, card_detail_id), xp)
+        except KeyError:
+            return default
+
+    @staticmethod
+    def _index_add(index, key, uid):
+        index.setdefault(key, {})[uid] = None
+
+    @staticmethod
+    def _index_remove(index, key, uid):
+        uids = index.get(key)
+        if uids is not None:
+            uids.pop(uid, None)
+            if len(uids) == 0:
+                del index[key]
+
+    def _update_best(self, card_detail_id):
+        best = None
+        for uid in self._by_card.get(card_detail_id, []):
+            copy = self.copies[uid]
+            if copy["playable"] and (best is None or copy["xp"] > best["xp"]):
+                best = copy
+        if best is None:
+            self._best.pop(card_detail_id, None)
+        else:
+            self._best[card_detail_id] = best["uid"]
+
+    def _link(self, copy):
+        uid = copy["uid"]
+        self.copies[uid] = copy
+        self._index_add(self._by_card, copy["id"], uid)
+        self._index_add(self._by_color, copy["color"].lower(), uid)
+        self._index_add(self._by_rarity, copy["rarity"], uid)
+        self._index_add(self._by_level, copy["level"], uid)
+        self._index_add(self._by_mana, copy["mana"], uid)
+
+    def _unlink(self, uid):
+        copy = self.copies.pop(uid)
+        self._index_remove(self._by_card, copy["id"], uid)
+        self._index_remove(self._by_color, copy["color"].lower(), uid)
+        self._index_remove(self._by_rarity, copy["rarity"], uid)
+        self._index_remove(self._by_level, copy["level"], uid)
+        self._index_remove(self._by_mana, copy["mana"], uid)
+        return copy
+
+    def _create_copy(self, card):
+        card_detail_id = card["card_detail_id"]
+        level = self._level(card_detail_id, card["edition"], card["xp"], card.get("level", 1))
+        delegated_to = card.get("delegated_to")
+        return {"uid": card["uid"], "id": card_detail_id, "card_detail_id": card_detail_id,
+                "name": _card_name(self.cards, card_detail_id), "color": _card_color(self.cards, card_detail_id),
+                "rarity": _card_rarity(self.cards, card_detail_id), "xp": card["xp"], "level": level,
+                "gold": card["gold"], "edition": card["edition"], "mana": self._mana(card_detail_id, level),
+                "market_id": card.get("market_id"), "delegated_to": delegated_to,
+                "playable": not card.get("market_id") and delegated_to in (None, "", self.player)}
+
+    def load(self, collection):
+        """ Replaces the index with the entries of ``cards/collection``
+        """
+        self.copies = {}
+        self._by_card = {}
+        self._best = {}
+        self._by_color = {}
+        self._by_rarity = {}
+        self._by_level = {}
+        self._by_mana = {}
+        for card in collection:
+            self._link(self._create_copy(card))
+        for card_detail_id in self._by_card:
+            self._update_best(card_detail_id)
+
+    def add(self, card):
+        """ Adds or replaces a copy, ``card`` is an entry of ``cards/collection`` or ``cards/find``
+        """
+        copy = self._create_copy(card)
+        old = self._unlink(copy["uid"]) if copy["uid"] in self.copies else None
+        self._link(copy)
+        self._update_best(copy["id"])
+        if old is not None and old["id"] != copy["id"]:
+            self._update_best(old["id"])
+        return copy
+
+    def remove(self, uid):
+        """ Removes a copy, unknown uids are ignored
+        """
+        if uid not in self.copies:
+            return None
+        copy = self._unlink(uid)
+        self._update_best(copy["id"])
+        return copy
+
+    def update_xp(self, uid, xp):
+        """ Sets the xp of a copy, its level and mana are updated
+        """
+        copy = dict(self.copies[uid])
+        copy["xp"] = xp
+        copy.pop("level")
+        return self.add(copy)
+
+    def set_playable(self, uid, playable, delegated_to=None, market_id=None):
+        """ Marks a copy as (not) playable, e.g. after it was delegated or listed on the market
+        """
+        copy = self.copies[uid]
+        copy["playable"] = playable
+        copy["delegated_to"] = delegated_to
+        copy["market_id"] = market_id
+        self._update_best(copy["id"])
+
+    def by_color(self, color):
+        """ Returns all copies of a color (case insensitive)
+        """
+        return [self.copies[uid] for uid in self._by_color.get(color.lower(), [])]
+
+    def by_rarity(self, rarity):
+        return [self.copies[uid] for uid in self._by_rarity.get(rarity, [])]
+
+    def by_level(self, level):
+        return [self.copies[uid] for uid in self._by_level.get(level, [])]
+
+    def by_mana(self, mana):
+        """ Returns all copies which cost ``mana`` at their level
+        """
+        return [self.copies[uid] for uid in self._by_mana.get(mana, [])]
+
+    def listed(self, market_ids):
+        """ Returns the uids of the copies which are listed on the market with one of ``market_ids``
+
+            A market id is the id of the ``sm_sell_cards`` transaction and the number
+            of the listing in it (``"<trx_id>-0"``), plain transaction ids match all
+            listings of the transaction.
+        """
+        market_ids = set(market_ids)
+        uids = []
+        for uid, copy in self.copies.items():
+            market_id = copy["market_id"]
+            if market_id and (market_id in market_ids or market_id.rsplit("-", 1)[0] in market_ids):
+                uids.append(uid)
+        return uids
+
+    def refresh(self, uids):
+        """ Requests the given copies with ``find_cards`` and updates them
+
+            Copies which belong to another player now are removed.
+        """
+        if self.find_cards is None or len(uids) == 0:
+            return
+        found = dict((card["uid"], card) for card in self.find_cards(list(uids)))
+        for uid in uids:
+            card = found.get(uid)
+            if card is None or card.get("player", self.player) != self.player:
+                self.remove(uid)
+            else:
+                self.add(card)
+
+    def apply_operation(self, op):
+        """ Updates the index from a custom_json operation, returns True when the index changed
+
+            Handled are the operations in :attr:`operations`, other operations are ignored.
+            Listed copies are not playable until the listing is cancelled, sold
+            copies are removed. Cards which the player buys on the market are
+            not added, their uids are not part of the operation; they are added
+            by the next :meth:`load`.
+
+            :param dict op: custom_json operation with ``id``, ``json``, ``trx_id`` and
+                ``required_posting_auths`` or ``required_auths``
+        """
+        handler = self.operations.get(op["id"])
+        if handler is None:
+            return False
+        data = op["json"]
+        if not isinstance(data, (dict, list)):
+            data = json.loads(data)
+        auths = op.get("required_posting_auths") or op.get("required_auths") or []
+        sender = auths[0] if len(auths) > 0 else None
+        return getattr(self, handler)(op, data, sender)
+
+    def _apply_sell(self, op, data, sender):
+        if sender != self.player:
+            return False
+        # one listing per entry, a single listing may be sent as object
+        listings = data if isinstance(data, list) else [data]
+        changed = False
+        for n, listing in enumerate(listings):
+            market_id = "%s-%d" % (op.get("trx_id"), n)
+            for uid in listing.get("cards") or []:
+                if uid in self.copies:
+                    self.set_playable(uid, False, market_id=market_id)
+                    changed = True
+        return changed
+
+    def _apply_market_purchase(self, op, data, sender):
+        # the buyer sends the operation, the sold copies leave the collection
+        sold = self.listed(data.get("items") or [])
+        for uid in sold:
+            self.remove(uid)
+        return len(sold) > 0
+
+    def _apply_gift(self, op, data, sender):
+        uids = data.get("cards") or []
+        if sender == self.player and data.get("to") != self.player:
+            return any([self.remove(uid) is not None for uid in uids])
+        elif data.get("to") == self.player and self.find_cards is not None:
+            self.refresh(uids)
+            return True
+        return False
+
+    def _apply_burn(self, op, data, sender):
+        if sender != self.player:
+            return False
+        return any([self.remove(uid) is not None for uid in data.get("cards") or []])
+
+    def _apply_combine(self, op, data, sender):
+        uids = data.get("cards") or []
+        if sender != self.player or len(uids) < 2 or uids[0] not in self.copies:
+            return False
+        xp = sum(self.copies[uid]["xp"] for uid in uids if uid in self.copies)
+        for uid in uids[1:]:
+            self.remove(uid)
+        if self.find_cards is not None:
+            self.refresh(uids[:1])
+        else:
+            self.update_xp(uids[0], xp)
+        return True
+
+    def _apply_delegate(self, op, data, sender):
+        if sender != self.player:
+            return False
+        changed = [uid for uid in data.get("cards") or [] if uid in self.copies]
+        for uid in changed:
+            self.set_playable(uid, data.get("to") == self.player, delegated_to=data.get("to"))
+        return len(changed) > 0
+
+    def _apply_undelegate(self, op, data, sender):
+        if sender != self.player:
+            return False
+        changed = [uid for uid in data.get("cards") or [] if uid in self.copies]
+        for uid in changed:
+            self.set_playable(uid, True)
+        return len(changed) > 0
+
+    def _apply_cancel_sell(self, op, data, sender):
+        if sender != self.player:
+            return False
+        changed = self.listed(data.get("trx_ids") or [data.get("trx_id")])
+        if len(changed) == 0 and self.find_cards is not None:
+            # listings of unknown ids are looked up again
+            listed = [uid for uid, copy in self.copies.items() if copy["market_id"]]
+            self.refresh(listed)
+            return len(listed) > 0
+        for uid in changed:
+            self.set_playable(uid, True)
+        return len(changed) > 0
@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+
+class ApiError(Exception):
+    """ A call to the steemmonsters api failed
+
+        :param str message: Human readable description of the failure
+        :param str endpoint: Endpoint that was called, e.g. ``cards/get_details``
+        :param str url: Full url of the last request
+        :param int status_code: Http status of the last response, None when no
+            response was received
+        :param int attempts: Number of requests that were sent
+        :param list history: One entry per attempt describing why it failed
+    """
+    def __init__(self, message, endpoint=None, url=None, status_code=None, attempts=0, history=None):
+        super(ApiError, self).__init__(message)
+        self.endpoint = endpoint
+        self.url = url
+        self.status_code = status_code
+        self.attempts = attempts
+        self.history = history or []
+
+
+class PermanentApiError(ApiError):
+    """ The api answered with a status code that will not change on a retry (e.g. 404)
+    """
+    pass
+
+
+class RetriesExhaustedError(ApiError):
+    """ All attempts allowed by the retry policy failed with retryable errors
+    """
+    pass
+
+
+class CircuitOpenError(ApiError):
+    """ The endpoint failed repeatedly and is not called until its circuit breaker recovers
+
+        :param float retry_in: Seconds until the next request to the endpoint is allowed
+    """
+    def __init__(self, message, retry_in=0., **kwargs):
+        super(CircuitOpenError, self).__init__(message, **kwargs)
+        self.retry_in = retry_in
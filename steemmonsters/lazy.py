@@ -0,0 +1,91 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+
+
+class Deferred(object):
+    """ Computes the result of a function once, in a background thread or on first use
+
+        :meth:`get` waits for a running computation. When the function raised
+        an exception, :meth:`get` raises it, and the next call of :meth:`get`
+        computes the result again.
+
+        .. code-block:: python
+
+            settings = Deferred(api.settings)
+            ...
+            mana_cap = settings.get()["ranked_settings"]["mana_cap"]
+
+        :param func: Function without arguments which returns the result
+        :param bool start: When True, the computation starts at once in a background thread,
+            otherwise it runs in the thread which calls :meth:`get` first
+        :param str name: Name of the background thread
+    """
+    def __init__(self, func, start=True, name=None):
+        self._func = func
+        self._name = name
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._running = False
+        self._result = None
+        self._error = None
+        if start:
+            self.start()
+
+    def __repr__(self):
+        return "<Deferred %s %s>" % (self._name or self._func, "ready" if self.ready else "pending")
+
+    @property
+    def ready(self):
+        """ True when the result is available
+        """
+        return self._done.is_set() and self._error is None
+
+    def _run(self):
+        try:
+            self._result = self._func()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    def _claim(self):
+        """ Returns True when the caller has to run the computation
+        """
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            return True
+
+    def start(self):
+        """ Starts the computation in a background thread unless it runs or ran already
+        """
+        if not self._claim():
+            return self
+        thread = threading.Thread(target=self._run, name=self._name)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def get(self, timeout=None):
+        """ Returns the result and waits for it when necessary
+
+            Raises the exception of the function, or ``RuntimeError`` after ``timeout`` seconds.
+        """
+        if self._claim():
+            self._run()
+        if not self._done.wait(timeout):
+            raise RuntimeError("%s is not ready after %.1f s" % (self._name or "Result", timeout))
+        error = self._error
+        if error is not None:
+            with self._lock:
+                # allow a new attempt with the next call
+                if self._error is error:
+                    self._error = None
+                    self._running = False
+                    self._done.clear()
+            raise error
+        return self._result
@@ -0,0 +1,138 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import math
+from bisect import bisect_right
+from steemmonsters.constants import xp_level as default_xp_level, max_level_rarity as default_max_level_rarity
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class XpTable(object):
+    """ XP thresholds compiled into sorted lists per ``(edition, rarity)``
+
+        The level of a card is the highest level whose threshold is not above
+        its xp, it is found with a binary search. Summoner levels are scaled to
+        the 1-4 range used by ``sm_find_match``.
+
+        .. code-block:: python
+
+            table = XpTable()
+            level = table.card_level(edition=1, rarity=2, xp=800)
+
+        :param list xp_level: Thresholds in the form of :data:`steemmonsters.constants.xp_level`
+        :param dict max_level_rarity: Maximum level per rarity
+    """
+    def __init__(self, xp_level=default_xp_level, max_level_rarity=default_max_level_rarity):
+        self.xp_level = xp_level
+        self.max_level_rarity = dict(max_level_rarity)
+        self.thresholds = {}
+        self.levels = {}
+        for entry in xp_level:
+            items = sorted(entry["xp_level"].items(), key=lambda item: item[1])
+            key = (entry["edition"], entry["rarity"])
+            self.thresholds[key] = [xp for level, xp in items]
+            self.levels[key] = [level for level, xp in items]
+        self._matrix = None
+
+    def card_level(self, edition, rarity, xp):
+        """ Returns the level of a card, 0 when its xp is below all thresholds
+
+            Raises ``KeyError`` for unknown edition and rarity combinations.
+        """
+        key = (edition, rarity)
+        index = bisect_right(self.thresholds[key], xp)
+        if index == 0:
+            return 0
+        return self.levels[key][index - 1]
+
+    def summoner_level(self, edition, rarity, xp):
+        """ Returns the summoner level (1-4) of a summoner card
+        """
+        level = self.card_level(edition, rarity, xp)
+        return int(math.ceil(level / self.max_level_rarity[rarity] * 4))
+
+    def _compile_matrix(self):
+        """ Builds the thresholds of all ``(edition, rarity)`` pairs as one padded numpy matrix
+        """
+        keys = sorted(self.thresholds)
+        width = max(len(self.thresholds[key]) for key in keys)
+        max_edition = max(key[0] for key in keys)
+        max_rarity = max(key[1] for key in keys)
+        matrix = np.full((len(keys) + 1, width), np.iinfo(np.int64).max, dtype=np.int64)
+        # row 0 stays unused, so that unknown pairs can be detected
+        rows = np.zeros((max_edition + 1, max_rarity + 1), dtype=np.intp)
+        for i, key in enumerate(keys):
+            if self.levels[key] != list(range(1, len(self.levels[key]) + 1)):
+                raise ValueError("Levels of %s are not consecutive" % str(key))
+            matrix[i + 1, :len(self.thresholds[key])] = self.thresholds[key]
+            rows[key] = i + 1
+        self._matrix = (matrix, rows)
+
+    def card_levels(self, editions, rarities, xps):
+        """ Returns the levels of many cards at once
+
+            :param editions: Sequence with the edition of each card
+            :param rarities: Sequence with the rarity of each card
+            :param xps: Sequence with the xp of each card
+
+            With numpy, a numpy array is returned, otherwise a list.
+        """
+        if np is None:
+            return [self.card_level(e, r, x) for e, r, x in zip(editions, rarities, xps)]
+        if self._matrix is None:
+            self._compile_matrix()
+        matrix, rows = self._matrix
+        editions = np.asarray(editions, dtype=np.intp)
+        rarities = np.asarray(rarities, dtype=np.intp)
+        xps = np.asarray(xps, dtype=np.int64)
+        if len(xps) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if editions.max() >= rows.shape[0] or rarities.max() >= rows.shape[1] or editions.min() < 0 or rarities.min() < 0:
+            raise KeyError("Unknown edition or rarity")
+        group = rows[editions, rarities]
+        if (group == 0).any():
+            raise KeyError("Unknown edition or rarity")
+        return (xps[:, None] >= matrix[group]).sum(axis=1)
+
+    def summoner_levels(self, editions, rarities, xps):
+        """ Returns the summoner levels (1-4) of many summoner cards at once
+        """
+        levels = self.card_levels(editions, rarities, xps)
+        if np is None:
+            return [int(math.ceil(level / self.max_level_rarity[rarity] * 4)) for level, rarity in zip(levels, rarities)]
+        max_levels = np.array([self.max_level_rarity[r] for r in rarities], dtype=np.float64)
+        return np.ceil(levels / max_levels * 4).astype(np.int64)
+
+    def collection_levels(self, collection, cards):
+        """ Returns the levels of all cards of a collection or of the teams of a battle batch
+
+            :param list collection: Card entries with ``card_detail_id``, ``edition`` and ``xp``
+                (e.g. ``cards/collection`` or battle team members)
+            :param cards: :class:`steemmonsters.cards.CardDatabase` or dict of card details
+        """
+        # utils imports this module
+        from steemmonsters.utils import _card_rarity
+        editions = [c["edition"] for c in collection]
+        rarities = [_card_rarity(cards, c["card_detail_id"]) for c in collection]
+        xps = [c["xp"] for c in collection]
+        return self.card_levels(editions, rarities, xps)
+
+
+_tables = {}
+
+
+def get_xp_table(xp_level=default_xp_level, max_level_rarity=default_max_level_rarity):
+    """ Returns the compiled :class:`XpTable` for the given thresholds, it is compiled only once
+    """
+    key = (id(xp_level), id(max_level_rarity))
+    entry = _tables.get(key)
+    # the tables are kept with the entry, so that their ids cannot be reused
+    if entry is None or entry[0] is not xp_level or entry[1] is not max_level_rarity:
+        entry = (xp_level, max_level_rarity, XpTable(xp_level, max_level_rarity))
+        _tables[key] = entry
+    return entry[2]
@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+import time
+
+
+class Mirror(object):
+    """ Measurements of a single base url
+
+        :param str url: Base url, ending with ``/``
+        :param int index: Position in the configured list, used as tie breaker
+    """
+    def __init__(self, url, index):
+        self.url = url
+        self.index = index
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.
+        self.requests = 0
+
+    def to_dict(self, now):
+        return {"url": self.url, "latency": self.latency, "failures": self.failures,
+                "healthy": self.down_until <= now, "requests": self.requests}
+
+
+class MirrorSelector(object):
+    """ Routes requests to the fastest healthy one of several base urls
+
+        The latency of every answer updates an exponentially weighted average of
+        its mirror. A mirror which fails (connection error, timeout or retryable
+        status) is not used for ``down_time`` seconds, the time doubles with every
+        further consecutive failure up to ``down_time_max``. Mirrors which were not
+        measured yet are preferred, so that every mirror gets measured. When all
+        mirrors are down, the one which recovers first is used.
+
+        :param list urls: Base urls, e.g. origin, CDN and a caching proxy
+        :param float alpha: Weight of a new latency measurement
+        :param float down_time: Seconds a failed mirror is skipped
+        :param float down_time_max: Upper limit of the skip time
+        :param float probe_interval: Seconds after which all mirrors should be measured again
+        :param clock: Function returning the current time in seconds
+    """
+    def __init__(self, urls, alpha=0.3, down_time=10., down_time_max=300., probe_interval=60.,
+                 clock=time.monotonic):
+        if len(urls) == 0:
+            raise ValueError("At least one base url is needed")
+        self.mirrors = [Mirror(url if url.endswith("/") else url + "/", i) for i, url in enumerate(urls)]
+        self.alpha = alpha
+        self.down_time = down_time
+        self.down_time_max = down_time_max
+        self.probe_interval = probe_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_probe = None
+        self._probing = False
+
+    @property
+    def urls(self):
+        return [m.url for m in self.mirrors]
+
+    def _get(self, url):
+        for mirror in self.mirrors:
+            if mirror.url == url:
+                return mirror
+        raise KeyError(url)
+
+    def select(self):
+        """ Returns the base url to which the next request should go
+        """
+        with self._lock:
+            if len(self.mirrors) == 1:
+                return self.mirrors[0].url
+            now = self._clock()
+            healthy = [m for m in self.mirrors if m.down_until <= now]
+            if len(healthy) == 0:
+                return min(self.mirrors, key=lambda m: m.down_until).url
+            best = min(healthy, key=lambda m: (m.latency is not None, m.latency or 0., m.index))
+            return best.url
+
+    def success(self, url, latency):
+        """ Records an answer of the mirror ``url`` which took ``latency`` seconds
+        """
+        with self._lock:
+            mirror = self._get(url)
+            mirror.requests += 1
+            mirror.failures = 0
+            mirror.down_until = 0.
+            if mirror.latency is None:
+                mirror.latency = latency
+            else:
+                mirror.latency += self.alpha * (latency - mirror.latency)
+
+    def failure(self, url):
+        """ Records a failed request to the mirror ``url``
+        """
+        with self._lock:
+            mirror = self._get(url)
+            mirror.requests += 1
+            mirror.failures += 1
+            down_time = min(self.down_time_max, self.down_time * 2 ** (mirror.failures - 1))
+            mirror.down_until = self._clock() + down_time
+
+    def split(self, url):
+        """ Returns the base url of the mirror to which ``url`` belongs and the path relative to it
+
+            The base url is None when ``url`` belongs to no mirror.
+        """
+        for mirror in self.mirrors:
+            if url.startswith(mirror.url):
+                return mirror.url, url[len(mirror.url):]
+        return None, url
+
+    def start_probe(self):
+        """ Returns True when the caller should measure all mirrors now
+
+            Only one probe runs at a time, and only every ``probe_interval`` seconds.
+            The caller has to call :meth:`finish_probe` afterwards.
+        """
+        with self._lock:
+            if len(self.mirrors) == 1 or self._probing:
+                return False
+            now = self._clock()
+            if self._last_probe is not None and now - self._last_probe < self.probe_interval:
+                return False
+            self._probing = True
+            self._last_probe = now
+            return True
+
+    def finish_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def get_stats(self):
+        """ Returns the measurements of all mirrors in configured order
+        """
+        with self._lock:
+            now = self._clock()
+            return [m.to_dict(now) for m in self.mirrors]
@@ -0,0 +1,147 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucket(object):
+    """ Token bucket which allows ``rate`` requests per second with bursts of ``burst`` requests
+
+        Tokens are reserved in advance: a caller takes a token even when the bucket
+        is empty and is told how long it has to wait before it may use it. This
+        keeps the bucket usable from threads and from asyncio tasks alike, see
+        :func:`steemmonsters.aioutils.acquire_async`.
+
+        :param float rate: Refill rate in tokens per second
+        :param int burst: Size of the bucket (default is ``rate``)
+        :param clock: Function returning the current time in seconds
+    """
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<TokenBucket rate=%.2f burst=%d>" % (self.rate, self.capacity)
+
+    def reserve(self):
+        """ Takes one token and returns the number of seconds until it may be used
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+
+class RateLimiter(object):
+    """ Limits the request rate of all api calls with one global and several group buckets
+
+        The group of an endpoint is the endpoint itself when there is a group
+        with its name, e.g. ``transactions/history``, and otherwise its first path
+        element, e.g. ``battle`` for ``battle/status``. A request has to pass the
+        global bucket and the bucket of its group, when there is one.
+
+        :param float rate: Global limit in requests per second
+        :param int burst: Burst size of the global bucket
+        :param dict groups: Maps group names to ``(rate, burst)`` tuples
+    """
+    def __init__(self, rate=10, burst=20, groups=None, clock=time.monotonic):
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.group_buckets = {}
+        if groups is not None:
+            for name in groups:
+                group_rate, group_burst = groups[name]
+                self.group_buckets[name] = TokenBucket(group_rate, group_burst, clock=clock)
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.delayed = 0
+        self.wait_time = 0.
+
+    @classmethod
+    def from_config(cls, config, default=None):
+        """ Creates a limiter from a config entry, e.g. ``rate_limit`` of the config file
+
+            .. code-block:: json
+
+                {"rate": 20, "burst": 40, "groups": {"transactions/history": [20, 40]}}
+
+            Missing values and groups are taken from ``default``. None returns
+            ``default`` unchanged, False disables rate limiting (returns None).
+        """
+        if config is None:
+            return default
+        if config is False:
+            return None
+        rate = config.get("rate", default.bucket.rate if default is not None else 10)
+        burst = config.get("burst", default.bucket.capacity if default is not None else 20)
+        groups = {}
+        if default is not None:
+            for name in default.group_buckets:
+                groups[name] = (default.group_buckets[name].rate, default.group_buckets[name].capacity)
+        groups.update(config.get("groups", {}))
+        return cls(rate=rate, burst=burst, groups=groups)
+
+    def reserve(self, endpoint):
+        """ Reserves a request for ``endpoint`` and returns how many seconds the caller must wait
+        """
+        delay = self.bucket.reserve()
+        group_bucket = self.group_buckets.get(endpoint)
+        if group_bucket is None:
+            group_bucket = self.group_buckets.get(endpoint.split("/")[0])
+        if group_bucket is not None:
+            delay = max(delay, group_bucket.reserve())
+        with self._lock:
+            self.requests += 1
+            if delay > 0:
+                self.delayed += 1
+                self.wait_time += delay
+        return delay
+
+    @contextmanager
+    def waiting(self):
+        """ Counts the caller in ``queue_depth`` while it waits for a reserved request
+
+            .. code-block:: python
+
+                delay = rate_limiter.reserve(endpoint)
+                with rate_limiter.waiting():
+                    time.sleep(delay)
+        """
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+
+    def acquire(self, endpoint):
+        """ Blocks the calling thread until a request to ``endpoint`` is allowed
+        """
+        delay = self.reserve(endpoint)
+        if delay <= 0:
+            return
+        with self.waiting():
+            time.sleep(delay)
+
+    def get_stats(self):
+        """ Returns counters about the limited requests
+
+            ``queue_depth`` is the number of callers which wait right now.
+        """
+        with self._lock:
+            return {"queue_depth": self.queue_depth, "max_queue_depth": self.max_queue_depth,
+                    "requests": self.requests, "delayed": self.delayed, "wait_time": self.wait_time}
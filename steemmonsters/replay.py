@@ -0,0 +1,281 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+_TOKEN_QUERY = re.compile(r"([?&]token=)[^&]*")
+_TOKEN_FIELD = re.compile(r'("token"\s*:\s*")[^"]*(")')
+
+
+def fixture_file_name(path):
+    """ Returns the file name of the fixture for a request path
+    """
+    return hashlib.sha1(path.encode("utf-8")).hexdigest() + ".jsonl"
+
+
+def redact_path(path):
+    """ Replaces the values of ``token`` query parameters of a request path
+    """
+    return _TOKEN_QUERY.sub(r"\1REDACTED", path)
+
+
+def redact_body(body):
+    """ Replaces the values of ``"token"`` fields of a json answer, e.g. of ``players/login``
+    """
+    return _TOKEN_FIELD.sub(r"\1REDACTED\2", body)
+
+
+class FixtureStore(object):
+    """ Recorded answers of the api, one json file per request path
+
+        Each file holds the answers which were received for a path, one json
+        object per line in the order in which they arrived, so that new answers
+        are appended:
+
+        .. code-block:: json
+
+            {"path": "battle/status?id=...", "status": 200, "content_type": "application/json", "body": "..."}
+
+        :param str path: Directory of the fixture files, when None the fixtures are
+            only kept in memory
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.fixtures = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.load()
+
+    def load(self):
+        """ Reads all fixture files of the directory
+        """
+        for name in os.listdir(self.path):
+            if not name.endswith(".jsonl"):
+                continue
+            with io.open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip() == "":
+                        continue
+                    response = json.loads(line)
+                    path = response.pop("path")
+                    self.fixtures.setdefault(path, []).append(response)
+
+    def get(self, path):
+        """ Returns the list of recorded answers for ``path`` or None
+        """
+        return self.fixtures.get(path)
+
+    def add(self, path, status, body, content_type="application/json"):
+        """ Appends an answer for ``path`` to the fixture file
+
+            An answer which equals the last recorded one is not stored again, so
+            that polled endpoints keep only their changes.
+        """
+        response = {"status": status, "content_type": content_type, "body": body}
+        with self._lock:
+            responses = self.fixtures.setdefault(path, [])
+            if len(responses) > 0 and responses[-1] == response:
+                return
+            responses.append(response)
+            if self.path is None:
+                return
+            line = dict(response)
+            line["path"] = path
+            with io.open(os.path.join(self.path, fixture_file_name(path)), "a", encoding="utf-8") as f:
+                f.write(json.dumps(line) + "\n")
+
+
+class Recorder(object):
+    """ Captures the traffic of an :class:`steemmonsters.api.Api` into fixture files
+
+        .. code-block:: python
+
+            api = Api(recorder=Recorder("fixtures"))
+
+        Login tokens are replaced by ``REDACTED``, in the request paths and in
+        the answers.
+
+        :param str path: Directory of the fixture files
+    """
+    def __init__(self, path):
+        self.store = FixtureStore(path)
+
+    def record(self, path, response):
+        """ Stores a ``requests.Response`` received for ``path``
+        """
+        if response.status_code == 304:
+            return
+        self.store.add(redact_path(path), response.status_code, redact_body(response.text),
+                       content_type=response.headers.get("Content-Type", "application/json"))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, content_type, body, etag = self.server.replay.answer(self.path.lstrip("/"))
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(object):
+    """ Local stand-in for the steemmonsters api which answers from fixtures
+
+        Polled paths with several recorded answers return them one after the
+        other and then keep returning the last one. Paths without fixture are
+        answered with 404. Login tokens of the requests are redacted before
+        they are looked up, like in recorded fixtures.
+
+        .. code-block:: python
+
+            with ReplayServer(FixtureStore("fixtures"), latency=0.05, error_rate=0.01) as server:
+                api = Api(url=server.url)
+
+        :param FixtureStore fixtures: Answers to replay
+        :param str host: Interface to listen on
+        :param int port: Port to listen on, 0 selects a free port
+        :param float latency: Delay in seconds before each answer
+        :param float jitter: Random additional delay of up to ``jitter`` seconds
+        :param float error_rate: Probability of answering with ``503 Service Unavailable``
+        :param int seed: Seed of the random generator for repeatable runs
+    """
+    def __init__(self, fixtures, host="127.0.0.1", port=0, latency=0., jitter=0., error_rate=0., seed=None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = _ThreadingHTTPServer((host, port), _ReplayHandler)
+        self.httpd.replay = self
+
+    @property
+    def url(self):
+        """ Base url which can be given to :class:`steemmonsters.api.Api`
+        """
+        host, port = self.httpd.server_address[:2]
+        return "http://%s:%d/" % (host, port)
+
+    def answer(self, path):
+        """ Returns ``(status, content_type, body, etag)`` of the next answer for ``path``
+        """
+        path = redact_path(path)
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            delay = self.latency + self.jitter * self._random.random()
+            responses = self.fixtures.get(path)
+            if responses is not None and not failed:
+                position = self._positions.get(path, 0)
+                self._positions[path] = min(position + 1, len(responses) - 1)
+                response = responses[position]
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return 503, "text/plain", "Service Unavailable", None
+        if responses is None:
+            return 404, "application/json", json.dumps({"error": "No fixture for %s" % path}), None
+        etag = '"%s"' % hashlib.sha1(response["body"].encode("utf-8")).hexdigest()
+        return response["status"], response.get("content_type", "application/json"), response["body"], etag
+
+    def start(self):
+        """ Serves in a background thread
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.1,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in server for the steemmonsters api")
+    subparsers = parser.add_subparsers(dest="command")
+    serve = subparsers.add_parser("serve", help="Replays the fixtures of a directory")
+    serve.add_argument("fixtures", help="Fixture directory")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--latency", type=float, default=0., help="Delay of each answer in seconds")
+    serve.add_argument("--jitter", type=float, default=0., help="Random additional delay in seconds")
+    serve.add_argument("--error-rate", type=float, default=0., help="Fraction of answers which fail with 503")
+    serve.add_argument("--seed", type=int, default=None)
+    generate = subparsers.add_parser("generate", help="Writes synthetic fixtures into a directory")
+    generate.add_argument("fixtures", help="Fixture directory")
+    generate.add_argument("--start-block", type=int, default=30000000)
+    generate.add_argument("--blocks", type=int, default=1200)
+    generate.add_argument("--battles-per-block", type=int, default=2)
+    generate.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = ReplayServer(FixtureStore(args.fixtures), host=args.host, port=args.port, latency=args.latency,
+                              jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+        print("Serving %d fixtures on %s" % (len(server.fixtures.fixtures), server.url))
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("Exiting cleanly...")
+    elif args.command == "generate":
+        from steemmonsters.synthetic import SyntheticData
+        data = SyntheticData(seed=args.seed, start_block=args.start_block, blocks=args.blocks,
+                             battles_per_block=args.battles_per_block)
+        store = FixtureStore(args.fixtures)
+        data.write_fixtures(store)
+        print("Wrote %d fixtures to %s" % (len(store.fixtures), args.fixtures))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+
+
+_NOT_DECODED = object()
+
+
+class BufferedResponse(object):
+    """ Minimal stand-in for a ``requests.Response`` of an already read body
+    """
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+
+class ApiResponse(object):
+    """ Wraps a ``requests.Response`` and decodes its json body only once
+
+        Items can be read directly from the wrapper:
+
+        .. code-block:: python
+
+            response = api.request("battle/result?id=%s" % trx_id)
+            if response.ok and "winner" in response:
+                winner = response["winner"]
+                details = response.decoded("details")
+
+        :param requests.Response response: The wrapped response
+    """
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self._data = _NOT_DECODED
+        self._decoded = {}
+
+    def __repr__(self):
+        return "<ApiResponse [%d]>" % self.status_code
+
+    @property
+    def ok(self):
+        """ True for a 200 answer
+        """
+        return self.status_code == 200
+
+    def json(self):
+        """ Returns the decoded body, it is decoded on the first call
+        """
+        if self._data is _NOT_DECODED:
+            self._data = self.response.json()
+        return self._data
+
+    def __getitem__(self, key):
+        return self.json()[key]
+
+    def __contains__(self, key):
+        data = self.json()
+        return isinstance(data, dict) and key in data
+
+    def get(self, key, default=None):
+        data = self.json()
+        if not isinstance(data, dict):
+            return default
+        return data.get(key, default)
+
+    def decoded(self, key):
+        """ Returns the field ``key``, which holds a json encoded string, as decoded object
+
+            The field is decoded on the first call and memoized, fields which were
+            already delivered as object or list are returned unchanged.
+        """
+        if key not in self._decoded:
+            value = self[key]
+            if value is not None and not isinstance(value, (dict, list)):
+                value = json.loads(value)
+            self._decoded[key] = value
+        return self._decoded[key]
@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import random
+import time
+from email.utils import parsedate_tz, mktime_tz
+from steemmonsters.exceptions import PermanentApiError, RetriesExhaustedError
+
+
+#: Http status codes which indicate a temporary problem on the server side
+RETRY_STATUSES = frozenset([408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 524])
+
+
+def parse_retry_after(value, now=None):
+    """ Returns the delay in seconds given by a ``Retry-After`` header
+
+        :param str value: Header value, either a number of seconds or a http date
+        :param float now: Current unix time, used for http dates (default is ``time.time()``)
+
+        Returns None when the header is missing or cannot be parsed.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0., mktime_tz(parsed) - now)
+
+
+class RetryPolicy(object):
+    """ Decides whether and when a failed api call is repeated
+
+        The delay before attempt ``n + 1`` grows exponentially as
+        ``backoff_factor * 2 ** (n - 1)`` up to ``backoff_max``. A random part of
+        the delay (given by ``jitter``) is removed, so that many clients which
+        failed at the same moment do not retry at the same moment.
+
+        :param int max_attempts: Maximum number of requests, including the first one
+        :param float backoff_factor: Delay in seconds after the first failed attempt
+        :param float backoff_max: Upper limit for a single delay
+        :param float jitter: Fraction of the delay which is randomized (0 disables jitter)
+        :param retry_statuses: Http status codes that are retried, all other
+            non 200 status codes are permanent errors
+        :param bool respect_retry_after: Wait at least as long as the server
+            asks for in its ``Retry-After`` header
+        :param float retry_after_max: Upper limit for a delay requested by ``Retry-After``
+    """
+    def __init__(self, max_attempts=10, backoff_factor=0.5, backoff_max=16., jitter=0.5,
+                 retry_statuses=RETRY_STATUSES, respect_retry_after=True, retry_after_max=120.):
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.retry_after_max = retry_after_max
+
+    def __repr__(self):
+        return "<RetryPolicy max_attempts=%d backoff_factor=%.2f backoff_max=%.2f>" % (
+            self.max_attempts, self.backoff_factor, self.backoff_max)
+
+    def is_retryable(self, status_code):
+        """ Returns True when a response with this status code should be retried
+        """
+        return status_code in self.retry_statuses
+
+    def get_delay(self, attempt, retry_after=None):
+        """ Returns the number of seconds to wait after a failed attempt
+
+            :param int attempt: Number of the attempt that just failed, starting with 1
+            :param retry_after: Value of the ``Retry-After`` header of the failed response
+        """
+        delay = min(self.backoff_max, self.backoff_factor * 2 ** (attempt - 1))
+        if self.jitter > 0:
+            delay -= delay * self.jitter * random.random()
+        if self.respect_retry_after:
+            requested = parse_retry_after(retry_after)
+            if requested is not None:
+                delay = max(delay, min(requested, self.retry_after_max))
+        return delay
+
+
+class RetryState(object):
+    """ Keeps track of the failed attempts of a single api call
+
+        :param RetryPolicy policy: Policy of the called endpoint
+        :param str endpoint: Endpoint name, used in error messages
+        :param str url: Requested url
+    """
+    def __init__(self, policy, endpoint, url):
+        self.policy = policy
+        self.endpoint = endpoint
+        self.url = url
+        self.attempts = 0
+        self.status_code = None
+        self.history = []
+
+    def failed(self, reason, status_code=None, retry_after=None):
+        """ Records a failed attempt and returns the delay before the next one
+
+            :param str reason: Description of the failure
+            :param int status_code: Http status of the response, None when the
+                request itself failed (connection error, timeout)
+            :param str retry_after: ``Retry-After`` header of the response
+
+            Raises :class:`PermanentApiError` when the status code is not
+            retryable and :class:`RetriesExhaustedError` when the policy allows
+            no further attempt.
+        """
+        self.attempts += 1
+        self.status_code = status_code
+        self.history.append(reason)
+        if status_code is not None and not self.policy.is_retryable(status_code):
+            raise PermanentApiError("%s failed with %s" % (self.endpoint, reason),
+                                    endpoint=self.endpoint, url=self.url, status_code=status_code,
+                                    attempts=self.attempts, history=self.history)
+        if self.attempts >= self.policy.max_attempts:
+            raise RetriesExhaustedError("%s failed after %d attempts, last error: %s" % (self.endpoint, self.attempts, reason),
+                                        endpoint=self.endpoint, url=self.url, status_code=status_code,
+                                        attempts=self.attempts, history=self.history)
+        return self.policy.get_delay(self.attempts, retry_after)
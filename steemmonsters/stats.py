@@ -0,0 +1,155 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import bisect
+import io
+import json
+import threading
+
+
+#: Bucket bounds for durations in seconds
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+#: Bucket bounds for sizes in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+#: Bucket bounds for retry counts
+RETRY_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+
+
+class Histogram(object):
+    """ Counts values in fixed buckets and keeps count, sum, min and max
+
+        :param bounds: Sorted upper bounds of the buckets, larger values are
+            counted in an additional overflow bucket
+    """
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.sum / self.count
+
+    def percentile(self, q):
+        """ Returns the upper bound of the bucket which holds the ``q`` quantile (0 <= q <= 1)
+
+            The result is limited to the largest added value.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n > 0:
+                if i == len(self.bounds):
+                    return self.max
+                return min(self.bounds[i], self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "mean": self.mean, "p50": self.percentile(0.5), "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99), "bounds": list(self.bounds), "counts": list(self.counts)}
+
+
+class EndpointStats(object):
+    """ Measurements of a single api endpoint
+    """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.counters = {}
+        self.wall_time = Histogram(TIME_BUCKETS)
+        self.decode_time = Histogram(TIME_BUCKETS)
+        self.bytes_received = Histogram(SIZE_BUCKETS)
+        self.retries = Histogram(RETRY_BUCKETS)
+        self.last_error = None
+
+    def to_dict(self):
+        return {"calls": self.calls, "errors": self.errors, "last_error": self.last_error,
+                "status_codes": dict((str(s), n) for s, n in self.status_codes.items()),
+                "counters": dict(self.counters),
+                "wall_time": self.wall_time.to_dict(), "decode_time": self.decode_time.to_dict(),
+                "bytes_received": self.bytes_received.to_dict(), "retries": self.retries.to_dict()}
+
+
+class ApiStats(object):
+    """ Collects per endpoint measurements of all api calls
+
+        For each endpoint, histograms of the wall time of a call (including its
+        retries), the received bytes, the json decode time and the number of
+        retries are kept, together with the final status codes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def _endpoint(self, endpoint):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def record_request(self, endpoint, wall_time, status_code, retries, error=None):
+        """ Records a finished call, ``status_code`` is None when no answer was received
+        """
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats.calls += 1
+            stats.wall_time.add(wall_time)
+            stats.retries.add(retries)
+            stats.status_codes[status_code] = stats.status_codes.get(status_code, 0) + 1
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = error
+
+    def record_bytes(self, endpoint, bytes_received):
+        with self._lock:
+            self._endpoint(endpoint).bytes_received.add(bytes_received)
+
+    def record_decode(self, endpoint, decode_time):
+        with self._lock:
+            self._endpoint(endpoint).decode_time.add(decode_time)
+
+    def count(self, endpoint, name, value=1):
+        """ Increases the counter ``name`` of an endpoint, e.g. for cache hits
+        """
+        with self._lock:
+            counters = self._endpoint(endpoint).counters
+            counters[name] = counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+    def to_dict(self):
+        with self._lock:
+            return dict((endpoint, self.endpoints[endpoint].to_dict()) for endpoint in self.endpoints)
+
+    def dump(self, file_name, extra=None):
+        """ Writes all measurements as json into ``file_name``
+
+            :param dict extra: Additional top level entries of the json document
+        """
+        data = {"endpoints": self.to_dict()}
+        if extra is not None:
+            data.update(extra)
+        with io.open(file_name, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, indent=4, sort_keys=True))
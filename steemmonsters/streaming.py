@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import codecs
+import json
+import re
+
+
+_WHITESPACE = re.compile(r'\s*')
+
+_START = 0
+_OBJECT_KEY = 1
+_OBJECT_VALUE = 2
+_ARRAY_START = 3
+_ARRAY = 4
+_DONE = 5
+
+
+class JsonArrayParser(object):
+    """ Parses a json array incrementally and returns its elements as soon as they are complete
+
+        The body is fed in arbitrary chunks, only the not yet parsed rest of the
+        body is kept in memory. With ``key``, the array is expected as value of
+        this key in a top level object (e.g. ``{"player": "...", "cards": [...]}``),
+        fields which follow the array are ignored.
+
+        .. code-block:: python
+
+            parser = JsonArrayParser(key="cards")
+            for chunk in response.iter_content(65536):
+                for card in parser.feed(chunk):
+                    ...
+            parser.close()
+
+        :param str key: Name of the field which holds the array, None when the
+            body is the array itself
+    """
+    #: Method which parses the next token in each state
+    _steps = {
+        _START: "_step_start",
+        _OBJECT_KEY: "_step_object_key",
+        _OBJECT_VALUE: "_step_object_value",
+        _ARRAY_START: "_step_array_start",
+        _ARRAY: "_step_array",
+    }
+
+    def __init__(self, key=None):
+        self.key = key
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = _START
+
+    @property
+    def done(self):
+        """ True when the end of the array was reached
+        """
+        return self._state == _DONE
+
+    def feed(self, data, final=False):
+        """ Adds the next chunk of the body and returns the newly completed elements
+
+            :param data: Next part of the body as bytes or str
+            :param bool final: True for the last chunk
+        """
+        if isinstance(data, bytes):
+            data = self._text_decoder.decode(data, final=final)
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        items = []
+        while self._state != _DONE and self._step(items, final):
+            pass
+        return items
+
+    def close(self):
+        """ Parses what is left and raises ``ValueError`` when the body ended before the array
+        """
+        items = self.feed(b"", final=True)
+        if self._state != _DONE:
+            raise ValueError("Incomplete json body, the array was not closed")
+        return items
+
+    def _skip_whitespace(self):
+        self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+        if self._pos < len(self._buffer):
+            return self._buffer[self._pos]
+        return None
+
+    def _decode(self, final):
+        """ Decodes the value at the current position, returns False when more data is needed
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except ValueError:
+            if final:
+                raise
+            return False, None
+        # A number at the end of the buffer could continue in the next chunk
+        if end == len(self._buffer) and not final:
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _expect(self, char, expected):
+        if char != expected:
+            raise ValueError("Expected '%s' at position %d, found '%s'" % (expected, self._pos, char))
+        self._pos += 1
+
+    def _step(self, items, final):
+        """ Parses the next token, returns False when more data is needed
+        """
+        char = self._skip_whitespace()
+        if char is None:
+            return False
+        return getattr(self, self._steps[self._state])(char, items, final)
+
+    def _step_start(self, char, items, final):
+        if self.key is None:
+            self._expect(char, "[")
+            self._state = _ARRAY
+        else:
+            self._expect(char, "{")
+            self._state = _OBJECT_KEY
+        return True
+
+    def _step_object_key(self, char, items, final):
+        if char == ",":
+            self._pos += 1
+            return True
+        elif char == "}":
+            # The key is missing, which is treated as an empty array
+            self._state = _DONE
+            return True
+        start = self._pos
+        complete, name = self._decode(final)
+        if not complete:
+            return False
+        if self._skip_whitespace() is None:
+            self._pos = start
+            return False
+        self._expect(self._buffer[self._pos], ":")
+        self._state = _ARRAY_START if name == self.key else _OBJECT_VALUE
+        return True
+
+    def _step_object_value(self, char, items, final):
+        complete, value = self._decode(final)
+        if not complete:
+            return False
+        self._state = _OBJECT_KEY
+        return True
+
+    def _step_array_start(self, char, items, final):
+        self._expect(char, "[")
+        self._state = _ARRAY
+        return True
+
+    def _step_array(self, char, items, final):
+        if char == "]":
+            self._pos += 1
+            self._state = _DONE
+        elif char == ",":
+            self._pos += 1
+        else:
+            complete, value = self._decode(final)
+            if not complete:
+                return False
+            items.append(value)
+        return True
@@ -0,0 +1,192 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import hashlib
+import json
+import random
+from datetime import datetime, timedelta
+from steemmonsters.constants import xp_level, max_level_rarity
+
+
+COLORS = ["Red", "Blue", "Green", "White", "Black", "Gold"]
+STAT_NAMES = ["attack", "ranged", "magic", "armor", "health", "speed"]
+timeFormat = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+class SyntheticData(object):
+    """ Generates plausible api answers for offline tests and benchmarks
+
+        The data follows the structure of the real api (card details, players,
+        collections, ``transactions/history`` with ``sm_find_match`` and
+        ``sm_team_reveal`` entries, battle results), but all values are random.
+        The same seed always creates the same data.
+
+        :param int seed: Seed of the random generator
+        :param int cards_per_color: Number of monsters per splinter, each splinter also gets two summoners
+        :param int players: Number of players
+        :param int start_block: First block with battles
+        :param int blocks: Number of blocks with battles
+        :param int battles_per_block: Number of battles which end in each block
+        :param int history_window: Number of blocks returned by one ``transactions/history`` answer
+        :param int mana_cap: Mana cap of the ranked settings
+        :param str ruleset: Ruleset of the ranked settings
+    """
+    def __init__(self, seed=0, cards_per_color=10, players=100, start_block=30000000, blocks=1200,
+                 battles_per_block=1, history_window=3, mana_cap=25, ruleset="Standard"):
+        self.random = random.Random(seed)
+        self.start_block = start_block
+        self.blocks = blocks
+        self.battles_per_block = battles_per_block
+        self.history_window = history_window
+        self.mana_cap = mana_cap
+        self.ruleset = ruleset
+        self.start_date = datetime(2018, 10, 1)
+        self.cards = self._create_cards(cards_per_color)
+        self.players = ["player%03d" % i for i in range(players)]
+        self.ratings = dict((p, self.random.randint(100, 4000)) for p in self.players)
+        self.collections = dict((p, self._create_collection(p)) for p in self.players)
+        self.history = self._create_history()
+
+    def _trx_id(self, *args):
+        return hashlib.sha1(",".join(str(a) for a in args).encode("utf-8")).hexdigest()
+
+    def _create_cards(self, cards_per_color):
+        cards = []
+        card_id = 1
+        for color in COLORS:
+            for i in range(cards_per_color + 2):
+                rarity = self.random.choice([1, 1, 1, 2, 2, 3, 4])
+                levels = max_level_rarity[rarity]
+                card = {"id": card_id, "name": "%s Card %d" % (color, card_id), "color": color,
+                        "rarity": rarity, "editions": self.random.choice(["0,1", "1", "2"]),
+                        "is_starter": False}
+                if i < 2:
+                    card["type"] = "Summoner"
+                    card["stats"] = {"mana": self.random.randint(3, 7), "abilities": []}
+                    for name in STAT_NAMES:
+                        card["stats"][name] = self.random.randint(-1, 1)
+                else:
+                    card["type"] = "Monster"
+                    mana = self.random.randint(1, 9)
+                    card["stats"] = {"mana": [mana] * levels, "abilities": [[] for level in range(levels)]}
+                    for name in STAT_NAMES:
+                        base = self.random.randint(0, 4)
+                        card["stats"][name] = [base + level // 2 for level in range(levels)]
+                cards.append(card)
+                card_id += 1
+        return cards
+
+    def _card_level(self, card, edition):
+        thresholds = [x for x in xp_level if x["edition"] == edition and x["rarity"] == card["rarity"]][0]["xp_level"]
+        level = self.random.randint(1, len(thresholds))
+        return level, thresholds[level]
+
+    def _create_collection(self, player):
+        owned = []
+        for card in self.cards:
+            if card["type"] == "Summoner" or self.random.random() < 0.7:
+                for copy in range(self.random.randint(1, 2)):
+                    edition = int(self.random.choice(card["editions"].split(",")))
+                    level, xp = self._card_level(card, edition)
+                    owned.append({"uid": "C-%s" % self._trx_id(player, card["id"], copy)[:10].upper(),
+                                  "card_detail_id": card["id"], "xp": xp, "gold": self.random.random() < 0.05,
+                                  "edition": edition, "level": level, "player": player})
+        return owned
+
+    def _team(self, player):
+        collection = self.collections[player]
+        summoners = [c for c in collection if self.cards[c["card_detail_id"] - 1]["type"] == "Summoner"]
+        summoner = self.random.choice(summoners)
+        color = self.cards[summoner["card_detail_id"] - 1]["color"]
+        monster_ids = set(card["id"] for card in self.cards if card["type"] == "Monster" and card["color"] == color)
+        monsters = [c for c in collection if c["card_detail_id"] in monster_ids]
+        self.random.shuffle(monsters)
+        chosen = []
+        for m in monsters:
+            if len(chosen) == 6 or m["card_detail_id"] in [c["card_detail_id"] for c in chosen]:
+                continue
+            chosen.append(m)
+        return {"player": player, "summoner": summoner, "monsters": chosen[:self.random.randint(1, 6)]}
+
+    def _create_history(self):
+        history = []
+        for block in range(self.start_block, self.start_block + self.blocks):
+            created = self.start_date + timedelta(seconds=3 * (block - self.start_block))
+            created_date = created.strftime(timeFormat)
+            for n in range(self.battles_per_block):
+                player1, player2 = self.random.sample(self.players, 2)
+                team1 = self._team(player1)
+                team2 = self._team(player2)
+                winner = self.random.choice([player1, player2])
+                battle_id = self._trx_id("battle", block, n)
+                details = {"team1": team1, "team2": team2, "winner": winner}
+                battle = {"id": battle_id, "mana_cap": self.mana_cap, "ruleset": self.ruleset,
+                          "player_1": player1, "player_2": player2, "winner": winner,
+                          "player_1_rating_initial": self.ratings[player1], "player_2_rating_initial": self.ratings[player2],
+                          "details": details, "block_num": block, "created_date": created_date}
+                for player in [player1, player2]:
+                    history.append({"id": self._trx_id("find", block, n, player), "block_num": block,
+                                    "type": "sm_find_match", "player": player, "success": True,
+                                    "created_date": created_date,
+                                    "data": json.dumps({"match_type": "Ranked", "mana_cap": self.mana_cap,
+                                                        "summoner_level": 4, "ruleset": self.ruleset}),
+                                    "result": json.dumps({"success": True})})
+                history.append({"id": self._trx_id("reveal", block, n, player1), "block_num": block,
+                                "type": "sm_team_reveal", "player": player1, "success": True,
+                                "created_date": created_date, "data": "{}",
+                                "result": json.dumps({"success": True, "status": "Waiting for opponent reveal."})})
+                history.append({"id": self._trx_id("reveal", block, n, player2), "block_num": block,
+                                "type": "sm_team_reveal", "player": player2, "success": True,
+                                "created_date": created_date, "data": "{}",
+                                "result": json.dumps({"success": True, "battle": battle})})
+        return history
+
+    def battles(self):
+        """ Yields the finished battles in the form of ``battle/result`` answers
+        """
+        for h in self.history:
+            if h["type"] != "sm_team_reveal":
+                continue
+            result = json.loads(h["result"])
+            if "battle" not in result:
+                continue
+            battle = dict(result["battle"])
+            battle["details"] = json.dumps(battle["details"])
+            battle["player_1_rating_final"] = battle["player_1_rating_initial"] + (10 if battle["winner"] == battle["player_1"] else -10)
+            battle["player_2_rating_final"] = battle["player_2_rating_initial"] + (10 if battle["winner"] == battle["player_2"] else -10)
+            yield battle
+
+    def answers(self):
+        """ Yields ``(path, answer)`` for every generated api answer
+        """
+        yield "cards/get_details", self.cards
+        yield "settings", {"ranked_settings": {"mana_cap": self.mana_cap, "ruleset": self.ruleset},
+                           "quests": []}
+        leaderboard = sorted(self.players, key=lambda p: self.ratings[p], reverse=True)
+        yield "players/leaderboard", [{"player": p, "rating": self.ratings[p], "rank": i + 1}
+                                      for i, p in enumerate(leaderboard)]
+        for i, player in enumerate(leaderboard):
+            yield "players/details?name=%s" % player, {"name": player, "rating": self.ratings[player],
+                                                       "rank": i + 1, "battles": 0, "wins": 0, "current_streak": 0}
+            yield "cards/collection/%s" % player, {"player": player, "cards": self.collections[player]}
+        by_block = {}
+        for h in self.history:
+            by_block.setdefault(h["block_num"], []).append(h)
+        for block in range(self.start_block, self.start_block + self.blocks):
+            records = []
+            for b in range(block, min(block + self.history_window, self.start_block + self.blocks)):
+                records.extend(by_block.get(b, []))
+            yield "transactions/history?from_block=%d" % block, records
+        for battle in self.battles():
+            yield "battle/result?id=%s" % battle["id"], battle
+            yield "battle/status?id=%s" % battle["id"], {"id": battle["id"], "status": 2,
+                                                         "player": battle["player_1"], "reveal_tx": battle["id"]}
+            yield "transactions/lookup?trx_id=%s" % battle["id"], {"trx_info": {"id": battle["id"], "success": True,
+                                                                                "block_num": battle["block_num"]}}
+
+    def write_fixtures(self, store):
+        """ Adds all answers to a :class:`steemmonsters.replay.FixtureStore`
+        """
+        for path, answer in self.answers():
+            store.add(path, 200, json.dumps(answer))
@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Bits of the level in a slot
+LEVEL_BITS = 4
+#: Bits of the card id in a slot
+ID_BITS = 12
+SLOT_BITS = ID_BITS + LEVEL_BITS
+_LEVEL_MASK = (1 << LEVEL_BITS) - 1
+_SLOT_MASK = (1 << SLOT_BITS) - 1
+_MAX_ID = (1 << ID_BITS) - 1
+
+
+def _slot(card_id, level):
+    if not 0 < card_id <= _MAX_ID or not 0 <= level <= _LEVEL_MASK:
+        raise ValueError("Card %s-%s cannot be packed" % (str(card_id), str(level)))
+    return card_id << LEVEL_BITS | level
+
+
+def pack_team(cards):
+    """ Packs a team into one int, the canonical key of the team
+
+        Each card is a slot of :data:`SLOT_BITS` bits with its id and level,
+        the summoner is in the lowest slot. Equal teams have equal keys.
+
+        :param cards: ``(card_id, level)`` pairs, the summoner first
+    """
+    key = 0
+    shift = 0
+    for card_id, level in cards:
+        key |= _slot(card_id, level) << shift
+        shift += SLOT_BITS
+    return key
+
+
+def unpack_team(key):
+    """ Returns the ``(card_id, level)`` pairs of a packed team, the summoner first
+    """
+    cards = []
+    while key:
+        slot = key & _SLOT_MASK
+        cards.append((slot >> LEVEL_BITS, slot & _LEVEL_MASK))
+        key >>= SLOT_BITS
+    return cards
+
+
+def team_size(key):
+    """ Returns the number of cards of a packed team
+    """
+    return (key.bit_length() + SLOT_BITS - 1) // SLOT_BITS
+
+
+def team_key_from_string(team_string):
+    """ Packs the short form ``"id-level,id-level,..."``
+    """
+    key = 0
+    shift = 0
+    for card in team_string.split(","):
+        card_id, level = card.split("-")
+        key |= _slot(int(card_id), int(level)) << shift
+        shift += SLOT_BITS
+    return key
+
+
+def team_key_to_string(key):
+    """ Returns the short form ``"id-level,id-level,..."`` of a packed team
+    """
+    return ",".join(["%d-%d" % card for card in unpack_team(key)])
+
+
+def team_key_from_dicts(team):
+    """ Packs a list of ``{"id": ..., "level": ...}`` dicts, the summoner first
+    """
+    return pack_team((card["id"], card["level"]) for card in team)
+
+
+def team_key_to_dicts(key):
+    """ Returns the ``{"id": ..., "level": ...}`` dicts of a packed team
+    """
+    return [{"id": card_id, "level": level} for card_id, level in unpack_team(key)]
+
+
+def team_key_from_details(team):
+    """ Packs a team of a battle result (``details["team1"]``) with summoner and monsters
+    """
+    summoner = team["summoner"]
+    key = _slot(summoner["card_detail_id"], summoner["level"])
+    shift = SLOT_BITS
+    for monster in team["monsters"]:
+        key |= _slot(monster["card_detail_id"], monster["level"]) << shift
+        shift += SLOT_BITS
+    return key
+
+
+def team_key_to_ids(key):
+    """ Returns summoner and monsters of a packed team in the form of ``sm_team_reveal``
+    """
+    cards = unpack_team(key)
+    summoner = {"id": cards[0][0], "gold": False}
+    monsters = [{"id": card_id, "gold": False} for card_id, level in cards[1:]]
+    return summoner, monsters
+
+
+def team_matrix(teams, slots=7):
+    """ Returns the card ids and the levels of many teams as two matrices with one team per row
+
+        :param teams: Packed teams, short form strings ``"id-level,..."`` or lists of ``(card_id, level)`` pairs
+        :param int slots: Number of columns, empty slots are 0
+
+        With numpy, numpy arrays of shape ``(len(teams), slots)`` are returned, otherwise lists of lists.
+    """
+    ids = []
+    levels = []
+    for team in teams:
+        if hasattr(team, "split"):
+            team = unpack_team(team_key_from_string(team))
+        elif not isinstance(team, (list, tuple)):
+            team = unpack_team(team)
+        if len(team) > slots:
+            raise ValueError("Team with %d cards does not fit into %d slots" % (len(team), slots))
+        padding = [0] * (slots - len(team))
+        ids.append([card_id for card_id, level in team] + padding)
+        levels.append([level for card_id, level in team] + padding)
+    if np is None:
+        return ids, levels
+    return np.array(ids, dtype=np.intp).reshape(-1, slots), np.array(levels, dtype=np.intp).reshape(-1, slots)
+
+
+def team_summoner(key):
+    """ Returns the card id of the summoner of a packed team
+    """
+    return (key & _SLOT_MASK) >> LEVEL_BITS
+
+
+class TeamTable(object):
+    """ Interning table for packed teams
+
+        Every distinct team is stored once and gets a dense number, so that
+        counts or scores of many teams can be kept in lists or arrays.
+
+        .. code-block:: python
+
+            table = TeamTable()
+            n = table.add(team_key_from_string("1-1,3-2"))
+            team_string = team_key_to_string(table.key(n))
+    """
+    def __init__(self):
+        self.keys = []
+        self._numbers = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __contains__(self, key):
+        return key in self._numbers
+
+    def add(self, key):
+        """ Returns the number of a packed team, new teams are appended
+        """
+        number = self._numbers.get(key)
+        if number is None:
+            number = len(self.keys)
+            self._numbers[key] = number
+            self.keys.append(key)
+        return number
+
+    def number(self, key):
+        """ Returns the number of a known packed team, raises ``KeyError`` otherwise
+        """
+        return self._numbers[key]
+
+    def key(self, number):
+        return self.keys[number]
+
+    def intern(self, key):
+        """ Returns the stored int object which is equal to ``key``
+        """
+        return self.keys[self.add(key)]
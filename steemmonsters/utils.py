@@ -1,8 +1,10 @@
 import string
 import hashlib
-import math
 import sys
 from collections import OrderedDict
+from steemmonsters.cards import CardDatabase
+from steemmonsters.levels import get_xp_table
+from steemmonsters.teams import unpack_team
 
 
 def generate_key(length):
@@ -29,51 +31,122 @@ def generate_team_hash(summoner, monsters, secret):
     return team_hash
 
 
+def _card_rarity(cards, card_id):
+    if isinstance(cards, CardDatabase):
+        return cards.rarity(card_id)
+    return cards[card_id]["rarity"]
+
+
+def _card_name(cards, card_id):
+    if isinstance(cards, CardDatabase):
+        return cards.name(card_id)
+    return cards[card_id]["name"]
+
+
+def _card_color(cards, card_id):
+    if isinstance(cards, CardDatabase):
+        return cards.color(card_id)
+    return cards[card_id]["color"]
+
+
+def _mana_getter(cards):
+    """ Returns a function ``get(card_id, level=1)`` which returns the mana of a card at a level,
+        the last level is used for higher levels
+    """
+    if isinstance(cards, CardDatabase):
+        return cards.stat_getter("mana")
+
+    def get(card_id, level=1):
+        mana = cards[card_id]['stats']['mana']
+        if isinstance(mana, list) and len(mana) >= level:
+            mana = mana[level - 1]
+        elif isinstance(mana, list):
+            mana = mana[-1]
+        return mana
+    return get
+
+
+def _card_id_by_name(cards_by_name, name):
+    if isinstance(cards_by_name, CardDatabase):
+        return cards_by_name.id_of(name)
+    return cards_by_name[name]["id"]
+
+
 def get_summoner_level(summoner_card, cards, xp_level, max_level_rarity):
-    card_id = summoner_card["card_detail_id"]
-    for x in xp_level:
-        if x["edition"] == summoner_card["edition"] and x["rarity"] == cards[card_id]["rarity"]:
-            summoner_level = 0
-            for l in x["xp_level"]:
-                if summoner_card["xp"] >= x["xp_level"][l]:
-                    summoner_level = l
-    summoner_level = int(math.ceil(summoner_level / max_level_rarity[cards[card_id]["rarity"]] * 4))
-    return summoner_level
+    rarity = _card_rarity(cards, summoner_card["card_detail_id"])
+    table = get_xp_table(xp_level, max_level_rarity)
+    return table.summoner_level(summoner_card["edition"], rarity, summoner_card["xp"])
 
 def mana_team_id(response, cards):
+    mana = _mana_getter(cards)
     mana_sum = 0
     if not isinstance(response, list):
         response = [response]
     for r in response:
         summoner = r["summoner"]
         monsters = r["monsters"]
-        monsters_list = []
         for m in monsters:
-            mana = cards[m["id"]]['stats']['mana']
-            if isinstance(mana, list):
-                mana = mana[0]            
-            mana_sum += mana
-        
-        mana = cards[summoner["id"]]['stats']['mana']
-        if isinstance(mana, list):
-            mana = mana[0]             
-        mana_sum += mana
+            mana_sum += mana(m["id"])
+        mana_sum += mana(summoner["id"])
     return mana_sum
 
+
+def _team_cards(team):
+    """ Returns the ``(card_id, level)`` pairs of a short form string ``"id-level,..."`` or a packed team
+    """
+    if hasattr(team, "split"):
+        return [(int(card.split("-")[0]), int(card.split("-")[1])) for card in team.split(",")]
+    return unpack_team(team)
+
+
 def mana_team_string(s, cards):
+    """ Returns the mana of a team in short form ``"id-level,..."`` or packed by :func:`steemmonsters.teams.pack_team`
+    """
+    mana = _mana_getter(cards)
     mana_sum = 0
-
-    for r in s.split(','):
-        r_id = int(r.split('-')[0])
-        r_lvl = int(r.split('-')[1])
-        mana = cards[r_id]['stats']['mana']
-        if isinstance(mana, list) and len(mana) >= r_lvl:
-            mana = mana[r_lvl-1]
-        elif isinstance(mana, list):
-            mana = mana[-1]
-        mana_sum += mana
+    for card_id, level in _team_cards(s):
+        mana_sum += mana(card_id, level)
     return mana_sum
 
+
+def _card_database(cards):
+    if isinstance(cards, CardDatabase):
+        return cards
+    return CardDatabase(cards.values())
+
+
+def team_stats(ids, levels, cards, names=("mana", )):
+    """ Returns per slot stats of many teams at once
+
+        :param ids: Card ids with one team per row, e.g. from :func:`steemmonsters.teams.team_matrix`
+        :param levels: Levels in the same shape
+        :param cards: :class:`steemmonsters.cards.CardDatabase` (a dict of card details is converted)
+        :param names: Stat names, see :data:`steemmonsters.cards.STAT_NAMES`
+
+        Returns a dict with a matrix per stat, empty slots are 0.
+    """
+    cards = _card_database(cards)
+    return dict((name, cards.stat_matrix(name, ids, levels)) for name in names)
+
+
+def mana_teams(ids, levels, cards):
+    """ Returns the mana of many teams at once, the batch version of :func:`mana_team_string`
+    """
+    mana = _card_database(cards).stat_matrix("mana", ids, levels)
+    if isinstance(mana, list):
+        return [sum(row) for row in mana]
+    return mana.sum(axis=1)
+
+
+def mana_cap_mask(ids, levels, cards, mana_cap):
+    """ Returns for many teams at once whether their mana is at most ``mana_cap``
+    """
+    mana = mana_teams(ids, levels, cards)
+    if isinstance(mana, list):
+        return [m <= mana_cap for m in mana]
+    return mana <= mana_cap
+
+
 def convert_team_id_to_string(response, cards):
     if not isinstance(response, list):
         response = [response]
@@ -85,11 +158,11 @@ def convert_team_id_to_string(response, cards):
         monsters = r["monsters"]
         monsters_list = []
         for m in monsters:
-            card_name = cards[m["id"]]["name"]
+            card_name = _card_name(cards, m["id"])
             if m["gold"]:
                 card_name += ":gold"
             monsters_list.append(card_name)
-        summoner_name = cards[summoner["id"]]["name"]
+        summoner_name = _card_name(cards, summoner["id"])
         if summoner["gold"]:
             summoner_name += ":gold"
         if decks is None:
@@ -99,18 +172,18 @@ def convert_team_id_to_string(response, cards):
 
 
 def expand_short_form(deck, cards, output_type="string"):
-    card_list = deck.split(",")
-    summoner = {"name": cards[int(card_list[0].split("-")[0])]["name"], "level": int(card_list[0].split("-")[1])}
-    summoner_id = {"id": int(card_list[0].split("-")[0]), "gold": False}
+    card_list = _team_cards(deck)
+    summoner = {"name": _card_name(cards, card_list[0][0]), "level": card_list[0][1]}
+    summoner_id = {"id": card_list[0][0], "gold": False}
     summoner_str = "%s:%d" % (summoner["name"], summoner["level"])
     monsters = []
     monsters_id = []
     monster_str = ""
-    for m in card_list[1:]:
+    for card_id, level in card_list[1:]:
         if monster_str != "":
             monster_str += ", "
-        monsters.append({"name": cards[int(m.split("-")[0])]["name"], "level": int(m.split("-")[1])})
-        monsters_id.append({"id": int(m.split("-")[0]), "gold": False})
+        monsters.append({"name": _card_name(cards, card_id), "level": level})
+        monsters_id.append({"id": card_id, "gold": False})
         monster_str += "%s:%d" % (monsters[-1]["name"], monsters[-1]["level"])
     if output_type == "dict":
         return summoner, monsters
@@ -125,20 +198,20 @@ def convert_team_string_to_id(cardstringlist, cards_by_name):
     monsters = []
     if isinstance(cardstringlist, str):
         if len(cardstringlist.split(":")) > 0:
-            summoner = {"id": cards_by_name[cardstringlist.split(":")[0]]["id"], "gold": False}
+            summoner = {"id": _card_id_by_name(cards_by_name, cardstringlist.split(":")[0]), "gold": False}
             monsters = []
             for m in cardstringlist[(len(cardstringlist.split(":")[0]) + 3):].split(","):
-                monsters.append({"id": cards_by_name[m.lstrip().split(":")[0]]["id"], "gold": False})
+                monsters.append({"id": _card_id_by_name(cards_by_name, m.lstrip().split(":")[0]), "gold": False})
         else:
-            summoner = {"id": cards_by_name[cardstringlist.split(",")[0]]["id"], "gold": False}
+            summoner = {"id": _card_id_by_name(cards_by_name, cardstringlist.split(",")[0]), "gold": False}
             monsters = []
             for m in cardstringlist[(len(cardstringlist.split(",")[0]) + 1):].split(","):
-                monsters.append({"id": cards_by_name[m.rstrip().lstrip()]["id"], "gold": False})
+                monsters.append({"id": _card_id_by_name(cards_by_name, m.rstrip().lstrip()), "gold": False})
     elif isinstance(cardstringlist, list):
-        summoner = {"id": cards_by_name[cardstringlist[0].split(":")[0]]["id"], "gold": False}
+        summoner = {"id": _card_id_by_name(cards_by_name, cardstringlist[0].split(":")[0]), "gold": False}
         monsters = []
         for m in cardstringlist[1:]:
-            monsters.append({"id": cards_by_name[m.split(":")[0]]["id"], "gold": False})
+            monsters.append({"id": _card_id_by_name(cards_by_name, m.split(":")[0]), "gold": False})
 
     return summoner, monsters
 
@@ -147,9 +220,9 @@ def get_cards_collection(response, cards):
     mycards = {}
     for r in response["cards"]:
         if r["card_detail_id"] not in mycards:
-            mycards[r["card_detail_id"]] = {"uid": r["uid"], "xp": r["xp"], "name": cards[r["card_detail_id"]]["name"],
+            mycards[r["card_detail_id"]] = {"uid": r["uid"], "xp": r["xp"], "name": _card_name(cards, r["card_detail_id"]),
                                             "edition": r["edition"], "id": r["card_detail_id"], "gold": r["gold"]}
         elif r["xp"] > mycards[r["card_detail_id"]]["xp"]:
-            mycards[r["card_detail_id"]] = {"uid": r["uid"], "xp": r["xp"], "name": cards[r["card_detail_id"]]["name"],
+            mycards[r["card_detail_id"]] = {"uid": r["uid"], "xp": r["xp"], "name": _card_name(cards, r["card_detail_id"]),
                                             "edition": r["edition"], "id": r["card_detail_id"], "gold": r["gold"]}
     return mycards
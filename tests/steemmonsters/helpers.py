@@ -0,0 +1,14 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+
+class FakeClock(object):
+    """ Clock for the ``clock`` parameters, the tests set ``now`` themselves
+    """
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import asyncio
+import json
+import unittest
+from steemmonsters.aioapi import AsyncApi, aiohttp
+from steemmonsters.api import Api
+from steemmonsters.exceptions import ApiError, PermanentApiError, RetriesExhaustedError
+from steemmonsters.replay import FixtureStore, Recorder, ReplayServer
+from steemmonsters.retry import RetryPolicy
+from steemmonsters.synthetic import SyntheticData
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.data = SyntheticData(seed=3, players=10, blocks=30)
+        self.fixtures = FixtureStore()
+        self.data.write_fixtures(self.fixtures)
+        self.battle_ids = [battle["id"] for battle in self.data.battles()]
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_api(self, server, coro_func, **kwargs):
+        """ Runs ``coro_func(api)`` with a new :class:`AsyncApi` for ``server``
+        """
+        async def run():
+            async with AsyncApi(url=server.url, rate_limiter=None, **kwargs) as api:
+                return await coro_func(api)
+        return self.loop.run_until_complete(run())
+
+    def test_fetch_not_modified(self):
+        async def run(api):
+            leaderboard = await api.players_leaderboard()
+            self.assertIs(await api.players_leaderboard(), leaderboard)
+            return api.stats.to_dict()["players/leaderboard"]["counters"]
+
+        recorder = Recorder(None)
+        with ReplayServer(self.fixtures) as server:
+            counters = self.run_api(server, run, recorder=recorder)
+            self.assertEqual(counters["not_modified"], 1)
+            self.assertEqual(server.requests, 2)
+        # the 304 answer is not recorded
+        self.assertEqual(recorder.store.get("players/leaderboard"), self.fixtures.get("players/leaderboard"))
+
+    def test_fetch_retry(self):
+        self.fixtures.add("players/details?name=flaky", 503, "Service Unavailable", content_type="text/plain")
+        self.fixtures.add("players/details?name=flaky", 200, json.dumps({"name": "flaky"}))
+        self.fixtures.add("players/details?name=down", 503, "Service Unavailable", content_type="text/plain")
+        policy = RetryPolicy(max_attempts=3, backoff_factor=0.01, jitter=0, retry_after_max=0.01)
+
+        async def run(api):
+            self.assertEqual(await api.get_player_details("flaky"), {"name": "flaky"})
+            with self.assertRaises(RetriesExhaustedError):
+                await api.get_player_details("down")
+            with self.assertRaises(PermanentApiError):
+                await api.get_player_details("unknown")
+
+        with ReplayServer(self.fixtures) as server:
+            self.run_api(server, run, retry_policy=policy)
+            self.assertEqual(server.requests, 2 + 3 + 1)
+
+    def test_iter_json(self):
+        player = self.data.players[0]
+        path = "cards/collection/%s" % player
+        cards = json.loads(self.fixtures.get(path)[0]["body"])["cards"]
+        # a retry before the first element is invisible to the caller
+        flaky = FixtureStore()
+        flaky.add(path, 503, "Service Unavailable", content_type="text/plain")
+        flaky.add(path, 200, self.fixtures.get(path)[0]["body"])
+        block = self.data.start_block
+        policy = RetryPolicy(max_attempts=3, backoff_factor=0.01, jitter=0, retry_after_max=0.01)
+
+        async def run(api):
+            return [card async for card in api.iter_collection(player)]
+
+        with ReplayServer(flaky) as server:
+            self.assertEqual(self.run_api(server, run, retry_policy=policy), cards)
+            self.assertEqual(server.requests, 2)
+
+        async def run_history(api):
+            return [record async for record in api.iter_from_block(block)]
+
+        with ReplayServer(self.fixtures) as server:
+            records = self.run_api(server, run_history)
+        history = json.loads(self.fixtures.get("transactions/history?from_block=%d" % block)[0]["body"])
+        self.assertEqual(records, history)
+
+    def test_iter_battle_results(self):
+        ids = self.battle_ids + self.battle_ids[:5] + ["unknown"]
+
+        async def run(api):
+            results = dict([item async for item in api.iter_battle_results(ids, max_workers=4)])
+            requests = server.requests
+            # finished battles are not requested again
+            again = dict([item async for item in api.iter_battle_results(self.battle_ids)])
+            self.assertEqual(server.requests, requests)
+            self.assertEqual(again, dict((battle_id, results[battle_id]) for battle_id in self.battle_ids))
+            return results
+
+        with ReplayServer(self.fixtures) as server:
+            results = self.run_api(server, run)
+            self.assertEqual(server.requests, len(self.battle_ids) + 1)
+        self.assertIsInstance(results.pop("unknown"), ApiError)
+        for battle in self.data.battles():
+            self.assertEqual(results[battle["id"]]["winner"], battle["winner"])
+
+    def test_iter_history(self):
+        start_block = self.data.start_block + 3
+        stop_block = self.data.start_block + self.data.blocks - 5
+
+        async def run(api):
+            records = api.iter_history(start_block, stop_block, shard_blocks=4, max_workers=2)
+            return [record async for record in records]
+
+        with ReplayServer(self.fixtures) as server:
+            records = self.run_api(server, run)
+            api = Api(url=server.url, rate_limiter=None)
+            expected = list(api.iter_history(start_block, stop_block, shard_blocks=4, max_workers=2))
+            api.close()
+        self.assertEqual(records, expected)
+        self.assertEqual(sorted(set(r["block_num"] for r in records)), list(range(start_block, stop_block + 1)))
+
+    def test_find_cards(self):
+        cards = json.loads(self.fixtures.get("cards/collection/%s" % self.data.players[0])[0]["body"])["cards"][:7]
+        uids = [card["uid"] for card in cards]
+        # every uid once, in the order of the first occurrence
+        expected = list(reversed(uids[:3])) + uids[3:]
+        by_uid = dict((card["uid"], card) for card in cards)
+        for i in range(0, len(expected), 3):
+            chunk = expected[i:i + 3]
+            # the api answers in its own order
+            self.fixtures.add("cards/find?ids=%s" % ",".join(chunk), 200,
+                              json.dumps([by_uid[uid] for uid in sorted(chunk)]))
+
+        async def run(api):
+            return await api.find_cards(list(reversed(uids[:3])) + uids + uids[:2], chunk_size=3)
+
+        with ReplayServer(self.fixtures) as server:
+            found = self.run_api(server, run)
+            self.assertEqual(server.requests, 3)
+        self.assertEqual([card["uid"] for card in found], expected)
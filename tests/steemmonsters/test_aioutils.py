@@ -0,0 +1,33 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import asyncio
+import unittest
+from steemmonsters.aioutils import AsyncSingleFlight
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_single_flight(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return [1, 2]
+
+        async def run():
+            return await asyncio.gather(*[flight.do("players/leaderboard", fetch) for i in range(10)])
+        results = self.loop.run_until_complete(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 9)
+        self.assertEqual(results, [[1, 2]] * 10)
+        self.loop.run_until_complete(flight.do("players/leaderboard", fetch))
+        self.assertEqual(len(calls), 2)
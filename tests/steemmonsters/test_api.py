@@ -0,0 +1,248 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from timeit import default_timer as timer
+import requests
+from steemmonsters.api import Api
+from steemmonsters.cache import CachePolicy, ResponseCache
+from steemmonsters.exceptions import PermanentApiError, RetriesExhaustedError
+from steemmonsters.ratelimit import RateLimiter
+from steemmonsters.replay import FixtureStore, ReplayServer
+from steemmonsters.retry import RetryPolicy
+from steemmonsters.synthetic import SyntheticData
+from .helpers import FakeClock
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.data = SyntheticData(seed=3, players=10, blocks=30)
+        self.fixtures = FixtureStore()
+        self.data.write_fixtures(self.fixtures)
+        self.battle_ids = [battle["id"] for battle in self.data.battles()]
+
+    def test_iter_battle_results(self):
+        self.fixtures.add("battle/result?id=running", 200, json.dumps({"error": "Battle not found"}))
+        ids = self.battle_ids + self.battle_ids[:5] + ["running"]
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            results = dict(api.iter_battle_results(ids, max_workers=4))
+            self.assertEqual(len(results), len(self.battle_ids) + 1)
+            self.assertEqual(server.requests, len(self.battle_ids) + 1)
+            for battle in self.data.battles():
+                self.assertEqual(results[battle["id"]]["winner"], battle["winner"])
+
+            # finished battles are not requested again, running ones are
+            results = dict(api.iter_battle_results(ids))
+            self.assertEqual(server.requests, len(self.battle_ids) + 2)
+            self.assertIn("error", results["running"])
+            self.assertEqual(api.get_battle_result(self.battle_ids[0])["id"], self.battle_ids[0])
+            self.assertEqual(server.requests, len(self.battle_ids) + 2)
+            api.close()
+
+    def test_fetch_retry(self):
+        # the replay server answers 503 with "Retry-After: 1"
+        self.fixtures.add("players/details?name=flaky", 503, "Service Unavailable", content_type="text/plain")
+        self.fixtures.add("players/details?name=flaky", 200, json.dumps({"name": "flaky"}))
+        self.fixtures.add("players/details?name=down", 503, "Service Unavailable", content_type="text/plain")
+        policy = RetryPolicy(max_attempts=4, backoff_factor=0.01, jitter=0, retry_after_max=0.3)
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None, retry_policy=policy)
+            start = timer()
+            self.assertEqual(api.get_player_details("flaky"), {"name": "flaky"})
+            # the delay follows Retry-After, up to retry_after_max
+            self.assertGreaterEqual(timer() - start, 0.3)
+            self.assertEqual(server.requests, 2)
+            self.assertEqual(api.stats.to_dict()["players/details"]["retries"]["sum"], 1)
+
+            with self.assertRaises(PermanentApiError) as cm:
+                api.get_player_details("unknown")
+            self.assertEqual(cm.exception.status_code, 404)
+            self.assertEqual(cm.exception.attempts, 1)
+            self.assertEqual(server.requests, 3)
+
+            api.retry_policy = RetryPolicy(max_attempts=4, backoff_factor=0.01, jitter=0, respect_retry_after=False)
+            start = timer()
+            with self.assertRaises(RetriesExhaustedError) as cm:
+                api.get_player_details("down")
+            self.assertLess(timer() - start, 0.3)
+            self.assertEqual(cm.exception.attempts, 4)
+            self.assertEqual(cm.exception.status_code, 503)
+            self.assertEqual(server.requests, 3 + 4)
+            api.close()
+
+    def test_request_connection_error(self):
+        # a port on which nobody listens
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        api = Api(url="http://127.0.0.1:%d/" % port, rate_limiter=None)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            api.request("battle/status?id=abc")
+        stats = api.stats.to_dict()["battle/status"]
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["status_codes"], {"None": 1})
+        self.assertTrue(stats["last_error"].startswith("ConnectionError"))
+        api.close()
+
+    def test_bulk_rate_group(self):
+        # the polling budget of the battle endpoints allows one request, bulk reads have their own
+        limiter = RateLimiter(rate=1000, burst=1000, groups={"battle": (0.01, 1), "battle/bulk": (1000, 1000)})
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=limiter)
+            self.assertEqual(len(dict(api.iter_battle_results(self.battle_ids[:10], max_workers=4))), 10)
+            self.assertEqual(len(dict(api.iter_battle_statuses(self.battle_ids[:10], max_workers=4))), 10)
+            self.assertEqual(limiter.get_stats()["delayed"], 0)
+            api.get_battle_status(self.battle_ids[0])
+            self.assertGreater(limiter.reserve("battle/status"), 1)
+            api.close()
+
+    def test_iter_battle_statuses(self):
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            statuses = dict(api.iter_battle_statuses(self.battle_ids[:10], max_workers=3))
+            self.assertEqual(sorted(statuses), sorted(self.battle_ids[:10]))
+            self.assertEqual(statuses[self.battle_ids[0]]["status"], 2)
+            api.close()
+
+    def test_conditional(self):
+        path = tempfile.mkdtemp()
+        try:
+            with ReplayServer(self.fixtures) as server:
+                api = Api(url=server.url, rate_limiter=None, cache_dir=path,
+                          cache_policies={"cards/get_details": CachePolicy(ttl=0)})
+                leaderboard = api.players_leaderboard()
+                self.assertIs(api.players_leaderboard(), leaderboard)
+                self.assertEqual(api.stats.to_dict()["players/leaderboard"]["counters"]["not_modified"], 1)
+                # the polled answer is only kept in memory
+                self.assertEqual(os.listdir(path), ["final"])
+                cards = api.get_card_details()
+                self.assertEqual(len(os.listdir(path)), 3)
+                api.close()
+                # the validators of cached answers survive a restart
+                api = Api(url=server.url, rate_limiter=None, cache_dir=path,
+                          cache_policies={"cards/get_details": CachePolicy(ttl=0)})
+                self.assertEqual(api.get_card_details(), cards)
+                self.assertEqual(api.stats.to_dict()["cards/get_details"]["counters"]["not_modified"], 1)
+                api.close()
+        finally:
+            shutil.rmtree(path)
+
+    def test_stale_while_revalidate(self):
+        fixtures = FixtureStore()
+        fixtures.add("settings", 200, json.dumps({"version": 1}))
+        fixtures.add("settings", 200, json.dumps({"version": 2}))
+        clock = FakeClock()
+        clock.now = 1000.
+        with ReplayServer(fixtures, latency=0.1) as server:
+            api = Api(url=server.url, rate_limiter=None,
+                      cache_policies={"settings": CachePolicy(ttl=60, stale_ttl=600)})
+            api.cache = ResponseCache(clock=clock)
+            self.assertEqual(api.settings(), {"version": 1})
+            clock.now = 1030.
+            self.assertEqual(api.settings(), {"version": 1})
+            self.assertEqual(server.requests, 1)
+            # stale answers are returned at once while one request refreshes them
+            clock.now = 1100.
+            for i in range(5):
+                self.assertEqual(api.settings(), {"version": 1})
+            for i in range(50):
+                if api.cache.get("settings")[0] == {"version": 2}:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(api.cache.get("settings"), ({"version": 2}, 1100.))
+            self.assertEqual(api.settings(), {"version": 2})
+            self.assertEqual(server.requests, 2)
+            counters = api.stats.to_dict()["settings"]["counters"]
+            self.assertEqual(counters["cache_stale"], 5)
+            self.assertEqual(counters["cache_fresh"], 2)
+            api.close()
+
+    def test_find_cards(self):
+        cards = json.loads(self.fixtures.get("cards/collection/%s" % self.data.players[0])[0]["body"])["cards"][:10]
+        uids = [card["uid"] for card in cards]
+        by_uid = dict((card["uid"], card) for card in cards)
+        # duplicates are requested once, at the position of their first occurrence
+        card_ids = uids[5:] + uids[2:7] + uids[:5] + [uids[0]]
+        expected = uids[5:] + uids[2:5] + uids[:2]
+        for i in range(0, len(expected), 4):
+            chunk = expected[i:i + 4]
+            # the api answers in its own order and leaves out unknown uids
+            self.fixtures.add("cards/find?ids=%s" % ",".join(chunk), 200,
+                              json.dumps([by_uid[uid] for uid in sorted(chunk) if uid != uids[3]]))
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            found = api.find_cards(card_ids, chunk_size=4, max_workers=2)
+            self.assertEqual(server.requests, 3)
+            self.assertEqual([card["uid"] for card in found], [uid for uid in expected if uid != uids[3]])
+            self.assertEqual(found[0], by_uid[uids[5]])
+            # a comma separated string is split
+            self.assertEqual(api.find_cards(",".join(uids[5:9]), chunk_size=4), found[:4])
+            api.close()
+
+    def test_iter_failed_id(self):
+        # the replay server answers unknown ids with 404
+        ids = self.battle_ids[:5] + ["unknown"] + self.battle_ids[5:10]
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            results = dict(api.iter_battle_results(ids, max_workers=2))
+            self.assertEqual(sorted(results), sorted(ids))
+            self.assertIsInstance(results["unknown"], PermanentApiError)
+            for battle_id in self.battle_ids[:10]:
+                self.assertEqual(results[battle_id]["id"], battle_id)
+            statuses = dict(api.iter_battle_statuses(ids, max_workers=2))
+            self.assertIsInstance(statuses["unknown"], PermanentApiError)
+            self.assertEqual(statuses[self.battle_ids[9]]["status"], 2)
+            api.close()
+
+    def test_iter_history(self):
+        # answers hold at most 6 transactions, so that their last block is often incomplete
+        fixtures = FixtureStore()
+        history = self.data.history
+        for block in range(self.data.start_block, self.data.start_block + self.data.blocks):
+            records = [h for h in history if h["block_num"] >= block][:6]
+            fixtures.add("transactions/history?from_block=%d" % block, 200, json.dumps(records))
+        start_block = self.data.start_block + 3
+        stop_block = self.data.start_block + 25
+        expected = [h["id"] for h in history if start_block <= h["block_num"] <= stop_block]
+        with ReplayServer(fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            for shard_blocks, max_workers in [(1, 8), (4, 3), (100, 1)]:
+                records = list(api.iter_history(start_block, stop_block, shard_blocks=shard_blocks,
+                                                max_workers=max_workers))
+                self.assertEqual([r["id"] for r in records], expected)
+            api.close()
+
+    def test_iter_json(self):
+        player = self.data.players[0]
+        collection = json.loads(self.fixtures.get("cards/collection/%s" % player)[0]["body"])
+        for_sale = [{"uid": card["uid"], "card_detail_id": card["card_detail_id"], "seller": player,
+                     "buy_price": "%.3f" % (1 + n / 10.), "market_id": "trx-%d" % n}
+                    for n, card in enumerate(collection["cards"])]
+        grouped = [{"card_detail_id": card["id"], "gold": False, "edition": card["editions"],
+                    "qty": n + 1, "low_price": 0.5 * (n + 1)} for n, card in enumerate(self.data.cards)]
+        self.fixtures.add("market/for_sale", 200, json.dumps(for_sale))
+        self.fixtures.add("market/for_sale_grouped", 200, json.dumps(grouped))
+        block = self.data.start_block
+        history = json.loads(self.fixtures.get("transactions/history?from_block=%d" % block)[0]["body"])
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            self.assertEqual(list(api.iter_for_sale()), for_sale)
+            self.assertEqual(list(api.iter_market_for_sale_grouped()), grouped)
+            self.assertEqual(list(api.iter_collection(player)), collection["cards"])
+            self.assertEqual(list(api.iter_from_block(block)), history)
+            # elements which are split between chunks
+            self.assertEqual(list(api._iter_json("cards/collection/%s" % player, key="cards",
+                                                 endpoint="cards/collection", chunk_size=7)), collection["cards"])
+            stats = api.stats.to_dict()
+            self.assertEqual(stats["market/for_sale"]["bytes_received"]["sum"], len(json.dumps(for_sale)))
+            api.close()
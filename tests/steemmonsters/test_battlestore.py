@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from steemmonsters.api import Api
+from steemmonsters.battlestore import BattleStore
+from steemmonsters.cards import CardDatabase
+from steemmonsters.constants import xp_level, max_level_rarity
+from steemmonsters.replay import FixtureStore, ReplayServer
+from steemmonsters.synthetic import SyntheticData
+from steemmonsters.teams import team_key_from_details, team_key_to_string
+from steemmonsters.utils import get_summoner_level
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.data = SyntheticData(seed=4, players=6, blocks=40)
+        self.fixtures = FixtureStore()
+        self.data.write_fixtures(self.fixtures)
+        self.cards = CardDatabase(self.data.cards)
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_sync(self):
+        file_name = os.path.join(self.path, "battles.sqlite")
+        first_block = self.data.start_block
+        last_block = first_block + self.data.blocks - 1
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            with BattleStore(file_name, self.cards, commit_blocks=5) as store:
+                self.assertIsNone(store.high_water_mark)
+                self.assertEqual(store.sync(api, last_block - 15, window=25, shard_blocks=4), 25)
+                self.assertEqual(store.high_water_mark, last_block - 15)
+            requests = server.requests
+            with BattleStore(file_name, self.cards) as store:
+                # only the new blocks are read
+                self.assertEqual(store.sync(api, last_block, window=25, shard_blocks=4), 15)
+                self.assertLess(server.requests - requests, 20)
+                self.assertEqual(store.sync(api, last_block), 0)
+                self.assertEqual(len(store), self.data.blocks)
+                self.assertEqual(store.high_water_mark, last_block)
+                battle = list(self.data.battles())[-1]
+                last = store.battles(battle["player_1"], limit=1)[0]
+                self.assertEqual(last["id"], battle["id"])
+                self.assertEqual(last["winner"], battle["winner"])
+                self.assertEqual(last["player_1_rating"], battle["player_1_rating_initial"])
+                self.assertEqual(last["opponent"], battle["player_2"])
+                details = json.loads(battle["details"])
+                self.assertEqual(last["team"], team_key_to_string(team_key_from_details(details["team1"])))
+                self.assertEqual(last["opponent_team"], team_key_to_string(team_key_from_details(details["team2"])))
+            api.close()
+
+    def test_sync_lagging_history(self):
+        first_block = self.data.start_block
+        last_block = first_block + self.data.blocks - 1
+        indexed_block = last_block - 10
+        # the api has not indexed the last blocks yet and returns no transactions for them
+        lagging = FixtureStore()
+        for path, answer in self.data.answers():
+            if path.startswith("transactions/history"):
+                answer = [record for record in answer if record["block_num"] <= indexed_block]
+            lagging.add(path, 200, json.dumps(answer))
+        with BattleStore(cards=self.cards) as store:
+            with ReplayServer(lagging) as server:
+                api = Api(url=server.url, rate_limiter=None)
+                self.assertEqual(store.sync(api, last_block, window=self.data.blocks, shard_blocks=4),
+                                 self.data.blocks - 10)
+                self.assertEqual(store.high_water_mark, indexed_block)
+                api.close()
+            with ReplayServer(self.fixtures) as server:
+                api = Api(url=server.url, rate_limiter=None)
+                self.assertEqual(store.sync(api, last_block, window=self.data.blocks, shard_blocks=4), 10)
+                self.assertEqual(store.high_water_mark, last_block)
+                api.close()
+            self.assertEqual(len(store), self.data.blocks)
+
+    def test_team_scores(self):
+        store = BattleStore(cards=self.cards)
+        for record in self.data.history:
+            store.add_transaction(record)
+        self.assertEqual(len(store), self.data.blocks)
+        expected = {}
+        last_teams = {}
+        for battle in self.data.battles():
+            details = json.loads(battle["details"])
+            levels = [get_summoner_level(details[t]["summoner"], self.cards, xp_level, max_level_rarity)
+                      for t in ["team1", "team2"]]
+            for team in [details["team1"], details["team2"]]:
+                last_teams[team["player"]] = team_key_to_string(team_key_from_details(team))
+                if levels != [4, 4] or self.cards.color(team["summoner"]["card_detail_id"]) != "Red":
+                    continue
+                deck = team_key_to_string(team_key_from_details(team))
+                score = expected.setdefault(deck, {"n": 0, "win": 0, "loose": 0})
+                score["n"] += 1
+                if details["winner"] == team["player"]:
+                    score["win"] += 1
+                else:
+                    score["loose"] += 1
+        scores = store.team_scores("red", 4, self.data.mana_cap)
+        self.assertEqual(dict((s["deck"], {"n": s["n"], "win": s["win"], "loose": s["loose"]}) for s in scores),
+                         expected)
+        for s in scores:
+            self.assertEqual(team_key_to_string(s["key"]), s["deck"])
+        ratios = [s["win"] / s["n"] for s in scores]
+        self.assertEqual(ratios, sorted(ratios, reverse=True))
+        self.assertEqual(store.team_scores("red", 4, self.data.mana_cap + 1), [])
+        for player in last_teams:
+            self.assertEqual(store.last_team(player), last_teams[player])
+            self.assertEqual(store.last_team(player, mana_cap=self.data.mana_cap), last_teams[player])
+        self.assertIsNone(store.last_team("unknown"))
+        store.close()
@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+from steemmonsters.cache import (
+    CachePolicy,
+    ImmutableCache,
+    ResponseCache,
+    FRESH,
+    STALE,
+    EXPIRED,
+)
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_policy_state(self):
+        policy = CachePolicy(ttl=10, stale_ttl=20)
+        self.assertEqual(policy.state(5), FRESH)
+        self.assertEqual(policy.state(15), STALE)
+        self.assertEqual(policy.state(30), EXPIRED)
+        self.assertEqual(CachePolicy(ttl=10).state(15), EXPIRED)
+
+    def test_memory_cache(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.get("settings"), None)
+        cache.set("settings", {"a": 1}, stored_at=100)
+        self.assertEqual(cache.get("settings"), ({"a": 1}, 100))
+        cache.clear()
+        self.assertEqual(cache.get("settings"), None)
+
+    def test_disk_cache(self):
+        cache = ResponseCache(self.path)
+        cache.set("cards/get_details", [{"id": 1}], stored_at=100)
+        cache = ResponseCache(self.path)
+        self.assertEqual(cache.get("cards/get_details"), ([{"id": 1}], 100))
+        self.assertEqual(cache.get("settings"), None)
+        cache.clear()
+        self.assertEqual(ResponseCache(self.path).get("cards/get_details"), None)
+
+    def test_immutable_cache(self):
+        result = {"id": "abc", "winner": "player001", "details": "{\"team1\": {}}"}
+        cache = ImmutableCache(self.path, memory_items=2)
+        self.assertIsNone(cache.get("battle/result?id=abc"))
+        cache.set("battle/result?id=abc", result)
+        self.assertTrue("battle/result?id=abc" in cache)
+        self.assertEqual(cache.get("battle/result?id=abc"), result)
+        self.assertEqual(cache.hits_memory, 1)
+
+        cache = ImmutableCache(self.path)
+        self.assertEqual(cache.get("battle/result?id=abc"), result)
+        self.assertEqual(cache.get("battle/result?id=abc"), result)
+        stats = cache.get_stats()
+        self.assertEqual(stats["hits_disk"], 1)
+        self.assertEqual(stats["hits_memory"], 1)
+        self.assertEqual(stats["disk_items"], 1)
+        cache.clear()
+        self.assertIsNone(ImmutableCache(self.path).get("battle/result?id=abc"))
+
+    def test_immutable_cache_eviction(self):
+        entry_size = len(ImmutableCache.encode("battle/result?id=0", {"id": 0, "winner": "player000"}))
+        cache = ImmutableCache(self.path, memory_items=1, max_size=3 * entry_size + 2)
+        for i in range(3):
+            cache.set("battle/result?id=%d" % i, {"id": i, "winner": "player%03d" % i})
+        # reading entry 0 makes entry 1 the least recently used one
+        self.assertEqual(cache.get("battle/result?id=0")["id"], 0)
+        cache.set("battle/result?id=3", {"id": 3, "winner": "player003"})
+        self.assertEqual(cache.evictions, 1)
+        self.assertFalse("battle/result?id=1" in cache)
+        self.assertEqual(cache.get("battle/result?id=0")["id"], 0)
+        self.assertEqual(cache.get("battle/result?id=2")["id"], 2)
+        self.assertTrue(cache.get_stats()["disk_size"] <= 3 * entry_size + 2)
+
+    def test_immutable_cache_eviction_after_restart(self):
+        entry_size = len(ImmutableCache.encode("battle/result?id=0", {"id": 0, "winner": "player000"}))
+        cache = ImmutableCache(self.path, max_size=3 * entry_size + 2)
+        for i in range(3):
+            key = "battle/result?id=%d" % i
+            cache.set(key, {"id": i, "winner": "player%03d" % i})
+            os.utime(os.path.join(self.path, cache._file_name(key)), (1000 + i, 1000 + i))
+        # a disk read after a restart marks entry 0 as used
+        self.assertEqual(ImmutableCache(self.path).get("battle/result?id=0")["id"], 0)
+        cache = ImmutableCache(self.path, max_size=3 * entry_size + 2)
+        cache.set("battle/result?id=3", {"id": 3, "winner": "player003"})
+        self.assertEqual(cache.evictions, 1)
+        self.assertFalse("battle/result?id=1" in cache)
+        self.assertTrue("battle/result?id=0" in cache)
@@ -0,0 +1,150 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+from steemmonsters.api import Api
+from steemmonsters.cards import CardDatabase, CardStore, card_details_version
+from steemmonsters.constants import xp_level, max_level_rarity
+from steemmonsters.replay import FixtureStore, ReplayServer
+from steemmonsters.synthetic import SyntheticData
+from steemmonsters.utils import (
+    convert_team_string_to_id,
+    get_summoner_level,
+    mana_team_id,
+    mana_team_string,
+)
+
+card_details = [
+    {"id": 1, "name": "Goblin Shaman", "color": "Red", "type": "Monster", "rarity": 1, "editions": "0,1",
+     "stats": {"mana": [2, 2, 3], "attack": [0, 0, 0], "ranged": [0, 0, 0], "magic": [0, 0, 1],
+               "armor": [0, 0, 0], "health": [3, 4, 4], "speed": [2, 2, 3], "abilities": [[], [], []]}},
+    {"id": 2, "name": "Malric Inferno", "color": "Red", "type": "Summoner", "rarity": 1, "editions": "1",
+     "stats": {"mana": 4, "attack": 1, "ranged": 0, "magic": 0, "armor": 0, "health": 0, "speed": 0,
+               "abilities": []}},
+    {"id": 3, "name": "Crustacean King", "color": "Blue", "type": "Monster", "rarity": 4, "editions": "2",
+     "stats": {"mana": [5], "attack": [0], "ranged": [0], "magic": [0], "armor": [2], "health": [7],
+               "speed": [1], "abilities": [["Heal"]]}},
+]
+
+
+class Testcases(unittest.TestCase):
+    def test_columns(self):
+        cards = CardDatabase(card_details)
+        self.assertEqual(len(cards), 3)
+        self.assertEqual(list(cards), [1, 2, 3])
+        self.assertTrue(2 in cards)
+        self.assertFalse(4 in cards)
+        self.assertEqual(cards[3]["name"], "Crustacean King")
+        self.assertIsNone(cards.get(4))
+        self.assertEqual(cards.max_level, 3)
+        self.assertEqual(cards.id_of("Malric Inferno"), 2)
+        self.assertEqual(cards.by_name("Goblin Shaman")["id"], 1)
+        self.assertEqual(cards.name(3), "Crustacean King")
+        self.assertEqual(cards.color(3), "Blue")
+        self.assertEqual(cards.rarity(3), 4)
+        self.assertEqual(cards.editions(1), [0, 1])
+        self.assertEqual(cards.editions(3), [2])
+        self.assertTrue(cards.is_summoner(2))
+        self.assertEqual(cards.ids_by_color("red"), [1, 2])
+        self.assertEqual(cards.stat("mana", 1, 3), 3)
+        self.assertEqual(cards.stat("health", 1, 2), 4)
+        # summoner stats and levels above the last one
+        self.assertEqual(cards.stat("mana", 2, 3), 4)
+        self.assertEqual(cards.stat("health", 3, 3), 7)
+        self.assertEqual(cards.stat_levels("speed", 1), [2, 2, 3])
+        self.assertEqual(cards.stat_levels("speed", 3), [1])
+        self.assertRaises(KeyError, cards.id_of, "Unknown")
+
+    def test_utils(self):
+        data = SyntheticData(seed=5, players=2, blocks=5)
+        cards = CardDatabase(data.cards)
+        card_dict = dict((c["id"], c) for c in data.cards)
+        cards_by_name = dict((c["name"], c) for c in data.cards)
+        team = {"summoner": {"id": 1}, "monsters": [{"id": 3}, {"id": 4}]}
+        self.assertEqual(mana_team_id(team, cards), mana_team_id(team, card_dict))
+        self.assertEqual(mana_team_string("1-1,3-2,4-9", cards), mana_team_string("1-1,3-2,4-9", card_dict))
+        names = [data.cards[0]["name"], data.cards[2]["name"], data.cards[3]["name"]]
+        self.assertEqual(convert_team_string_to_id(names, cards), convert_team_string_to_id(names, cards_by_name))
+        for card in data.collections[data.players[0]]:
+            if data.cards[card["card_detail_id"] - 1]["type"] != "Summoner":
+                continue
+            self.assertEqual(get_summoner_level(card, cards, xp_level, max_level_rarity),
+                             get_summoner_level(card, card_dict, xp_level, max_level_rarity))
+
+    def test_snapshot(self):
+        path = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(path, "snapshot", "cards.snapshot")
+            CardDatabase(card_details).save(file_name)
+            cards = CardDatabase.open(file_name)
+            self.assertEqual(cards.version, card_details_version(card_details))
+            self.assertEqual(list(cards), [1, 2, 3])
+            self.assertEqual(cards.name(3), "Crustacean King")
+            self.assertEqual(cards.id_of("Malric Inferno"), 2)
+            self.assertEqual(cards.ids_by_color("red"), [1, 2])
+            self.assertEqual(cards.editions(1), [0, 1])
+            self.assertEqual(cards.stat("mana", 1, 3), 3)
+            self.assertEqual(cards.stat_levels("health", 1), [3, 4, 4])
+            # the card details are decoded on first access
+            self.assertIsNone(cards._details)
+            self.assertEqual(cards[3], card_details[2])
+            cards.save(file_name)
+            self.assertEqual(CardDatabase.open(file_name).details, card_details)
+            with open(file_name, "r+b") as f:
+                f.write(b"XXXX")
+            self.assertRaises(ValueError, CardDatabase.open, file_name)
+        finally:
+            shutil.rmtree(path)
+
+    def test_store(self):
+        path = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(path, "cards.snapshot")
+            calls = []
+
+            def fetch(version):
+                calls.append(version)
+                return card_details[:min(len(calls) + 1, 3)], None
+            store = CardStore(file_name, fetch)
+            self.assertFalse(store.load())
+            self.assertEqual(len(store.cards), 2)
+            store = CardStore(file_name, fetch)
+            self.assertTrue(store.load())
+            self.assertEqual(calls, [None])
+            self.assertTrue(store.start_refresh().get())
+            self.assertEqual(calls[1], card_details_version(card_details[:2]))
+            self.assertEqual(len(store.cards), 3)
+            self.assertEqual(len(CardDatabase.open(file_name)), 3)
+            self.assertFalse(store.refresh())
+        finally:
+            shutil.rmtree(path)
+
+    def test_store_not_modified(self):
+        data = SyntheticData(seed=1, players=2, blocks=2)
+        fixtures = FixtureStore()
+        data.write_fixtures(fixtures)
+        path = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(path, "cards.snapshot")
+            with ReplayServer(fixtures) as server:
+                api = Api(url=server.url, rate_limiter=None, cache_dir=os.path.join(path, "cache"))
+                store = CardStore(file_name, api.get_card_details_since)
+                self.assertFalse(store.load())
+                self.assertEqual(len(store.cards), len(data.cards))
+                api.close()
+                # after a restart, the snapshot is only revalidated
+                api = Api(url=server.url, rate_limiter=None, cache_dir=os.path.join(path, "cache"))
+                store = CardStore(file_name, api.get_card_details_since)
+                self.assertTrue(store.load())
+                self.assertFalse(store.refresh())
+                self.assertEqual(api.stats.to_dict()["cards/get_details"]["counters"]["not_modified"], 1)
+                self.assertEqual(server.requests, 2)
+                api.close()
+            # the card details are not stored a second time in the response cache
+            self.assertEqual(os.listdir(os.path.join(path, "cache")), ["final"])
+        finally:
+            shutil.rmtree(path)
@@ -0,0 +1,84 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+from steemmonsters.api import Api
+from steemmonsters.circuitbreaker import (
+    CircuitBreaker,
+    CircuitBreakers,
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+)
+from steemmonsters.exceptions import CircuitOpenError
+from steemmonsters.replay import FixtureStore, ReplayServer
+from steemmonsters.retry import RetryPolicy
+from .helpers import FakeClock
+
+
+class Testcases(unittest.TestCase):
+    def test_breaker(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10, clock=clock)
+        breaker.failure()
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        breaker.failure()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        clock.now = 4
+        self.assertEqual(breaker.retry_in(), 6)
+
+        # only one probe while half-open, its failure opens the circuit again
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.opened, 2)
+        self.assertFalse(breaker.allow())
+
+        clock.now = 20
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.rejected, 3)
+
+    def test_lost_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5, clock=clock)
+        breaker.failure()
+        clock.now = 5
+        self.assertTrue(breaker.allow())
+        clock.now = 9
+        self.assertFalse(breaker.allow())
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+
+    def test_breakers(self):
+        breakers = CircuitBreakers(failure_threshold=5, endpoints={"battle/result": (2, 1.)})
+        self.assertIs(breakers.get("battle/result"), breakers.get("battle/result"))
+        self.assertEqual(breakers.get("battle/result").failure_threshold, 2)
+        self.assertEqual(breakers.get("settings").failure_threshold, 5)
+        self.assertEqual(breakers.get_stats()["settings"]["state"], CLOSED)
+
+    def test_api_fails_fast(self):
+        with ReplayServer(FixtureStore(), error_rate=1.) as server:
+            api = Api(url=server.url, rate_limiter=None, circuit_breakers=CircuitBreakers(3, 60.),
+                      retry_policy=RetryPolicy(max_attempts=10, backoff_factor=0.001, respect_retry_after=False))
+            with self.assertRaises(CircuitOpenError) as cm:
+                api.settings()
+            self.assertEqual(cm.exception.attempts, 3)
+            self.assertRaises(CircuitOpenError, api.request, "settings")
+            self.assertEqual(server.requests, 3)
+            stats = api.get_stats()
+            self.assertEqual(stats["circuit_breakers"]["settings"]["state"], OPEN)
+            self.assertEqual(stats["endpoints"]["settings"]["errors"], 2)
+            api.close()
@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import unittest
+from steemmonsters.cards import CardDatabase
+from steemmonsters.collection import CollectionIndex
+from steemmonsters.synthetic import SyntheticData
+from steemmonsters.utils import get_cards_collection
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.data = SyntheticData(seed=3, players=2, blocks=5)
+        self.player = self.data.players[0]
+        self.collection = self.data.collections[self.player]
+        self.cards = CardDatabase(self.data.cards)
+
+    def test_load(self):
+        index = CollectionIndex(self.player, self.cards)
+        index.load(self.collection)
+        expected = get_cards_collection({"cards": self.collection}, self.cards)
+        self.assertEqual(sorted(index), sorted(expected))
+        for card_id in expected:
+            self.assertEqual(index[card_id]["uid"], expected[card_id]["uid"])
+        self.assertEqual(len(index.copies), len(self.collection))
+        for card in self.collection:
+            copy = index.copies[card["uid"]]
+            self.assertEqual(copy["level"], card["level"])
+            self.assertIn(copy, index.by_level(card["level"]))
+            self.assertIn(copy, index.by_mana(self.cards.stat("mana", card["card_detail_id"], card["level"])))
+            self.assertIn(copy, index.by_color(self.cards.color(card["card_detail_id"]).upper()))
+            self.assertIn(copy, index.by_rarity(self.cards.rarity(card["card_detail_id"])))
+        # copies which are on the market are not playable
+        card = dict(self.collection[0], market_id="M-1")
+        index.load([card])
+        self.assertFalse(card["card_detail_id"] in index)
+        self.assertEqual(len(index.copies_of(card["card_detail_id"])), 1)
+
+    def test_operations(self):
+        by_card = {}
+        for card in self.collection:
+            by_card.setdefault(card["card_detail_id"], []).append(card)
+        card_id, copies = [(k, v) for k, v in by_card.items() if len(v) == 2][0]
+        copies = sorted(copies, key=lambda c: -c["xp"])
+        other = self.data.players[1]
+        found = {}
+        index = CollectionIndex(self.player, self.cards, find_cards=lambda uids: [found[u] for u in uids if u in found])
+        index.load(self.collection)
+        self.assertEqual(index[card_id]["uid"], copies[0]["uid"])
+
+        def op(op_id, sender, **data):
+            return {"id": op_id, "json": json.dumps(data), "required_posting_auths": [sender]}
+        self.assertFalse(index.apply_operation(op("sm_find_match", self.player)))
+        self.assertTrue(index.apply_operation(op("sm_delegate_cards", self.player, to=other, cards=[copies[0]["uid"]])))
+        self.assertEqual(index[card_id]["uid"], copies[1]["uid"])
+        self.assertTrue(index.apply_operation(op("sm_undelegate_cards", self.player, cards=[copies[0]["uid"]])))
+        self.assertEqual(index[card_id]["uid"], copies[0]["uid"])
+        # a gift to another player removes the copy, other players are ignored
+        self.assertFalse(index.apply_operation(op("sm_burn_cards", other, cards=[copies[0]["uid"]])))
+        self.assertTrue(index.apply_operation(op("sm_gift_cards", self.player, to=other, cards=[copies[0]["uid"]])))
+        self.assertEqual(index[card_id]["uid"], copies[1]["uid"])
+        # received cards are looked up
+        found[copies[0]["uid"]] = dict(copies[0], player=self.player, xp=copies[0]["xp"] + 1)
+        self.assertTrue(index.apply_operation(op("sm_gift_cards", other, to=self.player, cards=[copies[0]["uid"]])))
+        self.assertEqual(index[card_id]["xp"], copies[0]["xp"] + 1)
+        found[copies[0]["uid"]]["xp"] = copies[0]["xp"] + copies[1]["xp"]
+        self.assertTrue(index.apply_operation(op("sm_combine_cards", self.player,
+                                                 cards=[copies[0]["uid"], copies[1]["uid"]])))
+        self.assertEqual(len(index.copies_of(card_id)), 1)
+        self.assertEqual(index[card_id]["xp"], copies[0]["xp"] + copies[1]["xp"])
+        self.assertTrue(index.apply_operation(op("sm_burn_cards", self.player, cards=[copies[0]["uid"]])))
+        self.assertFalse(card_id in index)
+        self.assertEqual(index.copies_of(card_id), [])
+
+    def test_market_operations(self):
+        card = sorted(self.collection, key=lambda c: (c["card_detail_id"], -c["xp"]))[0]
+        card_id = card["card_detail_id"]
+        other = self.data.players[1]
+        found = {}
+        index = CollectionIndex(self.player, self.cards, find_cards=lambda uids: [found[u] for u in uids if u in found])
+        index.load(self.collection)
+        self.assertEqual(index[card_id]["uid"], card["uid"])
+
+        def op(op_id, sender, data, trx_id="a1"):
+            return {"id": op_id, "json": json.dumps(data), "required_posting_auths": [sender], "trx_id": trx_id}
+        # listed copies are not playable until the listing is cancelled
+        self.assertFalse(index.apply_operation(op("sm_sell_cards", other, [{"cards": [card["uid"]]}])))
+        self.assertTrue(index.apply_operation(op("sm_sell_cards", self.player,
+                                                 [{"cards": ["unknown"]}, {"cards": [card["uid"]], "price": 1}])))
+        self.assertNotEqual(index.get(card_id, {}).get("uid"), card["uid"])
+        self.assertEqual(index.listed(["a1-1"]), [card["uid"]])
+        self.assertEqual(index.listed(["a1"]), [card["uid"]])
+        self.assertTrue(index.apply_operation(op("sm_cancel_sell", self.player, {"trx_ids": ["a1-1"]}, "b2")))
+        self.assertEqual(index[card_id]["uid"], card["uid"])
+        # a cancelled listing of an unknown id is looked up again
+        self.assertTrue(index.apply_operation(op("sm_sell_cards", self.player, {"cards": [card["uid"]]}, "c3")))
+        found[card["uid"]] = dict(card, player=self.player)
+        self.assertTrue(index.apply_operation(op("sm_cancel_sell", self.player, {"trx_ids": ["x9-0"]}, "d4")))
+        self.assertEqual(index[card_id]["uid"], card["uid"])
+        # a sold copy leaves the collection
+        self.assertTrue(index.apply_operation(op("sm_sell_cards", self.player, [{"cards": [card["uid"]]}], "e5")))
+        self.assertFalse(index.apply_operation(op("sm_market_purchase", other, {"items": ["a1-1"]}, "f6")))
+        self.assertTrue(index.apply_operation(op("sm_market_purchase", other, {"items": ["e5-0"]}, "f6")))
+        self.assertNotIn(card["uid"], index.copies)
+
+    def test_update_xp(self):
+        index = CollectionIndex(self.player, self.cards)
+        index.load(self.collection)
+        card = [c for c in self.collection if c["level"] > 1][0]
+        index.update_xp(card["uid"], 0)
+        copy = index.copies[card["uid"]]
+        self.assertLess(copy["level"], card["level"])
+        self.assertEqual(copy["mana"], self.cards.stat("mana", card["card_detail_id"], copy["level"]))
+        self.assertIn(copy, index.by_level(copy["level"]))
+        self.assertNotIn(card["uid"], [c["uid"] for c in index.by_level(card["level"])])
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+import unittest
+from steemmonsters.lazy import Deferred
+
+
+class Testcases(unittest.TestCase):
+    def test_background(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def load():
+            started.set()
+            release.wait(5)
+            return 42
+        deferred = Deferred(load)
+        self.assertTrue(started.wait(5))
+        self.assertFalse(deferred.ready)
+        with self.assertRaises(RuntimeError):
+            deferred.get(timeout=0.01)
+        release.set()
+        self.assertEqual(deferred.get(), 42)
+        self.assertTrue(deferred.ready)
+
+    def test_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+        first = Deferred(lambda: barrier.wait() is not None)
+        second = Deferred(lambda: barrier.wait() is not None)
+        self.assertTrue(first.get())
+        self.assertTrue(second.get())
+
+    def test_on_first_use(self):
+        calls = []
+        deferred = Deferred(lambda: calls.append(threading.current_thread()) or len(calls), start=False)
+        self.assertEqual(calls, [])
+        self.assertEqual(deferred.get(), 1)
+        self.assertEqual(deferred.get(), 1)
+        self.assertEqual(calls, [threading.current_thread()])
+
+    def test_error_retry(self):
+        calls = []
+
+        def load():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ValueError("unavailable")
+            return "ok"
+        deferred = Deferred(load)
+        with self.assertRaises(ValueError):
+            deferred.get()
+        self.assertFalse(deferred.ready)
+        self.assertEqual(deferred.get(), "ok")
+        self.assertEqual(len(calls), 2)
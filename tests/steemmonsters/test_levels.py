@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from steemmonsters import levels
+from steemmonsters.cards import CardDatabase
+from steemmonsters.constants import xp_level, max_level_rarity
+from steemmonsters.levels import XpTable, get_xp_table
+from steemmonsters.synthetic import SyntheticData
+
+
+def scan_level(edition, rarity, xp):
+    for x in xp_level:
+        if x["edition"] == edition and x["rarity"] == rarity:
+            level = 0
+            for n in x["xp_level"]:
+                if xp >= x["xp_level"][n]:
+                    level = n
+            return level
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(1)
+        self.editions = [rnd.randint(0, 2) for i in range(500)]
+        self.rarities = [rnd.randint(1, 4) for i in range(500)]
+        self.xps = [rnd.choice([0, 20, 59, 60, 1000, 7559, 7560, 20000, rnd.randint(0, 10000)]) for i in range(500)]
+
+    def test_card_level(self):
+        table = XpTable()
+        for edition, rarity, xp in zip(self.editions, self.rarities, self.xps):
+            level = scan_level(edition, rarity, xp)
+            self.assertEqual(table.card_level(edition, rarity, xp), level)
+            self.assertEqual(table.summoner_level(edition, rarity, xp),
+                             int(math.ceil(level / max_level_rarity[rarity] * 4)))
+        self.assertEqual(table.card_level(1, 1, 29), 1)
+        self.assertEqual(table.card_level(1, 1, 30), 2)
+        self.assertEqual(table.card_level(0, 4, 7000), 4)
+        self.assertRaises(KeyError, table.card_level, 5, 1, 0)
+        self.assertIs(get_xp_table(), get_xp_table(xp_level, max_level_rarity))
+
+    def test_card_levels(self):
+        table = XpTable()
+        expected = [table.card_level(e, r, x) for e, r, x in zip(self.editions, self.rarities, self.xps)]
+        expected_summoner = [table.summoner_level(e, r, x) for e, r, x in zip(self.editions, self.rarities, self.xps)]
+        self.assertEqual(list(table.card_levels(self.editions, self.rarities, self.xps)), expected)
+        self.assertEqual(list(table.summoner_levels(self.editions, self.rarities, self.xps)), expected_summoner)
+        self.assertEqual(len(table.card_levels([], [], [])), 0)
+        self.assertRaises(KeyError, table.card_levels, [3], [1], [0])
+        collection = [{"card_detail_id": 1, "edition": 1, "xp": 165}, {"card_detail_id": 2, "edition": 0, "xp": 3000}]
+        cards = {1: {"rarity": 1}, 2: {"rarity": 4}}
+        self.assertEqual(list(table.collection_levels(collection, cards)), [4, 3])
+
+        # pure python fallback
+        np = levels.np
+        levels.np = None
+        try:
+            self.assertEqual(table.card_levels(self.editions, self.rarities, self.xps), expected)
+            self.assertEqual(table.summoner_levels(self.editions, self.rarities, self.xps), expected_summoner)
+        finally:
+            levels.np = np
+
+    def test_collection_levels_snapshot(self):
+        data = SyntheticData(seed=1, players=2, blocks=1)
+        collection = data.collections[data.players[0]]
+        path = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(path, "cards.snapshot")
+            CardDatabase(data.cards).save(file_name)
+            cards = CardDatabase.open(file_name)
+            table = XpTable()
+            self.assertEqual(list(table.collection_levels(collection, cards)), [c["level"] for c in collection])
+            # the rarities come from the columns, the card details are not decoded
+            self.assertIsNone(cards._details)
+        finally:
+            shutil.rmtree(path)
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+from steemmonsters.api import Api
+from steemmonsters.mirrors import MirrorSelector
+from steemmonsters.replay import FixtureStore, ReplayServer
+from steemmonsters.retry import RetryPolicy
+from steemmonsters.synthetic import SyntheticData
+from .helpers import FakeClock
+
+
+class Testcases(unittest.TestCase):
+    def test_select(self):
+        clock = FakeClock()
+        mirrors = MirrorSelector(["http://a", "http://b/", "http://c/"], alpha=0.5, down_time=10, clock=clock)
+        self.assertEqual(mirrors.urls, ["http://a/", "http://b/", "http://c/"])
+        # unmeasured mirrors are tried first
+        self.assertEqual(mirrors.select(), "http://a/")
+        mirrors.success("http://a/", 0.2)
+        self.assertEqual(mirrors.select(), "http://b/")
+        mirrors.success("http://b/", 0.1)
+        mirrors.success("http://c/", 0.3)
+        self.assertEqual(mirrors.select(), "http://b/")
+        mirrors.success("http://b/", 0.4)
+        self.assertAlmostEqual(mirrors.get_stats()[1]["latency"], 0.25)
+        self.assertEqual(mirrors.select(), "http://a/")
+
+        mirrors.failure("http://a/")
+        self.assertEqual(mirrors.select(), "http://b/")
+        mirrors.failure("http://a/")
+        mirrors.failure("http://b/")
+        mirrors.failure("http://c/")
+        # all are down, the one which recovers first is used
+        self.assertEqual(mirrors.select(), "http://b/")
+        clock.now = 10
+        self.assertEqual(mirrors.select(), "http://b/")
+        # the down time doubles with each consecutive failure
+        clock.now = 20
+        self.assertEqual(mirrors.select(), "http://a/")
+        self.assertEqual(mirrors.split("http://c/settings"), ("http://c/", "settings"))
+        self.assertEqual(mirrors.split("http://d/settings"), (None, "http://d/settings"))
+
+    def test_probe(self):
+        clock = FakeClock()
+        self.assertFalse(MirrorSelector(["http://a/"]).start_probe())
+        mirrors = MirrorSelector(["http://a/", "http://b/"], probe_interval=60, clock=clock)
+        self.assertTrue(mirrors.start_probe())
+        self.assertFalse(mirrors.start_probe())
+        mirrors.finish_probe()
+        self.assertFalse(mirrors.start_probe())
+        clock.now = 60
+        self.assertTrue(mirrors.start_probe())
+
+    def test_api_failover(self):
+        data = SyntheticData(seed=1, players=5, blocks=5)
+        fixtures = FixtureStore()
+        data.write_fixtures(fixtures)
+        with ReplayServer(fixtures, error_rate=1.) as broken, ReplayServer(fixtures) as server:
+            api = Api(url=[broken.url, server.url], rate_limiter=None,
+                      retry_policy=RetryPolicy(backoff_factor=0.001, respect_retry_after=False))
+            self.assertEqual(api.players_leaderboard()[0]["rank"], 1)
+            for player in data.players:
+                self.assertEqual(api.get_player_details(player)["name"], player)
+            mirrors = api.get_stats()["mirrors"]
+            self.assertFalse(mirrors[0]["healthy"])
+            self.assertTrue(mirrors[1]["healthy"])
+            self.assertTrue(server.requests >= 6)
+            api.close()
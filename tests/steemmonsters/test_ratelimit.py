@@ -0,0 +1,57 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+from steemmonsters.ratelimit import (
+    RateLimiter,
+    TokenBucket,
+)
+from .helpers import FakeClock
+
+
+class Testcases(unittest.TestCase):
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, burst=3, clock=clock)
+        self.assertEqual([bucket.reserve() for i in range(3)], [0, 0, 0])
+        self.assertEqual(bucket.reserve(), 0.5)
+        self.assertEqual(bucket.reserve(), 1.0)
+        clock.now = 10
+        self.assertEqual([bucket.reserve() for i in range(3)], [0, 0, 0])
+        self.assertEqual(bucket.reserve(), 0.5)
+
+    def test_rate_limiter_groups(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=100, burst=100, groups={"battle": (1, 1)}, clock=clock)
+        self.assertEqual(limiter.reserve("battle/status"), 0)
+        self.assertEqual(limiter.reserve("battle/result"), 1)
+        self.assertEqual(limiter.reserve("cards/get_details"), 0)
+        stats = limiter.get_stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["delayed"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+        with limiter.waiting():
+            with limiter.waiting():
+                self.assertEqual(limiter.get_stats()["queue_depth"], 2)
+        stats = limiter.get_stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["max_queue_depth"], 2)
+
+    def test_endpoint_groups(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=100, burst=100, groups={"transactions": (1, 1), "transactions/history": (10, 2)},
+                              clock=clock)
+        self.assertEqual(limiter.reserve("transactions/lookup"), 0)
+        self.assertEqual(limiter.reserve("transactions/lookup"), 1)
+        self.assertEqual([limiter.reserve("transactions/history") for i in range(3)], [0, 0, 0.1])
+
+    def test_from_config(self):
+        default = RateLimiter(rate=10, burst=20, groups={"battle": (4, 8)})
+        self.assertIs(RateLimiter.from_config(None, default=default), default)
+        self.assertIsNone(RateLimiter.from_config(False, default=default))
+        limiter = RateLimiter.from_config({"rate": 40, "groups": {"transactions/history": [40, 80]}}, default=default)
+        self.assertEqual(limiter.bucket.rate, 40)
+        self.assertEqual(limiter.bucket.capacity, 20)
+        self.assertEqual(limiter.group_buckets["battle"].rate, 4)
+        self.assertEqual(limiter.group_buckets["transactions/history"].capacity, 80)
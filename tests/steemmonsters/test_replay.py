@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from steemmonsters.api import Api
+from steemmonsters.exceptions import PermanentApiError
+from steemmonsters.replay import (
+    FixtureStore,
+    Recorder,
+    ReplayServer,
+    fixture_file_name,
+    redact_path,
+)
+from steemmonsters.retry import RetryPolicy
+from steemmonsters.synthetic import SyntheticData
+
+
+class Testcases(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.data = SyntheticData(seed=1, players=10, blocks=20)
+        self.fixtures = FixtureStore()
+        self.data.write_fixtures(self.fixtures)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_replay(self):
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            self.assertEqual(api.get_card_details(), self.data.cards)
+            self.assertEqual(api.settings()["ranked_settings"]["mana_cap"], 25)
+            history = api.get_from_block(self.data.start_block)
+            self.assertEqual(history[0]["block_num"], self.data.start_block)
+            self.assertRaises(PermanentApiError, api.get_player_details, "unknown")
+            api.close()
+
+    def test_errors(self):
+        with ReplayServer(self.fixtures, error_rate=0.5, seed=2) as server:
+            api = Api(url=server.url, rate_limiter=None, retry_policy=RetryPolicy(max_attempts=20, backoff_factor=0.001,
+                                                                                  respect_retry_after=False))
+            for player in self.data.players:
+                self.assertEqual(api.get_player_details(player)["name"], player)
+            self.assertTrue(server.errors > 0)
+            api.close()
+
+    def test_record(self):
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None, recorder=Recorder(self.path))
+            leaderboard = api.players_leaderboard()
+            api.get_collection(self.data.players[0])
+            api.close()
+        recorded = FixtureStore(self.path)
+        self.assertEqual(len(recorded.fixtures), 2)
+        with ReplayServer(recorded) as server:
+            api = Api(url=server.url, rate_limiter=None)
+            self.assertEqual(api.players_leaderboard(), leaderboard)
+            api.close()
+
+    def test_redact(self):
+        player = self.data.players[0]
+        self.assertEqual(redact_path("cards/packs/%s?token=secret&username=%s" % (player, player)),
+                         "cards/packs/%s?token=REDACTED&username=%s" % (player, player))
+        self.fixtures.add("cards/packs/%s?token=REDACTED" % player, 200, json.dumps({"token": "secret", "packs": []}))
+        with ReplayServer(self.fixtures) as server:
+            api = Api(url=server.url, rate_limiter=None, recorder=Recorder(self.path))
+            self.assertEqual(api.get_cards_packs(player, "secret")["packs"], [])
+            api.close()
+        for name in os.listdir(self.path):
+            with io.open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                self.assertNotIn("secret", f.read())
+        recorded = FixtureStore(self.path)
+        self.assertEqual(json.loads(recorded.get("cards/packs/%s?token=REDACTED" % player)[0]["body"])["token"],
+                         "REDACTED")
+
+    def test_append(self):
+        store = FixtureStore(self.path)
+        store.add("settings", 200, "{\"a\": 1}")
+        store.add("settings", 200, "{\"a\": 1}")
+        store.add("settings", 200, "{\"a\": 2}")
+        with io.open(os.path.join(self.path, fixture_file_name("settings")), "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+        store = FixtureStore(self.path)
+        store.add("settings", 200, "{\"a\": 3}")
+        self.assertEqual([r["body"] for r in FixtureStore(self.path).get("settings")],
+                         ["{\"a\": 1}", "{\"a\": 2}", "{\"a\": 3}"])
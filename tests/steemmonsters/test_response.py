@@ -0,0 +1,40 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import unittest
+from steemmonsters.response import ApiResponse
+
+
+class CountingResponse(object):
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.text = json.dumps(data)
+        self.decode_count = 0
+
+    def json(self):
+        self.decode_count += 1
+        return json.loads(self.text)
+
+
+class Testcases(unittest.TestCase):
+    def test_decode_once(self):
+        raw = CountingResponse(200, {"winner": "a", "player_1": "a", "details": json.dumps({"team1": {"player": "a"}})})
+        response = ApiResponse(raw)
+        self.assertTrue(response.ok)
+        self.assertTrue("winner" in response)
+        self.assertFalse("Error" in response)
+        self.assertEqual(response["winner"], "a")
+        self.assertEqual(response.get("player_2", "b"), "b")
+        details = response.decoded("details")
+        self.assertEqual(details["team1"]["player"], "a")
+        self.assertTrue(response.decoded("details") is details)
+        self.assertEqual(raw.decode_count, 1)
+
+    def test_list_body(self):
+        response = ApiResponse(CountingResponse(503, [1, 2]))
+        self.assertFalse(response.ok)
+        self.assertFalse("error" in response)
+        self.assertEqual(response.get("error"), None)
+        self.assertEqual(response.json(), [1, 2])
@@ -0,0 +1,36 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+from steemmonsters.retry import (
+    RetryPolicy,
+    parse_retry_after,
+)
+
+
+class Testcases(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after(None), None)
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertEqual(parse_retry_after("-3"), 0)
+        self.assertEqual(parse_retry_after("soon"), None)
+        now = 784111777 - 30
+        self.assertEqual(parse_retry_after("Sun, 06 Nov 1994 08:49:37 GMT", now=now), 30)
+
+    def test_is_retryable(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.is_retryable(503))
+        self.assertTrue(policy.is_retryable(429))
+        self.assertFalse(policy.is_retryable(404))
+        self.assertFalse(policy.is_retryable(400))
+
+    def test_get_delay(self):
+        policy = RetryPolicy(backoff_factor=1, backoff_max=8, jitter=0)
+        self.assertEqual([policy.get_delay(a) for a in range(1, 6)], [1, 2, 4, 8, 8])
+        self.assertEqual(policy.get_delay(1, retry_after="5"), 5)
+        self.assertEqual(policy.get_delay(1, retry_after="500"), 120)
+        policy = RetryPolicy(backoff_factor=1, backoff_max=8, jitter=0.5)
+        for a in range(1, 6):
+            delay = policy.get_delay(a)
+            self.assertTrue(min(8, 2 ** (a - 1)) / 2 <= delay <= min(8, 2 ** (a - 1)))
@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+from steemmonsters.singleflight import SingleFlight
+
+
+class Testcases(unittest.TestCase):
+    def test_do(self):
+        flight = SingleFlight()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"rating": 3000}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("players/details", fetch))) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 4)
+        self.assertTrue(all(r is results[0] for r in results))
+        flight.do("players/details", fetch)
+        self.assertEqual(len(calls), 2)
+
+    def test_do_error(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("failed")
+        self.assertRaises(ValueError, flight.do, "settings", fail)
+        self.assertEqual(flight.do("settings", lambda: 1), 1)
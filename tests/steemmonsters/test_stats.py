@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from steemmonsters.stats import (
+    ApiStats,
+    Histogram,
+)
+
+
+class Testcases(unittest.TestCase):
+    def test_histogram(self):
+        h = Histogram([1, 2, 5, 10])
+        self.assertEqual(h.percentile(0.5), None)
+        for v in [0.5, 1.5, 1.5, 3, 4, 20]:
+            h.add(v)
+        self.assertEqual(h.counts, [1, 2, 2, 0, 1])
+        self.assertEqual(h.count, 6)
+        self.assertEqual(h.min, 0.5)
+        self.assertEqual(h.max, 20)
+        self.assertEqual(h.percentile(0.5), 2)
+        self.assertEqual(h.percentile(0.8), 5)
+        self.assertEqual(h.percentile(1.0), 20)
+        self.assertEqual(h.mean, 30.5 / 6)
+
+    def test_api_stats(self):
+        stats = ApiStats()
+        stats.record_request("battle/status", 0.2, 200, 0)
+        stats.record_request("battle/status", 3.0, 503, 9, error="battle/status failed")
+        stats.record_bytes("battle/status", 512)
+        stats.record_decode("battle/status", 0.001)
+        stats.count("battle/status", "cache_fresh")
+        data = stats.to_dict()["battle/status"]
+        self.assertEqual(data["calls"], 2)
+        self.assertEqual(data["errors"], 1)
+        self.assertEqual(data["status_codes"], {"200": 1, "503": 1})
+        self.assertEqual(data["retries"]["sum"], 9)
+        self.assertEqual(data["counters"], {"cache_fresh": 1})
+        path = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(path, "stats.json")
+            stats.dump(file_name, extra={"rate_limiter": {"queue_depth": 0}})
+            with open(file_name) as f:
+                dumped = json.load(f)
+            self.assertEqual(dumped["endpoints"]["battle/status"]["calls"], 2)
+            self.assertEqual(dumped["rate_limiter"]["queue_depth"], 0)
+        finally:
+            shutil.rmtree(path)
+        stats.reset()
+        self.assertEqual(stats.to_dict(), {})
@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import unittest
+from steemmonsters.streaming import JsonArrayParser
+
+
+def parse_in_chunks(body, chunk_size, key=None):
+    parser = JsonArrayParser(key=key)
+    items = []
+    for i in range(0, len(body), chunk_size):
+        items.extend(parser.feed(body[i:i + chunk_size]))
+    items.extend(parser.close())
+    return items
+
+
+class Testcases(unittest.TestCase):
+    def test_array(self):
+        data = [{"uid": "C-%d" % i, "price": i * 1.5, "name": "über"} for i in range(50)] + [12345, "a,]", None]
+        body = json.dumps(data).encode("utf-8")
+        for chunk_size in [1, 3, 7, 64, len(body)]:
+            self.assertEqual(parse_in_chunks(body, chunk_size), data)
+
+    def test_array_in_object(self):
+        data = {"player": "holger80", "nested": {"cards": [1]}, "cards": [{"uid": "C-1"}, {"uid": "C-2"}], "after": 1}
+        body = json.dumps(data)
+        for chunk_size in [1, 5, len(body)]:
+            self.assertEqual(parse_in_chunks(body, chunk_size, key="cards"), data["cards"])
+        self.assertEqual(parse_in_chunks('{"player": "a"}', 2, key="cards"), [])
+
+    def test_empty_and_incomplete(self):
+        self.assertEqual(parse_in_chunks(b" [ ] ", 1), [])
+        parser = JsonArrayParser()
+        self.assertEqual(parser.feed(b'[{"a": 1}, {"a"'), [{"a": 1}])
+        self.assertFalse(parser.done)
+        self.assertRaises(ValueError, parser.close)
+        self.assertRaises(ValueError, JsonArrayParser().feed, b'{"a": 1}')
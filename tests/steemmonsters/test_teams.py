@@ -0,0 +1,94 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+from steemmonsters import cards as cards_module
+from steemmonsters import teams as teams_module
+from steemmonsters.cards import CardDatabase
+from steemmonsters.synthetic import SyntheticData
+from steemmonsters.teams import (
+    TeamTable,
+    pack_team,
+    team_key_from_details,
+    team_key_from_dicts,
+    team_key_from_string,
+    team_key_to_dicts,
+    team_key_to_ids,
+    team_key_to_string,
+    team_matrix,
+    team_size,
+    team_summoner,
+    unpack_team,
+)
+from steemmonsters.utils import expand_short_form, mana_cap_mask, mana_team_string, mana_teams, team_stats
+
+
+class Testcases(unittest.TestCase):
+    def test_codecs(self):
+        team_string = "5-4,3-1,167-10,4095-15"
+        key = team_key_from_string(team_string)
+        self.assertEqual(key, pack_team([(5, 4), (3, 1), (167, 10), (4095, 15)]))
+        self.assertEqual(unpack_team(key), [(5, 4), (3, 1), (167, 10), (4095, 15)])
+        self.assertEqual(team_key_to_string(key), team_string)
+        self.assertEqual(team_size(key), 4)
+        self.assertEqual(team_summoner(key), 5)
+        dicts = team_key_to_dicts(key)
+        self.assertEqual(dicts[2], {"id": 167, "level": 10})
+        self.assertEqual(team_key_from_dicts(dicts), key)
+        details = {"summoner": {"card_detail_id": 5, "level": 4},
+                   "monsters": [{"card_detail_id": c, "level": l} for c, l in [(3, 1), (167, 10), (4095, 15)]]}
+        self.assertEqual(team_key_from_details(details), key)
+        summoner, monsters = team_key_to_ids(key)
+        self.assertEqual(summoner, {"id": 5, "gold": False})
+        self.assertEqual([m["id"] for m in monsters], [3, 167, 4095])
+        # the order of the cards matters
+        self.assertNotEqual(team_key_from_string("3-1,5-4"), team_key_from_string("5-4,3-1"))
+        self.assertRaises(ValueError, team_key_from_string, "4096-1")
+        self.assertRaises(ValueError, team_key_from_string, "1-16")
+
+    def test_table(self):
+        table = TeamTable()
+        first = table.add(team_key_from_string("1-1,3-2"))
+        self.assertEqual(table.add(team_key_from_string("1-2,3-2")), 1)
+        self.assertEqual(table.add(team_key_from_string("1-1,3-2")), first)
+        self.assertEqual(len(table), 2)
+        self.assertTrue(team_key_from_string("1-2,3-2") in table)
+        self.assertEqual(team_key_to_string(table.key(1)), "1-2,3-2")
+        key = table.intern(pack_team([(1, 1), (3, 2)]))
+        self.assertIs(key, table.key(first))
+
+    def test_utils(self):
+        data = SyntheticData(seed=2, players=2, blocks=5)
+        cards = CardDatabase(data.cards)
+        team_string = "1-1,3-2,4-9"
+        key = team_key_from_string(team_string)
+        self.assertEqual(mana_team_string(key, cards), mana_team_string(team_string, cards))
+        for output_type in ["string", "dict", "id"]:
+            self.assertEqual(expand_short_form(key, cards, output_type=output_type),
+                             expand_short_form(team_string, cards, output_type=output_type))
+
+    def test_batch_mana(self):
+        data = SyntheticData(seed=2, players=2, blocks=5)
+        cards = CardDatabase(data.cards)
+        team_strings = ["1-1,3-2,4-9", "2-3,5-1", "1-4,3-1,4-2,5-3,6-1,7-1,8-2"]
+        teams = [team_strings[0], team_key_from_string(team_strings[1]), unpack_team(team_key_from_string(team_strings[2]))]
+        expected = [mana_team_string(t, cards) for t in team_strings]
+        np = cards_module.np
+        try:
+            for numpy in [np, None]:
+                cards_module.np = numpy
+                teams_module.np = numpy
+                ids, levels = team_matrix(teams)
+                self.assertEqual(list(ids[1]), [2, 5, 0, 0, 0, 0, 0])
+                self.assertEqual(list(mana_teams(ids, levels, cards)), expected)
+                mana_cap = sorted(expected)[1]
+                self.assertEqual(list(mana_cap_mask(ids, levels, cards, mana_cap)), [m <= mana_cap for m in expected])
+                health = team_stats(ids, levels, cards, names=["health"])["health"]
+                self.assertEqual(health[0][2], cards.stat("health", 4, 9))
+                self.assertEqual(health[1][2], 0)
+                self.assertRaises(KeyError, cards.stat_matrix, "mana", [[1, 1000]], [[1, 1]])
+        finally:
+            cards_module.np = np
+            teams_module.np = np
+        self.assertRaises(ValueError, team_matrix, [team_strings[2]], slots=3)